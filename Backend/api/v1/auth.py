@@ -24,7 +24,7 @@ async def register_user(user_data: UserCreate, db: Session = Depends(get_db)) ->
     logger.info(f"收到注册请求: {user_data.dict(exclude={'password'})}")
     try:
         auth_service = AuthService(db)
-        user = auth_service.register_user(user_data)
+        user = await auth_service.register_user(user_data)
         
         # 创建访问令牌
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -62,7 +62,7 @@ async def login_for_access_token(
 ) -> Any:
     """用户登录"""
     auth_service = AuthService(db)
-    user = auth_service.authenticate_user(form_data.username, form_data.password)
+    user = await auth_service.authenticate_user(form_data.username, form_data.password)
     
     if not user:
         raise HTTPException(
@@ -0,0 +1,89 @@
+from typing import Any
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from schemas.friend import FriendRequestCreate, FriendList, FriendActionResponse
+from services.friends import FriendService
+from services.auth import get_current_user
+from models.user import User
+from db.session import get_db
+
+router = APIRouter(prefix="/friends", tags=["好友"])
+
+def _check(result: dict) -> dict:
+    if not result["success"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=result["error"]
+        )
+    return result
+
+@router.get("/", response_model=FriendList)
+async def get_friends(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    """获取好友列表"""
+    return FriendService(db).list_friends(current_user.user_id)
+
+@router.get("/requests", response_model=FriendList)
+async def get_friend_requests(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    """获取收到的好友申请"""
+    return FriendService(db).list_requests(current_user.user_id)
+
+@router.post("/requests", response_model=FriendActionResponse, status_code=status.HTTP_201_CREATED)
+async def send_friend_request(
+    request: FriendRequestCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    """发送好友申请（对方已向自己发出申请时直接成为好友）"""
+    return _check(FriendService(db).send_request(current_user.user_id, request.friend_id))
+
+@router.post("/requests/{user_id}/accept", response_model=FriendActionResponse)
+async def accept_friend_request(
+    user_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    """同意好友申请"""
+    return _check(FriendService(db).accept_request(current_user.user_id, user_id))
+
+@router.get("/mutual/{user_id}", response_model=FriendList)
+async def get_mutual_friends(
+    user_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    """获取与指定用户的共同好友"""
+    return FriendService(db).mutual_friends(current_user.user_id, user_id)
+
+@router.post("/{user_id}/block", response_model=FriendActionResponse)
+async def block_user(
+    user_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    """拉黑用户"""
+    return _check(FriendService(db).block(current_user.user_id, user_id))
+
+@router.delete("/{user_id}/block", response_model=FriendActionResponse)
+async def unblock_user(
+    user_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    """取消拉黑"""
+    return _check(FriendService(db).unblock(current_user.user_id, user_id))
+
+@router.delete("/{user_id}", response_model=FriendActionResponse)
+async def remove_friend(
+    user_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    """删除好友，或撤回、拒绝与该用户之间的好友申请"""
+    return _check(FriendService(db).remove(current_user.user_id, user_id))
@@ -1,10 +1,14 @@
 from typing import Any, List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status, File, Form
 from sqlalchemy.orm import Session
 
 from schemas.score import ScoreResponse
-from schemas.match import MatchCreate, MatchResponse, MatchPagination
-from services.match import MatchService
+from schemas.match import MatchCreate, AutoMatchCreate, MatchResponse, MatchHistoryPagination, MatchSuggestionList
+from services.match import MatchService, MATCH_HISTORY_FIELDS
+from services.friends import FriendService
+from services.matchmaking import MatchmakingService
+from core.http_cache import response_cache
+from core.fields import FieldSet, sparse_fields
 from services.auth import get_current_user
 from models.user import User
 from db.session import get_db
@@ -34,41 +38,107 @@ async def create_match(
     
     return result
 
-@router.get("/user/{user_id}", response_model=MatchPagination)
+@router.get("/suggestions", response_model=MatchSuggestionList)
+async def get_match_suggestions(
+    limit: int = Query(5, ge=1, le=50),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    """推荐Elo分数相近的对手（最近交手过的对手排在最后）"""
+    return MatchmakingService(db).suggest(current_user, limit)
+
+@router.post("/auto", response_model=MatchResponse, status_code=status.HTTP_201_CREATED)
+async def create_auto_match(
+    match_data: AutoMatchCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    """自动匹配一名Elo分数相近的对手并发起PK对战"""
+    opponent_id = MatchmakingService(db).pick_opponent(current_user)
+    if opponent_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="暂无可匹配的对手"
+        )
+    
+    result = await MatchService(db).create_match(
+        challenger_id=current_user.user_id,
+        opponent_id=opponent_id,
+        score_id=match_data.score_id
+    )
+    
+    if not result["success"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=result["error"]
+        )
+    
+    return result
+
+@router.get("/user/{user_id}", response_model=MatchHistoryPagination)
 async def get_user_matches(
     user_id: int,
-    page: int = 1,
-    limit: int = 10,
-    result: Optional[str] = None,
+    request: Request,
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, ge=1, le=100),
+    result: Optional[str] = Query(None, pattern="^(Win|Lose|Tie)$"),
+    friends_only: bool = False,
+    fields: FieldSet = Depends(sparse_fields(MATCH_HISTORY_FIELDS)),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ) -> Any:
-    """获取用户的对战历史"""
+    """
+    获取用户的对战历史，friends_only 时只返回与该用户好友之间的对战（带 ETag，没有新对战时不重新生成）
+    
+    fields 选择返回的字段，不需要双方资料时可以省略 challenger/opponent，跳过用户查询。
+    """
     match_service = MatchService(db)
     
-    matches = match_service.get_user_matches(
-        user_id=user_id,
-        page=page,
-        limit=limit,
-        result=result
-    )
+    opponent_ids = FriendService(db).friend_ids(user_id) if friends_only else None
+    version = (match_service.get_history_version(user_id, opponent_ids), opponent_ids)
     
-    return matches
+    async def build():
+        matches = await match_service.get_match_history(
+            user_id=user_id,
+            page=page,
+            limit=limit,
+            result=result,
+            opponent_ids=opponent_ids,
+            fields=fields
+        )
+        if not matches["success"]:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=matches["error"]
+            )
+        return MatchHistoryPagination.model_validate(matches).model_dump(mode="json", exclude_unset=True)
+    
+    return await response_cache.respond(
+        request, ("match_history", user_id, page, limit, result, friends_only, fields), version, build,
+        cache_control="private, no-cache", vary="Authorization"
+    )
 
 @router.get("/{match_id}", response_model=MatchResponse)
 async def get_match_detail(
     match_id: int,
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ) -> Any:
-    """获取对战详情"""
+    """获取对战详情（带 ETag，If-None-Match 命中时返回 304）"""
     match_service = MatchService(db)
-    match = match_service.get_match_by_id(match_id)
+    result = match_service.get_match_detail(match_id)
     
-    if not match:
+    if not result:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="对战记录不存在"
         )
     
-    return match 
\ No newline at end of file
+    match, version = result
+    # 需要登录才能访问，只允许客户端缓存，每次使用前都要重新验证
+    return await response_cache.respond(
+        request, ("match", match_id), version,
+        lambda: MatchResponse.model_validate(match).model_dump(),
+        cache_control="private, no-cache", vary="Authorization"
+    ) 
\ No newline at end of file
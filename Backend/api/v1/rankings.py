@@ -1,5 +1,5 @@
 from typing import Any, List, Optional
-from fastapi import APIRouter, Depends, Query, HTTPException, status
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, status
 from sqlalchemy.orm import Session
 import logging
 from sqlalchemy.sql import distinct
@@ -7,85 +7,145 @@ from sqlalchemy.sql import distinct
 from db.session import get_db
 from services.auth import get_current_user
 from models.user import User
-from models.score import Score
-from sqlalchemy import func, desc
+from services.leaderboard import RANKING_FIELDS, WINDOWS, LeaderboardService
+from services.friends import FriendService
+from config.settings import RANKINGS_MAX_AGE, RANKINGS_STALE_WHILE_REVALIDATE
+from core.http_cache import response_cache
+from core.fields import FieldSet, sparse_fields
 
 router = APIRouter(prefix="/rankings", tags=["排行榜"])
 logger = logging.getLogger(__name__)
 
+# 公开榜单允许客户端和代理短时间复用，过期后可先用旧响应再后台验证
+RANKINGS_CACHE_CONTROL = f"public, max-age={RANKINGS_MAX_AGE}, stale-while-revalidate={RANKINGS_STALE_WHILE_REVALIDATE}"
+# fields 选择榜单条目的字段，没有选择用户资料或照片字段时不查询对应的表
+ranking_fields = sparse_fields(RANKING_FIELDS)
+
 @router.get("/global")
 async def get_global_rankings(
+    request: Request,
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1, le=100),
+    view: str = Query("photo", pattern="^(photo|user)$", description="photo: 按照片排名; user: 每个用户只取最高分"),
+    fields: FieldSet = Depends(ranking_fields),
     db: Session = Depends(get_db)
 ) -> Any:
     """获取全球颜值排行榜"""
     
-    logger.info(f"获取全球排行榜数据，页码: {page}, 每页数量: {limit}")
+    logger.debug("获取全球排行榜数据，视图: %s, 页码: %s, 每页数量: %s", view, page, limit)
     
     try:
-        # 直接查询所有公开照片的评分记录，按分数降序排序
-        # 不需要再使用子查询去重，因为我们在上传时已经处理了图片哈希值
-        query = db.query(
-            Score.score_id,
-            Score.user_id,
-            Score.face_score,
-            Score.image_url,
-            Score.scored_at,
-            User.username,
-            User.nickname,
-            User.avatar_url
-        ).join(
-            User, User.user_id == Score.user_id
-        ).filter(
-            Score.is_public == True
-        ).order_by(
-            desc(Score.face_score)
+        service = LeaderboardService(db)
+        # 榜单未变化时直接使用缓存的响应体，轮询的客户端带 If-None-Match 时只需比较 ETag
+        return await response_cache.respond(
+            request, ("global_rankings", view, page, limit, fields), service.global_version(view),
+            lambda: service.get_global_rankings(view, page, limit, fields),
+            cache_control=RANKINGS_CACHE_CONTROL
         )
-        
-        # 计算总记录数
-        total = query.count()
-        logger.info(f"排行榜总数据条数: {total}")
-        
-        # 分页
-        results = query.offset((page - 1) * limit).limit(limit).all()
-        
-        # 格式化结果
-        ranking_data = []
-        for i, (score_id, user_id, face_score, image_url, scored_at, username, nickname, avatar_url) in enumerate(results):
-            # 处理图片URL，确保使用正斜杠
-            if image_url and not image_url.startswith('http'):
-                # 确保路径使用正斜杠且有正确的前缀
-                image_url = image_url.replace('\\', '/')
-                if not image_url.startswith('/'):
-                    image_url = f"/{image_url}"
-            
-            item = {
-                "rank": (page - 1) * limit + i + 1,
-                "user_id": user_id,
-                "score_id": score_id,
-                "username": username,
-                "nickname": nickname or username,
-                "avatar": avatar_url,
-                "highest_score": face_score,
-                "image_url": image_url,
-                "scored_at": scored_at.isoformat() if scored_at else None
-            }
-            ranking_data.append(item)
-            logger.info(f"添加排行榜数据: {item}")
-        
-        response = {
-            "total": total,
-            "page": page,
-            "limit": limit,
-            "data": ranking_data
-        }
-        logger.info(f"返回排行榜数据: {response}")
-        return response
-        
     except Exception as e:
         logger.error(f"获取排行榜数据出错: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"获取排行榜数据失败: {str(e)}"
-        ) 
\ No newline at end of file
+        ) 
+
+@router.get("/friends")
+async def get_friend_rankings(
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, ge=1, le=100),
+    fields: FieldSet = Depends(ranking_fields),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    """获取好友排行榜（自己和好友以公开评分中的最高分排名）"""
+    friend_ids = FriendService(db).friend_ids(current_user.user_id)
+    return LeaderboardService(db).get_friend_rankings(current_user.user_id, friend_ids, page, limit, fields)
+
+@router.get("/elo")
+async def get_elo_ladder(
+    request: Request,
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, ge=1, le=100),
+    fields: FieldSet = Depends(ranking_fields),
+    db: Session = Depends(get_db)
+) -> Any:
+    """获取Elo天梯（参加过PK的用户按Elo分数排名，同分同名次）"""
+    logger.debug("获取Elo天梯数据，页码: %s, 每页数量: %s", page, limit)
+    service = LeaderboardService(db)
+    return await response_cache.respond(
+        request, ("elo_ladder", page, limit, fields), service.elo_version(),
+        lambda: service.get_elo_ladder(page, limit, fields),
+        cache_control=RANKINGS_CACHE_CONTROL
+    )
+
+@router.get("/elo/me")
+async def get_my_elo_rank(
+    radius: int = Query(5, ge=0, le=50, description="返回前后各多少名玩家"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    """获取当前用户的天梯名次和分数相近的玩家"""
+    return LeaderboardService(db).get_my_elo_rank(current_user, radius)
+
+@router.get("/regional/me")
+async def get_my_regional_rank(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    """获取当前用户在所在地区排行榜中的名次"""
+    return LeaderboardService(db).get_my_regional_rank(current_user)
+
+@router.get("/regional/{region_code}")
+async def get_regional_rankings(
+    region_code: str,
+    request: Request,
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, ge=1, le=100),
+    fields: FieldSet = Depends(ranking_fields),
+    db: Session = Depends(get_db)
+) -> Any:
+    """获取地区颜值排行榜（每个用户以公开评分中的最高分上榜）"""
+    logger.debug("获取地区排行榜数据，地区: %s, 页码: %s, 每页数量: %s", region_code, page, limit)
+    try:
+        service = LeaderboardService(db)
+        return await response_cache.respond(
+            request, ("regional_rankings", region_code, page, limit, fields), service.regional_version(region_code),
+            lambda: service.get_regional_rankings(region_code, page, limit, fields),
+            cache_control=RANKINGS_CACHE_CONTROL
+        )
+    except Exception as e:
+        logger.error(f"获取地区排行榜数据出错: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取地区排行榜数据失败: {str(e)}"
+        )
+
+@router.get("/window/{window}")
+async def get_window_rankings(
+    window: str,
+    request: Request,
+    page: int = Query(1, ge=1),
+    limit: int = Query(10, ge=1, le=100),
+    fields: FieldSet = Depends(ranking_fields),
+    db: Session = Depends(get_db)
+) -> Any:
+    """获取日榜（daily）、周榜（weekly）或月榜（monthly），按最近1/7/30天（UTC）的公开照片排名"""
+    if window not in WINDOWS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"不支持的排行榜周期: {window}"
+        )
+    logger.debug("获取%s排行榜数据，页码: %s, 每页数量: %s", window, page, limit)
+    try:
+        service = LeaderboardService(db)
+        return await response_cache.respond(
+            request, ("window_rankings", window, page, limit, fields), service.window_version(window),
+            lambda: service.get_window_rankings(window, page, limit, fields),
+            cache_control=RANKINGS_CACHE_CONTROL
+        )
+    except Exception as e:
+        logger.error(f"获取{window}排行榜数据出错: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取排行榜数据失败: {str(e)}"
+        )
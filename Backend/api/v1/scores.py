@@ -1,16 +1,20 @@
 from typing import Any, List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, status, UploadFile, File, Form
 from sqlalchemy.orm import Session
 
 from schemas.score import ScoreResponse, ScoreCreate, ScorePagination
-from services.scoring import ScoringService
+from services.scoring import ScoringService, SCORE_FIELDS, SCORE_LIST_FIELDS, SCORE_DETAIL_FIELDS
 from services.auth import get_current_user
 from models.user import User
 from db.session import get_db
+from core.http_cache import response_cache
+from core.fields import FieldSet, sparse_fields
 
 router = APIRouter(prefix="/scores", tags=["颜值评分"])
 
-@router.post("/", response_model=ScoreResponse, status_code=status.HTTP_201_CREATED)
+# 上传结果不包含只在查询时可选的字段（user_id、feature_data、service_type）
+@router.post("/", response_model=ScoreResponse, status_code=status.HTTP_201_CREATED,
+             response_model_exclude={"user_id", "feature_data", "service_type"})
 async def upload_and_score(
     image: UploadFile = File(...),
     is_public: bool = Form(True),
@@ -32,15 +36,16 @@ async def upload_and_score(
     
     return result
 
-@router.get("/", response_model=ScorePagination)
+@router.get("/", response_model=ScorePagination, response_model_exclude_unset=True)
 async def get_scores(
     user_id: Optional[int] = None,
     page: int = 1,
     limit: int = 10,
+    fields: FieldSet = Depends(sparse_fields(SCORE_FIELDS, SCORE_LIST_FIELDS)),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ) -> Any:
-    """获取评分记录"""
+    """获取评分记录（fields/include 选择返回的字段，只查询这些字段需要的列）"""
     scoring_service = ScoringService(db)
     
     # 如果未指定用户ID，则默认为当前用户
@@ -53,7 +58,8 @@ async def get_scores(
         user_id=target_user_id,
         page=page,
         limit=limit,
-        only_public=not is_owner
+        only_public=not is_owner,
+        fields=fields
     )
     
     return result
@@ -61,12 +67,18 @@ async def get_scores(
 @router.get("/{score_id}", response_model=ScoreResponse)
 async def get_score_detail(
     score_id: int,
+    request: Request,
+    fields: FieldSet = Depends(sparse_fields(SCORE_FIELDS, SCORE_DETAIL_FIELDS)),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ) -> Any:
-    """获取单条评分详情"""
+    """
+    获取单条评分详情（带 ETag，记录未变化时不重新生成详情，If-None-Match 命中时返回 304）
+    
+    默认不返回完整特征数据，include=feature_data 时才加载人脸关键点。
+    """
     scoring_service = ScoringService(db)
-    score = scoring_service.get_score_by_id(score_id)
+    score = scoring_service.get_score_version(score_id)
     
     if not score:
         raise HTTPException(
@@ -81,4 +93,11 @@ async def get_score_detail(
             detail="没有权限访问此评分记录"
         )
     
-    return score 
\ No newline at end of file
+    def build():
+        detail = scoring_service.get_score_by_id(score_id, fields)
+        return ScoreResponse.model_validate(detail).model_dump(mode="json", exclude_unset=True)
+    
+    return await response_cache.respond(
+        request, ("score", score_id, fields), tuple(score), build,
+        cache_control="private, no-cache", vary="Authorization"
+    ) 
\ No newline at end of file
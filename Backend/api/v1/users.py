@@ -0,0 +1,35 @@
+from typing import Any
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+
+from schemas.stats import UserStatsResponse
+from services.stats import StatsService
+from services.auth import get_current_user
+from models.user import User
+from db.session import get_db
+
+router = APIRouter(prefix="/users", tags=["用户"])
+
+@router.get("/me/stats", response_model=UserStatsResponse)
+async def get_my_stats(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    """获取当前用户的统计数据"""
+    stats = StatsService(db).get_user_stats(current_user.user_id)
+    return {"user_id": current_user.user_id, **stats}
+
+@router.get("/{user_id}/stats", response_model=UserStatsResponse)
+async def get_user_stats(
+    user_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    """获取用户的统计数据（评分数、平均分、最高分、胜负场次、排名）"""
+    if db.get(User, user_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="用户不存在"
+        )
+    stats = StatsService(db).get_user_stats(user_id)
+    return {"user_id": user_id, **stats}
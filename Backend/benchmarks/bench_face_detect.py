@@ -0,0 +1,82 @@
+"""
+人脸检测容错策略基准测试
+
+使用 MockFaceProvider 注入长尾延迟和错误，对比不同容错配置下的延迟分布和成功率：
+    python benchmarks/bench_face_detect.py --requests 400 --concurrency 16
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import logging
+
+# 添加后端根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import summarize, format_summary
+from core.resilience import CircuitBreaker
+from services.face_provider import MockFaceProvider, build_face_detector
+
+
+async def run_scenario(name: str, args, **options) -> None:
+    provider = MockFaceProvider(
+        latency=args.latency,
+        jitter=args.jitter,
+        tail_rate=args.tail_rate,
+        tail_latency=args.tail_latency,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    options.setdefault("max_workers", args.concurrency * 2)
+    # 只比较容错策略，不受配额限流影响
+    options.setdefault("rate_limiter", None)
+    detector = build_face_detector(provider, **options)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    successes = 0
+
+    async def one(i: int) -> None:
+        nonlocal successes
+        async with semaphore:
+            started = time.perf_counter()
+            result = await detector.detect(f"image-{i}".encode())
+            latencies.append(time.perf_counter() - started)
+            if result["success"]:
+                successes += 1
+
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    print(format_summary(name, summarize(latencies)),
+          f"success={successes / args.requests:6.1%} upstream_calls={provider.calls}")
+
+
+async def main(args) -> None:
+    print(f"故障注入: latency={args.latency}s tail_rate={args.tail_rate} "
+          f"tail_latency={args.tail_latency}s error_rate={args.error_rate}")
+    # 旧行为：没有超时，不重试
+    await run_scenario("no-timeout", args, attempt_timeout=60, deadline=60, max_retries=0)
+    # 单次超时 + 预算内的抖动退避重试
+    await run_scenario("timeout+retry", args, attempt_timeout=0.5, deadline=2.0, max_retries=2)
+    # 在此基础上，首个请求超过 p95 仍未返回时发起对冲请求
+    await run_scenario("timeout+retry+hedge", args, attempt_timeout=0.5, deadline=2.0, max_retries=2,
+                       hedge_delay=args.hedge_delay)
+
+    # 上游完全不可用时，熔断器打开后请求应快速失败
+    args.error_rate = 1.0
+    await run_scenario("upstream-down+breaker", args, attempt_timeout=0.5, deadline=2.0, max_retries=2,
+                       breaker=CircuitBreaker(failure_threshold=5, reset_timeout=30))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.ERROR)
+    parser = argparse.ArgumentParser(description="人脸检测容错策略基准测试")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.03)
+    parser.add_argument("--tail-rate", type=float, default=0.05)
+    parser.add_argument("--tail-latency", type=float, default=3.0)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--hedge-delay", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
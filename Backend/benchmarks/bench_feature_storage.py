@@ -0,0 +1,147 @@
+"""
+人脸特征存储方式对比：完整JSON（旧） vs 拆分列 + 打包关键点（新）
+
+先按旧格式写入完整的 feature_data，用旧的加载方式（每次查询都读出并解析整个JSON）测量，
+再执行迁移 0001_score_face_columns，用新的加载方式（关键点和剩余字段延迟加载）测量：
+    python benchmarks/bench_feature_storage.py --scores 20000 --repeat 50
+
+查询覆盖评分列表、PK历史和相似图片扫描（全表读取公开评分）三种场景。
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+# 添加后端根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import prepare_workdir, summarize, format_summary
+
+# 批量写入和VACUUM会触发慢查询日志，关闭以免刷屏
+os.environ.setdefault("SLOW_QUERY_MS", "0")
+
+HISTORY_USER = 1
+
+
+def fill_legacy_features(engine, scores: int) -> None:
+    """按旧格式写入完整的特征数据（常用字段列为空）"""
+    from sqlalchemy import bindparam
+    from models.score import Score
+    from services.face_provider import synthetic_face_info
+
+    table = Score.__table__
+    update = table.update().where(table.c.score_id == bindparam("_score_id")).values(
+        feature_data=bindparam("feature_data"), beauty=None,
+    )
+    with engine.begin() as conn:
+        conn.execute(update, [
+            {"_score_id": score_id, "feature_data": synthetic_face_info(score_id)}
+            for score_id in range(1, scores + 1)
+        ])
+
+
+def seed_history(engine, users: int, scores: int, count: int) -> None:
+    import random
+    from models.match import Match, MatchResult
+
+    rng = random.Random(7)
+    with engine.begin() as conn:
+        conn.execute(Match.__table__.insert(), [
+            {"challenger_id": HISTORY_USER, "opponent_id": rng.randint(2, users),
+             "challenger_score_id": rng.randint(1, scores), "opponent_score_id": rng.randint(1, scores),
+             "challenger_score": 60.0, "opponent_score": 50.0, "result": MatchResult.WIN.name,
+             "points_changed": 15}
+            for _ in range(count)
+        ])
+
+
+def storage_stats(engine) -> dict:
+    from migrate_db import vacuum
+
+    vacuum(engine)
+    with engine.connect() as conn:
+        row = conn.exec_driver_sql(
+            "SELECT COUNT(*), SUM(LENGTH(feature_data)), SUM(COALESCE(LENGTH(landmarks), 0)) FROM scores"
+        ).one()
+        page_count = conn.exec_driver_sql("PRAGMA page_count").scalar()
+        page_size = conn.exec_driver_sql("PRAGMA page_size").scalar()
+    count, json_bytes, blob_bytes = row
+    return {"rows": count, "bytes_per_row": (json_bytes + blob_bytes) / count, "file_bytes": page_count * page_size}
+
+
+def eager_features(session) -> None:
+    """还原旧的映射方式：查询评分记录时总是一并读出特征数据"""
+    from sqlalchemy import event
+    from sqlalchemy.orm import Load
+    from models.score import Score
+
+    @event.listens_for(session, "do_orm_execute")
+    def _undefer(state):
+        if state.is_select:
+            state.statement = state.statement.options(Load(Score).undefer_group("face_detail"))
+
+
+def measure(name: str, session, args) -> None:
+    from sqlalchemy import func
+    from models.score import Score
+    from services.match import MatchService
+    from services.scoring import ScoringService
+
+    scoring = ScoringService(session)
+    matches = MatchService(session)
+    loop = asyncio.new_event_loop()
+    # 评分记录最多的用户
+    user_id = session.query(Score.user_id).group_by(Score.user_id).order_by(
+        func.count().desc()).first()[0]
+    cases = {
+        "评分列表(100条)": lambda: scoring.get_user_scores(user_id, 1, 100),
+        "PK历史(50条)": lambda: loop.run_until_complete(matches.get_match_history(HISTORY_USER, 1, 50)),
+        "公开评分全表读取": lambda: session.query(Score).filter(Score.is_public.is_(True)).all(),
+    }
+    for case_name, run in cases.items():
+        latencies = []
+        for _ in range(args.repeat):
+            session.expunge_all()
+            t0 = time.perf_counter()
+            run()
+            latencies.append(time.perf_counter() - t0)
+        print(format_summary(f"{name} {case_name}", summarize(latencies)))
+    loop.close()
+
+
+def main(args) -> None:
+    prepare_workdir(users=args.users, scores=args.scores)
+    from config.database import SessionLocal, engine
+    from migrate_db import score_face_columns
+
+    seed_history(engine, args.users, args.scores, 50)
+    fill_legacy_features(engine, args.scores)
+
+    legacy = storage_stats(engine)
+    session = SessionLocal()
+    eager_features(session)
+    measure("legacy", session, args)
+    session.close()
+
+    # prepare_workdir 直接按当前模型建表，这里单独执行转换步骤
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        score_face_columns(conn)
+    print(f"迁移 {args.scores} 条记录耗时 {time.perf_counter() - started:.2f}秒")
+
+    compact = storage_stats(engine)
+    session = SessionLocal()
+    measure("compact", session, args)
+    session.close()
+
+    for name, stats in (("legacy", legacy), ("compact", compact)):
+        print(f"{name:<8} 特征数据 {stats['bytes_per_row']:7.0f} 字节/行  数据库文件 {stats['file_bytes'] / 1048576:6.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="人脸特征存储基准测试")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--scores", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=30)
+    main(parser.parse_args())
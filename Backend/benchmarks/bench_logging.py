@@ -0,0 +1,73 @@
+"""
+日志管线对排行榜接口吞吐量的影响
+
+legacy: 同步写控制台和文件，并按旧代码的日志量（每条排行榜数据、整个响应体都记录）输出
+queued: 队列异步日志 + 大载荷日志降为DEBUG并延迟格式化
+    python benchmarks/bench_logging.py --requests 300 --limit 100
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import logging
+import logging.config
+
+# 添加后端根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import prepare_workdir, summarize, format_summary
+
+
+def configure_legacy_logging() -> None:
+    """旧的日志配置：同步处理器；DEBUG级别用来还原降级前的INFO日志量"""
+    logging.config.dictConfig({
+        'version': 1,
+        'disable_existing_loggers': False,
+        'formatters': {'standard': {'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s'}},
+        'handlers': {
+            'console': {'class': 'logging.StreamHandler', 'formatter': 'standard', 'stream': open(os.devnull, 'w')},
+            'file': {'class': 'logging.handlers.RotatingFileHandler', 'formatter': 'standard',
+                     'filename': 'logs/legacy.log', 'maxBytes': 10485760, 'backupCount': 1, 'encoding': 'utf-8'},
+        },
+        'loggers': {'': {'handlers': ['console', 'file'], 'level': 'DEBUG'}},
+    })
+
+
+async def run(name: str, client, args) -> None:
+    # 测试客户端自身的请求日志不计入
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    latencies = []
+    started = time.perf_counter()
+    for i in range(args.requests):
+        page = i % 5 + 1
+        t0 = time.perf_counter()
+        response = await client.get(f"/api/v1/rankings/global?page={page}&limit={args.limit}")
+        latencies.append(time.perf_counter() - t0)
+        assert response.status_code == 200, response.text
+    elapsed = time.perf_counter() - started
+    print(format_summary(name, summarize(latencies)), f"吞吐量={args.requests / elapsed:7.1f} 次/秒")
+
+
+async def main(args) -> None:
+    prepare_workdir(scores=args.scores)
+    import httpx
+    import main as app_module
+    from config.logging_config import setup_logging, stop_logging
+
+    async with httpx.AsyncClient(app=app_module.app, base_url="http://bench") as client:
+        stop_logging()
+        configure_legacy_logging()
+        await run("legacy", client, args)
+
+        setup_logging()
+        await run("queued", client, args)
+        stop_logging()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="日志管线基准测试")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--scores", type=int, default=2000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,68 @@
+"""
+登录吞吐量与事件循环阻塞基准测试
+
+模拟一波并发登录，同时用一个定时协程测量事件循环的调度延迟（代表同一进程中的评分、排行榜请求），
+对比在事件循环中直接计算bcrypt与放入线程池计算两种方式：
+    python benchmarks/bench_login.py --logins 40 --concurrency 20
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+# 添加后端根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import summarize, format_summary
+from core.security import get_password_hash, verify_password, verify_password_async
+
+PASSWORD = "benchmark-password"
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float, lags: list) -> None:
+    """每隔 interval 秒醒来一次，记录实际醒来时间与预期的偏差"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(loop.time() - expected, 0.0))
+
+
+async def run_scenario(name: str, verify, hashed: str, args) -> None:
+    semaphore = asyncio.Semaphore(args.concurrency)
+    stop = asyncio.Event()
+    lags = []
+    ticker = asyncio.create_task(measure_loop_lag(stop, 0.005, lags))
+
+    async def one() -> None:
+        async with semaphore:
+            await verify(PASSWORD, hashed)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(args.logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+
+    print(f"{name:<12} 吞吐量={args.logins / elapsed:7.1f} 次/秒 耗时={elapsed:6.2f}秒")
+    print(format_summary("  事件循环延迟", summarize(lags)))
+
+
+async def main(args) -> None:
+    hashed = get_password_hash(PASSWORD)
+    print(f"哈希: {hashed[:7]}...  并发登录数: {args.logins}")
+
+    async def blocking_verify(password: str, hashed_password: str):
+        # 旧实现：直接在协程里调用bcrypt
+        return verify_password(password, hashed_password)
+
+    await run_scenario("blocking", blocking_verify, hashed, args)
+    await run_scenario("offloaded", verify_password_async, hashed, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="登录吞吐量基准测试")
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
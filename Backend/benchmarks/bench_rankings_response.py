@@ -0,0 +1,83 @@
+"""
+排行榜响应的序列化与缓存对每个请求CPU耗时的影响
+
+stdlib:     每次重新生成榜单页，jsonable_encoder + json.dumps 序列化（未使用 orjson 时的路径）
+orjson:     每次重新生成榜单页，orjson 序列化
+cached:     榜单未变化，直接返回缓存的响应体
+revalidate: 客户端带 If-None-Match 轮询，返回 304
+    python benchmarks/bench_rankings_response.py --requests 500 --limit 100
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import logging
+
+# 添加后端根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import prepare_workdir, summarize, format_summary
+
+
+async def run(name: str, client, args, headers=None, before=None) -> None:
+    from core import http_cache
+
+    latencies = []
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    for i in range(args.requests):
+        page = i % args.pages + 1
+        if before is not None:
+            before()
+        t0 = time.perf_counter()
+        response = await client.get(f"/api/v1/rankings/global?page={page}&limit={args.limit}",
+                                    headers=headers(page) if headers else None)
+        latencies.append(time.perf_counter() - t0)
+        assert response.status_code in (200, 304), response.text
+    elapsed = time.perf_counter() - started
+    cpu = (time.process_time() - cpu_started) / args.requests * 1000
+    print(format_summary(name, summarize(latencies)),
+          f"CPU={cpu:6.2f}ms/次 吞吐量={args.requests / elapsed:7.1f} 次/秒")
+    http_cache.response_cache.clear()
+
+
+async def main(args) -> None:
+    prepare_workdir(scores=args.scores)
+    import httpx
+    import main as app_module
+    from config.logging_config import stop_logging
+    from core import http_cache
+
+    stop_logging()
+    logging.disable(logging.WARNING)
+    cache = http_cache.response_cache
+    async with httpx.AsyncClient(app=app_module.app, base_url="http://bench") as client:
+        # 预热：加载榜单、编译SQL
+        await client.get(f"/api/v1/rankings/global?limit={args.limit}")
+
+        orjson_available = http_cache.ORJSON_AVAILABLE
+        http_cache.ORJSON_AVAILABLE = False
+        await run("stdlib", client, args, before=cache.clear)
+        http_cache.ORJSON_AVAILABLE = orjson_available
+        if orjson_available:
+            await run("orjson", client, args, before=cache.clear)
+        else:
+            print("未安装 orjson，跳过 orjson")
+
+        await run("cached", client, args)
+
+        etags = {}
+        for page in range(1, args.pages + 1):
+            response = await client.get(f"/api/v1/rankings/global?page={page}&limit={args.limit}")
+            etags[page] = response.headers["etag"]
+        await run("revalidate", client, args, headers=lambda page: {"If-None-Match": etags[page]})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="排行榜响应序列化与缓存基准测试")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--pages", type=int, default=5, help="轮流请求的页数")
+    parser.add_argument("--scores", type=int, default=2000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,110 @@
+"""
+响应编码对最重接口的传输大小和延迟的影响
+
+每个接口分别以 JSON、gzip、br、MessagePack、MessagePack+br 请求，
+输出传输字节数（压缩后）、缓存命中时和每次重新生成响应时的延迟：
+    python benchmarks/bench_response_encoding.py --requests 200
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import logging
+from datetime import datetime, timedelta
+
+# 添加后端根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import prepare_workdir, summarize
+
+REPRESENTATIONS = {
+    "json": {"Accept-Encoding": "identity"},
+    "json+gzip": {"Accept-Encoding": "gzip"},
+    "json+br": {"Accept-Encoding": "br"},
+    "msgpack": {"Accept-Encoding": "identity", "Accept": "application/msgpack"},
+    "msgpack+br": {"Accept-Encoding": "br", "Accept": "application/msgpack"},
+}
+
+
+def seed(args) -> None:
+    """用户1的对战历史和一条带完整特征数据（含关键点）的评分"""
+    from config.database import SessionLocal, engine
+    from models.match import Match, MatchResult
+    from models.score import Score
+    from services.face_provider import synthetic_face_info
+
+    rng = random.Random(args.seed)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(Match.__table__.insert(), [
+            {"challenger_id": 1 if i % 2 == 0 else rng.randint(2, 200),
+             "opponent_id": rng.randint(2, 200) if i % 2 == 0 else 1,
+             "challenger_score_id": rng.randint(1, args.scores), "opponent_score_id": rng.randint(1, args.scores),
+             "challenger_score": round(rng.uniform(20, 99), 2), "opponent_score": round(rng.uniform(20, 99), 2),
+             "result": rng.choice(list(MatchResult)).name, "points_changed": 15,
+             "matched_at": now - timedelta(minutes=i)}
+            for i in range(200)
+        ])
+    db = SessionLocal()
+    score = db.get(Score, 1)
+    score.user_id = 1
+    score.set_face_info(synthetic_face_info(args.seed))
+    db.commit()
+    db.close()
+
+
+async def measure(client, path: str, headers: dict, args, cold: bool):
+    from core.http_cache import response_cache
+
+    latencies = []
+    size = 0
+    for _ in range(args.requests):
+        if cold:
+            response_cache.clear()
+        t0 = time.perf_counter()
+        response = await client.get(path, headers=headers)
+        latencies.append(time.perf_counter() - t0)
+        assert response.status_code == 200, response.text
+        size = response.num_bytes_downloaded
+    return size, summarize(latencies)["p50_ms"]
+
+
+async def main(args) -> None:
+    prepare_workdir(scores=args.scores, seed=args.seed)
+    seed(args)
+    import httpx
+    import main as app_module
+    from config.logging_config import stop_logging
+    from core.security import create_access_token
+
+    stop_logging()
+    logging.disable(logging.WARNING)
+    auth = {"Authorization": f"Bearer {create_access_token(1)}"}
+    endpoints = [
+        ("全站榜(照片,100条)", "/api/v1/rankings/global?limit=100", {}),
+        ("全站榜(用户,100条)", "/api/v1/rankings/global?view=user&limit=100", {}),
+        ("对战历史(100条)", "/api/v1/matches/user/1?limit=100", auth),
+        ("评分详情", "/api/v1/scores/1", auth),
+        ("月榜(100条)", "/api/v1/rankings/window/monthly?limit=100", {}),
+    ]
+    async with httpx.AsyncClient(app=app_module.app, base_url="http://bench") as client:
+        print(f"{'接口':<20}{'表示形式':<12}{'字节数':>9}{'压缩比':>8}{'命中p50':>10}{'重新生成p50':>13}")
+        for name, path, headers in endpoints:
+            baseline = None
+            for representation, extra in REPRESENTATIONS.items():
+                request_headers = dict(headers, **extra)
+                await client.get(path, headers=request_headers)  # 预热
+                size, hot = await measure(client, path, request_headers, args, cold=False)
+                _, cold = await measure(client, path, request_headers, args, cold=True)
+                baseline = baseline or size
+                print(f"{name:<20}{representation:<12}{size:>9}{size / baseline:>8.0%}{hot:>8.2f}ms{cold:>11.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="响应编码基准测试")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--scores", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,72 @@
+"""
+基准测试公共工具
+"""
+import math
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta
+from typing import Dict, List, Sequence
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """计算百分位数（最近秩法）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    # 第 ceil(pct% * n) 个值；先乘后除，避免 pct / 100 的浮点误差多进一位
+    index = max(0, min(len(ordered) - 1, math.ceil(pct * len(ordered) / 100.0) - 1))
+    return ordered[index]
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    """汇总延迟分布，单位为毫秒"""
+    return {
+        "count": len(latencies),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": (max(latencies) if latencies else 0.0) * 1000,
+    }
+
+
+def format_summary(name: str, summary: Dict[str, float]) -> str:
+    return (
+        f"{name:<28} n={summary['count']:<6} p50={summary['p50_ms']:8.1f}ms "
+        f"p95={summary['p95_ms']:8.1f}ms p99={summary['p99_ms']:8.1f}ms max={summary['max_ms']:8.1f}ms"
+    )
+
+
+def prepare_workdir(users: int = 200, scores: int = 2000, seed: int = 42, password_hash: str = "x") -> str:
+    """
+    在临时目录中创建并填充测试数据库，然后切换到该目录
+
+    数据库地址和日志目录都是相对路径，必须在导入 main/config 之前调用。
+    用户名为 bench{i}，所有用户共用 password_hash（需要登录时传入真实的密码哈希）。
+    """
+    workdir = tempfile.mkdtemp(prefix="face_score_bench_")
+    os.makedirs(os.path.join(workdir, "uploads"))
+    os.chdir(workdir)
+
+    from config.database import Base, engine
+    import db.models_import  # noqa: F401  注册所有模型
+    from models.user import User
+    from models.score import Score
+
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"user_id": i, "username": f"bench{i}", "email": f"bench{i}@example.com",
+             "password_hash": password_hash, "nickname": f"压测用户{i}", "elo_rating": 1500, "is_active": True}
+            for i in range(1, users + 1)
+        ])
+        conn.execute(Score.__table__.insert(), [
+            {"user_id": rng.randint(1, users), "image_url": f"/uploads/bench_{i}.jpg",
+             "image_hash": f"{i:032x}", "face_score": round(rng.uniform(20, 99), 2),
+             "beauty": 0.0, "is_public": True,
+             "scored_at": now - timedelta(minutes=rng.randint(0, 60 * 24 * 60))}
+            for i in range(1, scores + 1)
+        ])
+    return workdir
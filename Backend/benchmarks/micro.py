@@ -0,0 +1,366 @@
+"""
+后端热点函数的微基准测试
+
+使用固定种子生成的数据（数据库、图片、特征数据），逐项测量单次调用耗时，
+结果写成JSON，并与保存的基线对比：
+    python benchmarks/micro.py                          # 运行并与 benchmarks/micro_baseline.json 对比
+    python benchmarks/micro.py --filter jwt --repeat 7  # 只运行名称包含 jwt 的用例
+    python benchmarks/micro.py --output result.json     # 保存本次结果
+    python benchmarks/micro.py --save-baseline          # 将本次结果保存为新基线
+
+对比时中位数变慢超过 --threshold（默认10%）的用例标记为回退，--fail-on-regression 时以非零状态退出。
+"""
+import os
+import sys
+import json
+import random
+import asyncio
+import argparse
+import platform
+import statistics
+import subprocess
+import timeit
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+# 添加后端根目录到Python路径
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+from benchmarks.common import prepare_workdir
+
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, "benchmarks", "micro_baseline.json")
+
+# 用例注册表：名称 -> 准备函数（接收 Fixtures，返回被测的无参函数）
+CASES: Dict[str, Callable] = {}
+
+
+def case(name: str):
+    def decorator(setup: Callable) -> Callable:
+        CASES[name] = setup
+        return setup
+    return decorator
+
+
+class Fixtures:
+    """固定种子的测试数据，所有用例共享"""
+
+    USERS = 200
+    SCORES = 2000
+    IMAGES = 100
+    HISTORY_MATCHES = 60
+
+    def __init__(self, seed: int):
+        os.environ.setdefault("FACE_DETECT_PROVIDER", "mock")
+        os.environ.setdefault("FACE_DETECT_RATE_LIMIT_BACKEND", "local")
+        self.workdir = prepare_workdir(users=self.USERS, scores=self.SCORES, seed=seed)
+
+        from loadtest.data import synthetic_jpeg
+        from services.face_provider import synthetic_face_info
+
+        rng = random.Random(seed)
+        for i in range(1, self.IMAGES + 1):
+            with open(os.path.join("uploads", f"bench_{i}.jpg"), "wb") as f:
+                f.write(synthetic_jpeg(seed * 1000003 + i))
+        self.image = synthetic_jpeg(seed)
+        self.face_info = synthetic_face_info(seed)
+        self._seed_matches(rng)
+
+        from config.database import SessionLocal
+        self.db = SessionLocal()
+        self.loop = asyncio.new_event_loop()
+
+    def _seed_matches(self, rng: random.Random) -> None:
+        from config.database import engine
+        from models.match import Match, MatchResult
+
+        now = datetime.utcnow()
+        rows = []
+        for i in range(self.HISTORY_MATCHES):
+            opponent_id = rng.randint(2, self.USERS)
+            challenger_id, opponent_id = (1, opponent_id) if i % 2 == 0 else (opponent_id, 1)
+            rows.append({
+                "challenger_id": challenger_id, "opponent_id": opponent_id,
+                "challenger_score_id": rng.randint(1, self.SCORES), "opponent_score_id": rng.randint(1, self.SCORES),
+                "challenger_score": round(rng.uniform(20, 99), 2), "opponent_score": round(rng.uniform(20, 99), 2),
+                "result": rng.choice(list(MatchResult)).name, "points_changed": 15,
+                "matched_at": now - timedelta(minutes=i),
+            })
+        with engine.begin() as conn:
+            conn.execute(Match.__table__.insert(), rows)
+
+    def run_async(self, coro_factory: Callable) -> Callable:
+        return lambda: self.loop.run_until_complete(coro_factory())
+
+
+@case("hash.md5")
+def _(fx: Fixtures):
+    from services.scoring import ScoringService
+    service = ScoringService(fx.db)
+    return lambda: service._calculate_image_hash(fx.image)
+
+
+@case("hash.perceptual")
+def _(fx: Fixtures):
+    from services.scoring import ScoringService
+    service = ScoringService(fx.db)
+    return lambda: service._calculate_perceptual_hash(fx.image)
+
+
+@case("scoring.find_similar_images")
+def _(fx: Fixtures):
+    from services.scoring import ScoringService
+    service = ScoringService(fx.db)
+    # 不与任何已有图片相同的新图片，走完整的相似度扫描
+    from loadtest.data import synthetic_jpeg
+    image = synthetic_jpeg(-1)
+    return lambda: service._find_similar_images(image)
+
+
+@case("scoring.calculate_score")
+def _(fx: Fixtures):
+    from services.scoring import ScoringService
+    service = ScoringService(fx.db)
+    return lambda: service.calculate_score(fx.face_info)
+
+
+@case("rankings.build_query")
+def _(fx: Fixtures):
+    from sqlalchemy import desc
+    from models.score import Score
+    from models.user import User
+
+    def build():
+        query = fx.db.query(
+            Score.score_id, Score.user_id, Score.face_score, Score.image_url, Score.scored_at,
+            User.username, User.nickname, User.avatar_url
+        ).join(User, User.user_id == Score.user_id).filter(Score.is_public == True).order_by(desc(Score.face_score))
+        return str(query.offset(0).limit(100).statement.compile())
+    return build
+
+
+def _request(path: str, headers: Optional[Dict[str, str]] = None):
+    from starlette.requests import Request
+    return Request({
+        "type": "http", "method": "GET", "path": path, "query_string": b"",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+    })
+
+
+@case("rankings.global_page")
+def _(fx: Fixtures):
+    # 榜单未变化：直接返回缓存的响应体
+    from api.v1.rankings import get_global_rankings
+    from services.leaderboard import RANKING_FIELDS
+    request = _request("/api/v1/rankings/global")
+    return fx.run_async(lambda: get_global_rankings(request, page=3, limit=100, view="photo",
+                                                    fields=RANKING_FIELDS, db=fx.db))
+
+
+@case("rankings.global_page_rebuild")
+def _(fx: Fixtures):
+    # 榜单变化后：重新生成并序列化榜单页
+    from core.http_cache import render_json
+    from services.leaderboard import LeaderboardService
+    service = LeaderboardService(fx.db)
+    return lambda: render_json(service.get_global_rankings("photo", 3, 100))
+
+
+def _rankings_page(fx: Fixtures) -> Dict:
+    from services.leaderboard import LeaderboardService
+    return LeaderboardService(fx.db).get_global_rankings("photo", 3, 100)
+
+
+@case("serialize.rankings_page_jsonable")
+def _(fx: Fixtures):
+    # FastAPI 默认的序列化路径：jsonable_encoder + json.dumps
+    from fastapi.encoders import jsonable_encoder
+    page = _rankings_page(fx)
+    return lambda: json.dumps(jsonable_encoder(page), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+@case("serialize.rankings_page_fast")
+def _(fx: Fixtures):
+    # 应用的响应序列化（有 orjson 时使用 orjson）
+    from core.http_cache import render_json
+    page = _rankings_page(fx)
+    return lambda: render_json(page)
+
+
+@case("match.get_match_history")
+def _(fx: Fixtures):
+    from services.match import MatchService
+    service = MatchService(fx.db)
+    return fx.run_async(lambda: service.get_match_history(1, page=1, limit=50))
+
+
+@case("match.get_match_history_lean")
+def _(fx: Fixtures):
+    # 只取对战结果，不查询双方用户和评分记录
+    from services.match import MatchService
+    service = MatchService(fx.db)
+    fields = ("match_id", "result", "points_change", "matched_at")
+    return fx.run_async(lambda: service.get_match_history(1, page=1, limit=50, fields=fields))
+
+
+@case("security.jwt_encode")
+def _(fx: Fixtures):
+    from core.security import create_access_token
+    return lambda: create_access_token(12345)
+
+
+@case("security.jwt_decode")
+def _(fx: Fixtures):
+    from core.security import create_access_token, decode_token
+    token = create_access_token(12345)
+    return lambda: decode_token(token)
+
+
+def _score_payload(fx: Fixtures) -> Dict:
+    return {
+        "success": True, "score_id": 1, "face_score": fx.face_info["beauty"], "image_url": "/uploads/1_x.jpg",
+        "feature_highlights": {"beauty": fx.face_info["beauty"], "age": fx.face_info["age"], "gender": "female",
+                               "face_shape": "oval", "expression": "smile"},
+        "score_details": [{"category": f"项目{i}", "score": 8, "description": "描述"} for i in range(4)],
+        "created_at": datetime(2025, 1, 1).isoformat(), "is_public": True,
+    }
+
+
+def _match_payload() -> Dict:
+    user = {"user_id": 1, "username": "bench1", "avatar_url": None, "score": 88.5, "image_url": "/uploads/1_x.jpg"}
+    return {
+        "success": True, "match_id": 1, "challenger": user, "opponent": dict(user, user_id=2, username="bench2"),
+        "result": "Win", "points_change": 15, "new_rating": 1515, "matched_at": datetime(2025, 1, 1),
+    }
+
+
+@case("serialize.score_response_pydantic")
+def _(fx: Fixtures):
+    from schemas.score import ScoreResponse
+    payload = _score_payload(fx)
+    return lambda: ScoreResponse.model_validate(payload).model_dump_json()
+
+
+@case("serialize.match_response_pydantic")
+def _(fx: Fixtures):
+    from schemas.match import MatchResponse
+    payload = _match_payload()
+    return lambda: MatchResponse.model_validate(payload).model_dump_json()
+
+
+@case("serialize.match_response_jsonable")
+def _(fx: Fixtures):
+    # FastAPI 默认的响应路径：按 response_model 校验后 jsonable_encoder + json.dumps
+    from fastapi.encoders import jsonable_encoder
+    from schemas.match import MatchResponse
+    payload = _match_payload()
+    return lambda: json.dumps(jsonable_encoder(MatchResponse.model_validate(payload)))
+
+
+def measure(func: Callable, repeat: int, min_time: float) -> Dict:
+    """先自动确定循环次数使单轮耗时不少于 min_time，再重复 repeat 轮，返回单次调用耗时（微秒）"""
+    timer = timeit.Timer(func)
+    loops, _ = timer.autorange()
+    total = 0.0
+    while True:
+        total = timer.timeit(loops)
+        if total >= min_time:
+            break
+        loops = max(loops * 2, int(loops * min_time / max(total, 1e-9)))
+    per_call = [t / loops * 1e6 for t in [total] + timer.repeat(repeat - 1, loops)]
+    return {
+        "median_us": statistics.median(per_call),
+        "min_us": min(per_call),
+        "stdev_us": statistics.stdev(per_call) if len(per_call) > 1 else 0.0,
+        "loops": loops,
+        "repeat": repeat,
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """打印与基线的对比，返回回退的用例名称"""
+    regressions = []
+    print(f"\n{'用例':<36}{'基线':>12}{'本次':>12}{'变化':>9}")
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<36}{'-':>12}{current['median_us']:>10.1f}us{'新增':>9}")
+            continue
+        change = current["median_us"] / base["median_us"] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  回退"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "  提升"
+        print(f"{name:<36}{base['median_us']:>10.1f}us{current['median_us']:>10.1f}us{change:>+9.1%}{flag}")
+    return regressions
+
+
+def main(args) -> int:
+    names = [name for name in CASES if not args.filter or any(f in name for f in args.filter)]
+    if not names:
+        print(f"没有匹配的用例，可选: {', '.join(CASES)}")
+        return 1
+
+    import logging
+    logging.disable(logging.WARNING)
+    fixtures = Fixtures(args.seed)
+
+    results = {}
+    for name in names:
+        func = CASES[name](fixtures)
+        func()  # 预热（首次调用会触发导入、SQL编译缓存等）
+        results[name] = measure(func, args.repeat, args.min_time)
+        r = results[name]
+        print(f"{name:<36} 中位数 {r['median_us']:>10.1f}us  最小 {r['min_us']:>10.1f}us  "
+              f"标准差 {r['stdev_us']:>8.1f}us  ({r['loops']} 次 x {r['repeat']} 轮)", flush=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    for path in filter(None, [args.output, args.baseline if args.save_baseline else None]):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {path}")
+
+    if args.save_baseline or not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"基线: {args.baseline} (版本 {baseline['meta'].get('revision')}, {baseline['meta'].get('timestamp')})")
+    regressions = compare(results, baseline["results"], args.threshold)
+    if regressions and args.fail_on_regression:
+        print(f"\n性能回退: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="后端热点函数微基准测试")
+    parser.add_argument("--filter", nargs="*", help="只运行名称包含任一关键字的用例")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="每轮最短耗时（秒）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="将本次结果写入JSON文件")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="基线文件")
+    parser.add_argument("--save-baseline", action="store_true", help="将本次结果保存为基线")
+    parser.add_argument("--threshold", type=float, default=0.10, help="判定为回退的变慢比例")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    sys.exit(main(parser.parse_args()))
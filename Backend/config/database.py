@@ -3,6 +3,8 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from config.settings import DATABASE_URL
+from core import metrics
+from core.tracing import install_query_hooks
 
 # 创建数据库引擎
 # 对于SQLite，需要添加connect_args={"check_same_thread": False}
@@ -15,12 +17,28 @@ if DATABASE_URL.startswith('sqlite'):
 else:
     engine = create_engine(DATABASE_URL, pool_pre_ping=True)
 
+# SQL计时：请求级查询统计和慢查询日志
+install_query_hooks(engine)
+
 # 创建会话本地类
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # 创建基本模型类
 Base = declarative_base()
 
+@metrics.collector
+def _collect_pool_metrics():
+    """连接池占用情况，checked_out 接近 size + max_overflow 时说明连接池已饱和"""
+    pool = engine.pool
+    samples = []
+    for key, method in (("size", "size"), ("checked_out", "checkedout"), ("checked_in", "checkedin")):
+        if hasattr(pool, method):
+            samples.append(("db_pool_connections", {"state": key}, getattr(pool, method)()))
+    max_overflow = getattr(pool, "_max_overflow", None)
+    if max_overflow is not None and hasattr(pool, "size"):
+        samples.append(("db_pool_connections", {"state": "capacity"}, pool.size() + max(max_overflow, 0)))
+    yield "db_pool_connections", "gauge", "数据库连接池连接数", samples
+
 # 获取数据库会话
 def get_db():
     db = SessionLocal()
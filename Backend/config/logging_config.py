@@ -1,10 +1,19 @@
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
+import queue
+import random
 import sys
+import threading
+import time
 from pathlib import Path
 import os
+from typing import Dict, Optional
 
 # 修改导入方式，使用相对导入
-from .settings import LOG_LEVEL
+from .settings import LOG_LEVEL, LOG_FORMAT, LOG_QUEUE_SIZE, LOG_SAMPLING, LOG_RATE_LIMIT
 
 # 日志目录
 log_dir = Path('./logs')
@@ -14,7 +23,132 @@ os.makedirs(log_dir, exist_ok=True)
 log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 date_format = '%Y-%m-%d %H:%M:%S'
 
+# 日志记录对象的标准属性，其余属性视为结构化字段（通过 extra= 传入）
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """结构化日志格式，每条日志输出一行JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # 队列处理器已在调用线程中格式化了异常
+            data["exc_info"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def _match_logger(name: str, rules: Dict[str, float]) -> Optional[float]:
+    """按最长前缀匹配日志记录器名称"""
+    best = None
+    for prefix, value in rules.items():
+        if name == prefix or name.startswith(prefix + "."):
+            if best is None or len(prefix) > len(best):
+                best = prefix
+    return rules[best] if best is not None else None
+
+
+class SamplingFilter(logging.Filter):
+    """
+    按记录器采样 INFO 及以下级别的日志
+
+    rules 形如 {"api.v1.rankings": 0.1}，表示只保留10%；WARNING 及以上级别始终保留。
+    """
+
+    def __init__(self, rules: Dict[str, float]):
+        super().__init__()
+        self.rules = rules
+        self._cache: Dict[str, Optional[float]] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rules:
+            return True
+        rate = self._cache.get(record.name, -1.0)
+        if rate == -1.0:
+            rate = self._cache[record.name] = _match_logger(record.name, self.rules)
+        return rate is None or random.random() < rate
+
+
+class RateLimitFilter(logging.Filter):
+    """每个记录器每秒最多输出 per_second 条 INFO 及以下级别的日志，超出部分丢弃并计数"""
+
+    def __init__(self, per_second: float):
+        super().__init__()
+        self.per_second = per_second
+        self._buckets: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.per_second <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(record.name)
+            if bucket is None:
+                bucket = self._buckets[record.name] = [self.per_second, now]
+            bucket[0] = min(self.per_second, bucket[0] + (now - bucket[1]) * self.per_second)
+            bucket[1] = now
+            if bucket[0] >= 1.0:
+                bucket[0] -= 1.0
+                return True
+            self.dropped += 1
+            return False
+
+
+# 这些类型的日志参数不会被修改，也不会在格式化时访问数据库，可以交给监听线程格式化
+_IMMUTABLE_ARG_TYPES = (str, int, float, bool, bytes, type(None))
+_exception_formatter = logging.Formatter()
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    非阻塞的队列日志处理器
+
+    参数都是不可变的基本类型时不在调用线程中格式化消息（由监听线程格式化），
+    队列满时直接丢弃，绝不阻塞请求。
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 以字典为参数时（logger.info("%(a)s", {...})）args 就是这个字典，本身是可变的
+        args = record.args or ()
+        if not record.exc_info and isinstance(args, tuple) and all(
+                isinstance(value, _IMMUTABLE_ARG_TYPES) for value in args):
+            # 同进程内的队列无需序列化，保留原始的 msg/args，格式化延迟到监听线程
+            return record
+        # 其他参数（可变容器、ORM 对象等）到监听线程时可能已被修改，或会在别的线程中延迟加载，
+        # 与标准库的 QueueHandler 一样在调用线程中格式化消息和异常
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
 # 日志配置
+# 控制台和文件处理器只挂在队列监听线程上，业务线程写日志时只做过滤和入队
 logging_config = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -23,18 +157,22 @@ logging_config = {
             'format': log_format,
             'datefmt': date_format,
         },
+        'json': {
+            '()': JsonFormatter,
+            'datefmt': date_format,
+        },
     },
     'handlers': {
         'console': {
             'level': LOG_LEVEL,
             'class': 'logging.StreamHandler',
-            'formatter': 'standard',
+            'formatter': LOG_FORMAT,
             'stream': sys.stdout,
         },
         'file': {
             'level': LOG_LEVEL,
             'class': 'logging.handlers.RotatingFileHandler',
-            'formatter': 'standard',
+            'formatter': LOG_FORMAT,
             'filename': log_dir / 'app.log',
             'maxBytes': 10485760,  # 10 MB
             'backupCount': 10,
@@ -50,14 +188,54 @@ logging_config = {
     }
 }
 
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _parse_sampling(spec: str) -> Dict[str, float]:
+    """解析 "logger=0.1,other=0.5" 形式的采样配置"""
+    rules = {}
+    for item in spec.split(","):
+        if "=" in item:
+            name, rate = item.split("=", 1)
+            rules[name.strip()] = float(rate)
+    return rules
+
 
 def setup_logging():
     """初始化日志配置"""
+    global _listener
     from logging.config import dictConfig
+    # 重复初始化时先停止旧的监听线程
+    stop_logging()
     dictConfig(logging_config)
-    
+
+    # dictConfig 创建的控制台和文件处理器交给监听线程，根记录器上只保留队列处理器
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    for handler in handlers:
+        root.removeHandler(handler)
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    queue_handler.addFilter(SamplingFilter(_parse_sampling(LOG_SAMPLING)))
+    queue_handler.addFilter(RateLimitFilter(LOG_RATE_LIMIT))
+    root.addHandler(queue_handler)
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
     # 创建应用日志记录器
     logger = logging.getLogger("face_score_pk")
     logger.setLevel(getattr(logging, LOG_LEVEL))
-    
-    return logger 
\ No newline at end of file
+
+    return logger
+
+
+def stop_logging():
+    """停止日志监听线程，写出队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
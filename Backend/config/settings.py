@@ -15,6 +15,30 @@ VERSION = "1.0.0"
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-for-development")
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7天
 ALGORITHM = "HS256"
+# 已认证用户缓存，多进程部署时各进程的缓存最多滞后 AUTH_CACHE_TTL 秒
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "30"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+# 好友集合缓存，多进程部署时各进程的缓存最多滞后 FRIEND_CACHE_TTL 秒
+FRIEND_CACHE_TTL = float(os.getenv("FRIEND_CACHE_TTL", "60"))
+FRIEND_CACHE_SIZE = int(os.getenv("FRIEND_CACHE_SIZE", "10000"))
+MATCH_CACHE_SIZE = int(os.getenv("MATCH_CACHE_SIZE", "10000"))  # 对战详情缓存条数（对战记录不变，缓存不过期）
+# HTTP响应缓存：响应体按资源版本缓存，用户昵称、头像等不参与版本的数据最多滞后 RESPONSE_CACHE_TTL 秒
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2000"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+RESPONSE_CACHE_STALE_TTL = float(os.getenv("RESPONSE_CACHE_STALE_TTL", "60"))  # 过期后这段时间内先返回旧响应，后台重新生成
+# 排行榜响应允许客户端和代理直接复用 RANKINGS_MAX_AGE 秒，之后的 RANKINGS_STALE_WHILE_REVALIDATE 秒内可先用旧响应再后台验证
+RANKINGS_MAX_AGE = int(os.getenv("RANKINGS_MAX_AGE", "5"))
+RANKINGS_STALE_WHILE_REVALIDATE = int(os.getenv("RANKINGS_STALE_WHILE_REVALIDATE", "30"))
+# 响应压缩：按 Accept-Encoding 选择 br 或 gzip，小于 COMPRESSION_MINIMUM_SIZE 字节的响应不压缩
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))  # 0-11，动态响应使用较低的质量以节省CPU
+MAX_FRIENDS = int(os.getenv("MAX_FRIENDS", "1000"))  # 每个用户的好友数上限，好友榜按好友数线性查询
+# 密码哈希配置，修改 BCRYPT_ROUNDS 后旧哈希会在用户下次登录时自动升级
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))  # 同时排队的哈希任务上限
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", "5"))  # 排队等待超时（秒）
 
 # 数据库配置
 # 优先使用环境变量中的数据库URL，如果不存在则使用SQLite
@@ -33,6 +57,43 @@ REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", None)
 BAIDU_AI_APP_ID = os.getenv("BAIDU_AI_APP_ID")
 BAIDU_AI_API_KEY = os.getenv("BAIDU_AI_API_KEY")
 BAIDU_AI_SECRET_KEY = os.getenv("BAIDU_AI_SECRET_KEY")
+# 百度AI接口地址（压测或本地调试时可指向模拟服务）
+BAIDU_AI_TOKEN_URL = os.getenv("BAIDU_AI_TOKEN_URL", "https://aip.baidubce.com/oauth/2.0/token")
+BAIDU_AI_DETECT_URL = os.getenv("BAIDU_AI_DETECT_URL", "https://aip.baidubce.com/rest/2.0/face/v3/detect")
+
+# 人脸检测容错配置
+FACE_DETECT_PROVIDER = os.getenv("FACE_DETECT_PROVIDER", "baidu")  # baidu / mock
+FACE_DETECT_ATTEMPT_TIMEOUT = float(os.getenv("FACE_DETECT_ATTEMPT_TIMEOUT", "3"))  # 单次请求超时（秒）
+FACE_DETECT_DEADLINE = float(os.getenv("FACE_DETECT_DEADLINE", "8"))  # 整个检测调用的截止时间（秒）
+FACE_DETECT_MAX_RETRIES = int(os.getenv("FACE_DETECT_MAX_RETRIES", "2"))
+FACE_DETECT_RETRY_BUDGET_RATIO = float(os.getenv("FACE_DETECT_RETRY_BUDGET_RATIO", "0.2"))  # 重试量不超过请求量的20%
+FACE_DETECT_BACKOFF_BASE = float(os.getenv("FACE_DETECT_BACKOFF_BASE", "0.1"))
+FACE_DETECT_BACKOFF_MAX = float(os.getenv("FACE_DETECT_BACKOFF_MAX", "1.0"))
+FACE_DETECT_BREAKER_THRESHOLD = int(os.getenv("FACE_DETECT_BREAKER_THRESHOLD", "5"))  # 连续失败多少次后熔断
+FACE_DETECT_BREAKER_RESET = float(os.getenv("FACE_DETECT_BREAKER_RESET", "30"))  # 熔断后多久进入半开状态（秒）
+FACE_DETECT_HEDGE_DELAY = float(os.getenv("FACE_DETECT_HEDGE_DELAY", "0"))  # 对冲请求延迟（秒），0表示关闭
+FACE_DETECT_MAX_WORKERS = int(os.getenv("FACE_DETECT_MAX_WORKERS", "16"))
+
+# 人脸检测配额（API服务与批处理脚本通过Redis共享，Redis不可用时按进程限流）
+FACE_DETECT_QPS = float(os.getenv("FACE_DETECT_QPS", "2"))  # 百度AI账号的QPS上限
+FACE_DETECT_BURST = float(os.getenv("FACE_DETECT_BURST", "2"))
+FACE_DETECT_BATCH_RESERVE = float(os.getenv("FACE_DETECT_BATCH_RESERVE", "0"))  # 批处理调用需为交互请求保留的令牌数
+FACE_DETECT_RATE_LIMIT_BACKEND = os.getenv("FACE_DETECT_RATE_LIMIT_BACKEND", "redis")  # redis / local
+
+# 服务启动时自动执行数据库迁移（见 migrate_db.py）
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "true").lower() == "true"
+
+# PK匹配：按Elo分数推荐最接近的对手
+MATCHMAKING_CANDIDATES = int(os.getenv("MATCHMAKING_CANDIDATES", "5"))  # 自动匹配时从最接近的几名对手中随机选择
+MATCHMAKING_RECENT_EXCLUDE = int(os.getenv("MATCHMAKING_RECENT_EXCLUDE", "5"))  # 最近交手过的几名对手排在其他对手之后
+ELO_RATING_FUNCTION = os.getenv("ELO_RATING_FUNCTION", "fixed")  # PK计分规则：fixed（挑战者固定+15/-10/+3）/ elo（标准Elo，双方都调整）
+ELO_K_FACTOR = float(os.getenv("ELO_K_FACTOR", "32"))  # elo 规则的K值
+
+# 排行榜（有Redis时多进程共享，否则每个进程在内存中维护并定期从数据库重新加载）
+LEADERBOARD_BACKEND = os.getenv("LEADERBOARD_BACKEND", "redis")  # redis / local
+LEADERBOARD_RELOAD_SECONDS = float(os.getenv("LEADERBOARD_RELOAD_SECONDS", "300"))  # 进程内榜单由后台任务重新加载的间隔，0表示不重新加载
+RANK_REFRESH_INTERVAL = float(os.getenv("RANK_REFRESH_INTERVAL", "600"))  # user_stats 全站/地区排名的批量重算间隔（秒），0表示关闭
+LEADERBOARD_WINDOW_TOP_K = int(os.getenv("LEADERBOARD_WINDOW_TOP_K", "1000"))  # 日榜/周榜/月榜每天的桶保留的照片数，也是这些榜单的最大名次
 
 # 上传配置
 UPLOAD_FOLDER = "uploads"
@@ -49,4 +110,20 @@ BACKEND_CORS_ORIGINS = [
 ]
 
 # 日志配置
-LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO") 
\ No newline at end of file
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "standard")  # standard / json（结构化日志）
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # 日志队列满时丢弃新日志，不阻塞请求
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")  # 按记录器采样INFO日志，如 "api.v1.rankings=0.1,services.match=0.5"
+LOG_RATE_LIMIT = float(os.getenv("LOG_RATE_LIMIT", "100"))  # 每个记录器每秒最多输出的INFO日志条数，0表示不限制 
+# 请求追踪配置
+REQUEST_TRACING = os.getenv("REQUEST_TRACING", "true").lower() == "true"  # 统计每个请求的SQL数量和耗时并写入响应头
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))  # 超过该耗时的SQL记录到日志，0表示关闭
+SLOW_QUERY_LOG_PARAMS = os.getenv("SLOW_QUERY_LOG_PARAMS", "true").lower() == "true"  # 慢查询日志是否包含绑定参数
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))  # 超过该耗时的请求记录到日志，0表示关闭
+
+# 请求级性能剖析（默认关闭，关闭时不安装中间件）
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN", "")  # 请求头 X-Profile 与该值一致时剖析该请求
+PROFILER_SAMPLE_RATE = float(os.getenv("PROFILER_SAMPLE_RATE", "0"))  # 按比例随机剖析API请求，如 0.001
+PROFILER_INTERVAL = float(os.getenv("PROFILER_INTERVAL", "0.002"))  # 栈采样间隔（秒）
+PROFILER_FORMAT = os.getenv("PROFILER_FORMAT", "speedscope")  # speedscope / folded（flamegraph.pl 格式）
+PROFILER_OUTPUT_DIR = os.getenv("PROFILER_OUTPUT_DIR", "logs/profiles")
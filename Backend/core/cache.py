@@ -0,0 +1,97 @@
+"""
+进程内缓存工具
+"""
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from core import metrics
+
+_MISSING = object()
+
+# 有名称的缓存会出现在 /metrics 中
+_named_caches: "weakref.WeakSet[TTLCache]" = weakref.WeakSet()
+
+
+class TTLCache:
+    """
+    线程安全的有界缓存
+
+    超过 maxsize 时按最近最少使用淘汰；ttl 为 None 时条目不过期，只受容量限制。
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None, name: str = ""):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data: "OrderedDict[Hashable, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if name:
+            _named_caches.add(self)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+@metrics.collector
+def _collect_cache_metrics():
+    caches = sorted(_named_caches, key=lambda cache: cache.name)
+    stats = [(cache.name, cache.stats()) for cache in caches]
+    for key, kind, doc in (
+        ("hits", "counter", "缓存命中次数"),
+        ("misses", "counter", "缓存未命中次数"),
+        ("evictions", "counter", "因容量淘汰的条目数"),
+    ):
+        name = f"cache_{key}_total"
+        yield name, kind, doc, [(name, {"cache": cache}, values[key]) for cache, values in stats]
+    yield "cache_size", "gauge", "缓存条目数", [("cache_size", {"cache": cache}, values["size"]) for cache, values in stats]
+    yield "cache_hit_ratio", "gauge", "缓存命中率", [
+        ("cache_hit_ratio", {"cache": cache}, values["hits"] / max(values["hits"] + values["misses"], 1))
+        for cache, values in stats
+    ]
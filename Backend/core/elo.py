@@ -0,0 +1,122 @@
+"""
+Elo分数计算
+
+计分规则是可替换的函数（见 rating_function），PK对战时对单场比赛调用，
+replay_ratings.py 按时间顺序对全部历史对战调用同一个函数重算所有用户的分数。
+
+规则函数逐场更新 ratings 数组，并写出每场比赛双方的分数变化：
+    func(ratings, challengers, opponents, outcomes, challenger_deltas, opponent_deltas, k_factor)
+challengers/opponents 是用户ID（ratings 的下标），outcomes 是挑战者视角的结果（胜1，负0，平0.5）。
+安装了 numba 时规则函数会被编译，否则以 Python 循环在列表上执行。
+"""
+import math
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except ImportError:
+    numba = None
+    NUMBA_AVAILABLE = False
+
+WIN, LOSE, TIE = 1.0, 0.0, 0.5
+
+RATING_FUNCTIONS: Dict[str, Callable] = {}
+
+
+def rating_function(name: str) -> Callable:
+    """装饰器：登记计分规则，有 numba 时编译"""
+    def decorator(func: Callable) -> Callable:
+        RATING_FUNCTIONS[name] = numba.njit(cache=True)(func) if NUMBA_AVAILABLE else func
+        return func
+    return decorator
+
+
+@rating_function("fixed")
+def fixed_points(ratings, challengers, opponents, outcomes, challenger_deltas, opponent_deltas, k_factor):
+    """最初的规则：挑战者胜+15、负-10、平+3，分数不低于0，对手不变"""
+    for i in range(len(challengers)):
+        challenger = challengers[i]
+        outcome = outcomes[i]
+        if outcome == 1.0:
+            delta = 15.0
+        elif outcome == 0.0:
+            delta = -10.0
+        else:
+            delta = 3.0
+        rating = ratings[challenger] + delta
+        ratings[challenger] = rating if rating > 0.0 else 0.0
+        challenger_deltas[i] = delta
+        opponent_deltas[i] = 0.0
+
+
+@rating_function("elo")
+def standard_elo(ratings, challengers, opponents, outcomes, challenger_deltas, opponent_deltas, k_factor):
+    """标准Elo：按双方分差计算期望胜率，双方的变化量相反；分数按整数保存，每场的变化量四舍五入"""
+    for i in range(len(challengers)):
+        challenger = challengers[i]
+        opponent = opponents[i]
+        expected = 1.0 / (1.0 + 10.0 ** ((ratings[opponent] - ratings[challenger]) / 400.0))
+        delta = math.floor(k_factor * (outcomes[i] - expected) + 0.5)
+        ratings[challenger] += delta
+        ratings[opponent] -= delta
+        challenger_deltas[i] = delta
+        opponent_deltas[i] = -delta
+
+
+def get_rating_function(name: str) -> Callable:
+    try:
+        return RATING_FUNCTIONS[name]
+    except KeyError:
+        raise ValueError(f"未知的计分规则: {name}，可选: {', '.join(RATING_FUNCTIONS)}")
+
+
+def rate_match(name: str, challenger_rating: float, opponent_rating: float, outcome: float,
+               k_factor: float) -> Tuple[int, int, int, int]:
+    """计算一场对战后的双方分数，返回 (挑战者新分数, 对手新分数, 挑战者变化, 对手变化)"""
+    replay = RatingReplay(name, 1, k_factor=k_factor)
+    replay.ratings[0] = float(challenger_rating)
+    replay.ratings[1] = float(opponent_rating)
+    challenger_deltas, opponent_deltas = replay.feed([0], [1], [outcome])
+    ratings = replay.result()
+    return int(ratings[0]), int(ratings[1]), int(challenger_deltas[0]), int(opponent_deltas[0])
+
+
+class RatingReplay:
+    """
+    按时间顺序分块重放对战，分数状态在块之间保留
+
+    ratings 以用户ID为下标，未出现过的用户保持初始分数。
+    """
+
+    def __init__(self, function: str, max_user_id: int, initial_rating: float = 1500.0, k_factor: float = 32.0):
+        self.function = get_rating_function(function)
+        self.k_factor = float(k_factor)
+        self.ratings = np.full(max_user_id + 1, float(initial_rating))
+        self.matches = 0
+        if not NUMBA_AVAILABLE:
+            # 纯 Python 循环中列表的下标访问比 numpy 标量快得多
+            self.ratings = self.ratings.tolist()
+
+    def feed(self, challengers, opponents, outcomes) -> Tuple[np.ndarray, np.ndarray]:
+        """重放一块对战，返回每场比赛挑战者和对手的分数变化"""
+        count = len(challengers)
+        if NUMBA_AVAILABLE:
+            challengers = np.asarray(challengers, dtype=np.int64)
+            opponents = np.asarray(opponents, dtype=np.int64)
+            outcomes = np.asarray(outcomes, dtype=np.float64)
+            challenger_deltas = np.zeros(count)
+            opponent_deltas = np.zeros(count)
+        else:
+            challenger_deltas = [0.0] * count
+            opponent_deltas = [0.0] * count
+        self.function(self.ratings, challengers, opponents, outcomes,
+                      challenger_deltas, opponent_deltas, self.k_factor)
+        self.matches += count
+        return np.asarray(challenger_deltas), np.asarray(opponent_deltas)
+
+    def result(self) -> np.ndarray:
+        """取整后的分数"""
+        return np.rint(np.asarray(self.ratings)).astype(np.int64)
@@ -0,0 +1,193 @@
+"""
+响应编码协商
+
+Accept-Encoding 决定是否压缩（br 优先于 gzip，只压缩超过 COMPRESSION_MINIMUM_SIZE 的文本类响应），
+Accept 中包含 application/msgpack 时 JSON 接口改用 MessagePack 编码。
+
+EncodingMiddleware 把协商到的媒体类型放入上下文变量（FastJSONResponse 据此选择编码），
+并压缩响应体：只有一段响应体时整体压缩一次，分段输出的响应逐段流式压缩，不会把整个响应再缓存一遍。
+已带 Content-Encoding 的响应（如响应缓存中预先压缩好的）原样透传。
+"""
+import contextvars
+import zlib
+from typing import Any, Dict, Optional
+
+from fastapi.encoders import jsonable_encoder
+from starlette.datastructures import Headers, MutableHeaders
+
+from config.settings import COMPRESSION_BROTLI_QUALITY, COMPRESSION_GZIP_LEVEL, COMPRESSION_MINIMUM_SIZE
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    brotli = None
+    BROTLI_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    msgpack = None
+    MSGPACK_AVAILABLE = False
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+_MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack")
+# 压缩这些类型的响应，图片等已压缩的内容不再压缩
+_COMPRESSIBLE_TYPES = ("application/json", MSGPACK_MEDIA_TYPE, "text/", "application/javascript")
+
+_preferred_media: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("preferred_media", default=None)
+
+
+def preferred_media() -> Optional[str]:
+    """当前请求协商到的非 JSON 媒体类型（目前只有 MessagePack），不在请求中或使用 JSON 时为 None"""
+    return _preferred_media.get()
+
+
+def _quality(header: Optional[str]) -> Dict[str, float]:
+    """解析 Accept/Accept-Encoding，返回 值 -> q"""
+    accepted = {}
+    for item in (header or "").split(","):
+        value, *params = [part.strip() for part in item.split(";")]
+        if not value:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        accepted[value.lower()] = q
+    return accepted
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """选择压缩算法：br（已安装 brotli 时）优先，其次 gzip，都不接受时返回 None"""
+    accepted = _quality(accept_encoding)
+    candidates = (["br"] if BROTLI_AVAILABLE else []) + ["gzip"]
+    best, best_q = None, 0.0
+    for encoding in candidates:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def accepts_msgpack(accept: Optional[str]) -> bool:
+    """Accept 中 MessagePack 的权重不低于 JSON 时使用 MessagePack"""
+    if not MSGPACK_AVAILABLE or not accept:
+        return False
+    accepted = _quality(accept)
+    msgpack_q = max(accepted.get(media, 0.0) for media in _MSGPACK_MEDIA_TYPES)
+    return msgpack_q > 0 and msgpack_q >= accepted.get("application/json", 0.0)
+
+
+def render_msgpack(content: Any) -> bytes:
+    # datetime 等类型按 JSON 中的表示（ISO 字符串）编码
+    return msgpack.packb(content, default=jsonable_encoder, use_bin_type=True)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    compressor = _gzip_compressor()
+    return compressor.compress(body) + compressor.flush()
+
+
+def _gzip_compressor():
+    return zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+
+class _StreamCompressor:
+    """逐段压缩"""
+
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+            self._process, self._finish = compressor.process, compressor.finish
+        else:
+            compressor = _gzip_compressor()
+            self._process, self._finish = compressor.compress, compressor.flush
+
+    def process(self, chunk: bytes, last: bool) -> bytes:
+        data = self._process(chunk) if chunk else b""
+        return data + self._finish() if last else data
+
+
+def compressible(headers: Headers) -> bool:
+    if "content-encoding" in headers:
+        return False
+    content_type = headers.get("content-type", "")
+    return content_type.startswith(_COMPRESSIBLE_TYPES)
+
+
+class _CompressingSend:
+    """包装 send：看到第一段响应体后再决定是否压缩"""
+
+    def __init__(self, send, encoding: str, minimum_size: int):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start_message = None
+        self.compressor: Optional[_StreamCompressor] = None
+        self.passthrough = False
+
+    async def __call__(self, message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is not None:
+            await self.send({"type": "http.response.body", "body": self.compressor.process(body, not more_body),
+                             "more_body": more_body})
+            return
+
+        start, self.start_message = self.start_message, None
+        headers = MutableHeaders(raw=list(start["headers"]))
+        if not compressible(headers) or (not more_body and len(body) < self.minimum_size):
+            self.passthrough = True
+            await self.send(start)
+            await self.send(message)
+            return
+
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if more_body:
+            # 流式响应：长度未知，逐段压缩
+            del headers["Content-Length"]
+            self.compressor = _StreamCompressor(self.encoding)
+            body = self.compressor.process(body, False)
+        else:
+            body = compress(body, self.encoding)
+            headers["Content-Length"] = str(len(body))
+        await self.send(dict(start, headers=headers.raw))
+        await self.send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+
+class EncodingMiddleware:
+    """ASGI 中间件：协商 MessagePack 并压缩响应"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        token = _preferred_media.set(MSGPACK_MEDIA_TYPE if accepts_msgpack(headers.get("accept")) else None)
+        try:
+            encoding = negotiate_encoding(headers.get("accept-encoding"))
+            if encoding is not None:
+                send = _CompressingSend(send, encoding, self.minimum_size)
+            await self.app(scope, receive, send)
+        finally:
+            _preferred_media.reset(token)
@@ -0,0 +1,110 @@
+"""
+人脸特征的紧凑存储
+
+百度AI返回的特征数据中，列表和排行等查询只用到颜值、年龄、性别、脸型、表情几个字段，
+其余大部分体积是76个关键点坐标。存储时：
+- 常用字段拆分为 scores 表上的普通列
+- 关键点打包为 float32 二进制（每个点8字节），默认延迟加载
+- 剩余的小字段（face_token、位置、角度、各类置信度）仍以JSON保存在 feature_data 列
+读取完整特征数据时再按原始结构拼回。
+"""
+import struct
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# 拆分为独立列的属性；带类型的属性在JSON中只保留置信度
+SCALAR_FIELDS = ("beauty", "age")
+TYPED_FIELDS = ("gender", "face_shape", "expression")
+LANDMARK_FIELDS = ("landmark", "landmark72")
+
+# 关键点二进制格式：各组关键点数量（uint16，小端）+ 全部坐标（float32，小端）
+_HEADER = struct.Struct("<" + "H" * len(LANDMARK_FIELDS))
+_DTYPE = np.dtype("<f4")
+
+
+def pack_landmarks(face_info: Dict[str, Any]) -> Optional[bytes]:
+    """将 landmark/landmark72 打包为二进制，没有关键点时返回 None"""
+    groups = [face_info.get(field) or [] for field in LANDMARK_FIELDS]
+    if not any(groups):
+        return None
+    coords = [(point["x"], point["y"]) for group in groups for point in group]
+    return _HEADER.pack(*(len(group) for group in groups)) + np.asarray(coords, dtype=_DTYPE).tobytes()
+
+
+def unpack_landmarks(blob: Optional[bytes]) -> Dict[str, List[Dict[str, float]]]:
+    """还原 pack_landmarks 打包的关键点"""
+    if not blob:
+        return {}
+    counts = _HEADER.unpack_from(blob)
+    # float32 只有约7位有效数字，坐标保留到0.01像素，截掉转换产生的尾数（如 304.6099853515625）
+    values = np.frombuffer(blob, dtype=_DTYPE, offset=_HEADER.size).astype(float).round(2).tolist()
+    result = {}
+    offset = 0
+    for field, count in zip(LANDMARK_FIELDS, counts):
+        if count:
+            result[field] = [
+                {"x": values[i], "y": values[i + 1]} for i in range(offset, offset + count * 2, 2)
+            ]
+        offset += count * 2
+    return result
+
+
+def split_face_info(face_info: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    将完整特征数据拆分为 scores 表各列的值
+
+    返回 beauty/age/gender/face_shape/expression/landmarks/feature_data 七个键。
+    """
+    if not face_info:
+        return {
+            "beauty": None, "age": None, "gender": None, "face_shape": None,
+            "expression": None, "landmarks": None, "feature_data": None,
+        }
+    columns: Dict[str, Any] = {}
+    rest = {}
+    for key, value in face_info.items():
+        if key in SCALAR_FIELDS or key in LANDMARK_FIELDS:
+            continue
+        if key in TYPED_FIELDS and isinstance(value, dict):
+            value = {k: v for k, v in value.items() if k != "type"}
+            if not value:
+                continue
+        rest[key] = value
+
+    beauty = face_info.get("beauty")
+    age = face_info.get("age")
+    columns["beauty"] = float(beauty) if beauty is not None else None
+    columns["age"] = int(age) if age is not None else None
+    for field in TYPED_FIELDS:
+        value = face_info.get(field)
+        columns[field] = value.get("type") if isinstance(value, dict) else value
+    columns["landmarks"] = pack_landmarks(face_info)
+    columns["feature_data"] = rest or None
+    return columns
+
+
+def merge_face_info(beauty: Optional[float], age: Optional[int], gender: Optional[str],
+                    face_shape: Optional[str], expression: Optional[str],
+                    landmarks: Optional[bytes], feature_data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """按百度AI返回的结构拼回完整特征数据（split_face_info 的逆操作）"""
+    face_info = dict(feature_data or {})
+    face_info.update(unpack_landmarks(landmarks))
+    if age is not None:
+        face_info["age"] = age
+    if beauty is not None:
+        face_info["beauty"] = beauty
+    for field, value in (("expression", expression), ("gender", gender), ("face_shape", face_shape)):
+        if value is not None:
+            face_info[field] = {"type": value, **(face_info.get(field) or {})}
+    return face_info
+
+
+def is_legacy_feature_data(feature_data: Optional[Dict[str, Any]]) -> bool:
+    """feature_data 是否还是未拆分的完整特征数据"""
+    if not feature_data:
+        return False
+    if any(key in feature_data for key in SCALAR_FIELDS + LANDMARK_FIELDS):
+        return True
+    return any(isinstance(feature_data.get(field), dict) and "type" in feature_data[field]
+               for field in TYPED_FIELDS)
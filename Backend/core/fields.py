@@ -0,0 +1,53 @@
+"""
+稀疏字段集
+
+列表和详情接口通过查询参数选择响应中的字段：
+    fields=score_id,face_score      只返回这些字段
+    include=feature_data            在默认字段之外附加可选字段（如体积较大的特征数据）
+两者可以同时使用。服务层按选中的字段决定查询哪些列，未选中的列（如人脸关键点）不会从数据库加载。
+"""
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Query, status
+
+FieldSet = Tuple[str, ...]
+
+
+def _split(value: Optional[str]) -> Iterable[str]:
+    return [name.strip() for name in (value or "").split(",") if name.strip()]
+
+
+def select_fields(fields: Optional[str], include: Optional[str], available: Sequence[str],
+                  default: Sequence[str]) -> FieldSet:
+    """解析 fields/include，按 available 中的顺序返回选中的字段；包含未知字段时抛出 ValueError"""
+    requested = set(_split(fields)) if fields else set(default)
+    requested.update(_split(include))
+    unknown = requested.difference(available)
+    if unknown:
+        raise ValueError(f"未知的字段: {', '.join(sorted(unknown))}，可选: {', '.join(available)}")
+    return tuple(name for name in available if name in requested)
+
+
+def sparse_fields(available: Sequence[str], default: Optional[Sequence[str]] = None) -> Callable[..., FieldSet]:
+    """生成读取 fields/include 查询参数的依赖项，default 为空时默认返回全部字段"""
+    default = tuple(available if default is None else default)
+    optional = [name for name in available if name not in default]
+    include_description = f"附加的可选字段: {', '.join(optional)}" if optional else "附加字段"
+
+    def dependency(
+        fields: Optional[str] = Query(None, description=f"只返回这些字段（逗号分隔），可选: {', '.join(available)}"),
+        include: Optional[str] = Query(None, description=include_description),
+    ) -> FieldSet:
+        try:
+            return select_fields(fields, include, available, default)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    return dependency
+
+
+def pick(item: Dict, fields: Optional[FieldSet]) -> Dict:
+    """只保留选中的字段，fields 为 None 时原样返回"""
+    if fields is None:
+        return item
+    return {name: value for name, value in item.items() if name in fields}
@@ -0,0 +1,219 @@
+"""
+HTTP 条件请求与响应缓存
+
+为资源计算强 ETag，客户端（或中间代理）带 If-None-Match 重新验证时，
+ETag 未变化就直接返回 304，不再生成和序列化响应体。
+
+ResponseCache 缓存序列化后的响应体。每个资源由调用方给出一个能廉价取得的版本
+（榜单的变更计数、记录中决定内容的几列等），版本不变时复用缓存的响应体和 ETag，
+只有版本变化时才重新生成。
+
+安装了 orjson 时用它序列化 JSON（FastJSONResponse 也是应用的默认响应类），
+datetime、枚举等可直接序列化，不需要先经过 jsonable_encoder 逐层转换。
+客户端协商了 MessagePack 或压缩（见 core/encoding.py）时，缓存的响应按表示形式分别编码一次后保存。
+"""
+import hashlib
+import inspect
+import json
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, NamedTuple, Optional, Set, Tuple, Union
+
+from fastapi import Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from starlette.background import BackgroundTask
+
+from config.settings import COMPRESSION_MINIMUM_SIZE, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_STALE_TTL, RESPONSE_CACHE_TTL
+from core.cache import TTLCache
+from core.encoding import (
+    MSGPACK_AVAILABLE, MSGPACK_MEDIA_TYPE, compress, negotiate_encoding, preferred_media, render_msgpack,
+)
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+Builder = Callable[[], Union[Any, Awaitable[Any]]]
+
+
+def make_etag(*parts) -> str:
+    """按资源的版本信息计算强 ETag"""
+    digest = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def body_etag(body: bytes) -> str:
+    """按响应体内容计算强 ETag"""
+    return f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 使用弱比较：忽略 W/ 前缀，"*" 匹配任意值"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    return etag_matches(request.headers.get("if-none-match"), etag)
+
+
+def render_json(content: Any) -> bytes:
+    """序列化为紧凑的 UTF-8 JSON；没有 orjson 时与 JSONResponse 的输出相同"""
+    if ORJSON_AVAILABLE:
+        # orjson 不支持的类型（如 pydantic 模型、Decimal）交给 jsonable_encoder
+        return orjson.dumps(content, default=jsonable_encoder, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        jsonable_encoder(content),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def parse_json(body: bytes) -> Any:
+    return orjson.loads(body) if ORJSON_AVAILABLE else json.loads(body)
+
+
+class FastJSONResponse(JSONResponse):
+    """用 render_json 序列化的 JSONResponse；客户端协商了 MessagePack 时改用 MessagePack"""
+
+    def init_headers(self, headers=None) -> None:
+        super().init_headers(headers)
+        if MSGPACK_AVAILABLE:
+            self.headers.add_vary_header("Accept")
+
+    def render(self, content: Any) -> bytes:
+        if preferred_media() == MSGPACK_MEDIA_TYPE:
+            self.media_type = MSGPACK_MEDIA_TYPE
+            return render_msgpack(content)
+        return render_json(content)
+
+
+class CachedResponse(NamedTuple):
+    version: Hashable
+    etag: str
+    body: bytes
+    built_at: float
+    # (媒体类型, 请求协商的压缩算法) -> (ETag, 响应体, 实际使用的压缩算法)，按需生成
+    variants: Dict[Tuple[Optional[str], Optional[str]], Tuple[str, bytes, Optional[str]]]
+
+
+def _variant(entry: CachedResponse, media: Optional[str], encoding: Optional[str]) -> Tuple[str, bytes, Optional[str]]:
+    """取缓存响应的某种表示形式，返回 (ETag, 响应体, 实际使用的压缩算法)"""
+    # 按请求协商的 (媒体类型, 压缩算法) 保存，响应体太小不压缩时下次同样的请求也能直接命中
+    key = (media, encoding)
+    variant = entry.variants.get(key)
+    if variant is None:
+        body, suffix = entry.body, []
+        if media == MSGPACK_MEDIA_TYPE:
+            body = render_msgpack(parse_json(body))
+            suffix.append("msgpack")
+        if encoding is not None and len(body) >= COMPRESSION_MINIMUM_SIZE:
+            body = compress(body, encoding)
+            suffix.append(encoding)
+        else:
+            encoding = None
+        # 不同表示形式的强 ETag 必须不同
+        etag = f'{entry.etag[:-1]}-{"-".join(suffix)}"' if suffix else entry.etag
+        variant = entry.variants[key] = (etag, body, encoding)
+    return variant
+
+
+class ResponseCache:
+    """
+    按资源版本缓存的响应体
+
+    响应体中不参与版本的数据（如用户昵称、头像）最多滞后 ttl 秒：缓存超过 ttl 秒后，
+    stale_ttl 秒内仍先返回旧响应体，同时在响应发送后重新生成（stale-while-revalidate）；
+    超过 ttl + stale_ttl 秒的缓存直接丢弃。
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float, stale_ttl: float = 0.0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl + stale_ttl, name=name)
+        self._refreshing: Set[Hashable] = set()
+        self._lock = threading.Lock()
+
+    async def _build(self, key: Hashable, version: Hashable, build: Builder) -> CachedResponse:
+        content = build()
+        if inspect.isawaitable(content):
+            content = await content
+        body = render_json(content)
+        entry = CachedResponse(version, body_etag(body), body, time.monotonic(), {})
+        self._entries.set(key, entry)
+        return entry
+
+    async def _refresh(self, key: Hashable, version: Hashable, build: Builder) -> None:
+        try:
+            current = self._entries.get(key)
+            if current is not None and current.version == version:
+                await self._build(key, version, build)
+        except Exception as e:
+            logger.warning(f"后台重新生成响应失败 {key}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _schedule_refresh(self, key: Hashable, version: Hashable, build: Builder) -> Optional[BackgroundTask]:
+        with self._lock:
+            if key in self._refreshing:
+                return None
+            self._refreshing.add(key)
+        # 后台任务在响应发送后执行；FastAPI 0.104 在后台任务结束后才关闭 yield 依赖，build 中的数据库会话仍然可用
+        return BackgroundTask(self._refresh, key, version, build)
+
+    async def respond(self, request: Request, key: Hashable, version: Hashable, build: Builder,
+                      cache_control: str, vary: Optional[str] = None) -> Response:
+        """
+        返回资源的响应：版本未变时使用缓存，If-None-Match 命中时返回 304
+
+        build 返回可序列化为 JSON 的内容（可以是协程），只在缓存缺失或版本变化时调用。
+        MessagePack 和压缩后的表示形式各自只生成一次，随缓存条目一起保存。
+        """
+        entry = self._entries.get(key)
+        background = None
+        if entry is None or entry.version != version:
+            entry = await self._build(key, version, build)
+        elif time.monotonic() - entry.built_at > self.ttl:
+            background = self._schedule_refresh(key, version, build)
+
+        media = preferred_media()
+        etag, body, encoding = _variant(entry, media, negotiate_encoding(request.headers.get("accept-encoding")))
+        headers = {
+            "ETag": etag,
+            "Cache-Control": cache_control,
+            "Vary": ", ".join(filter(None, ["Accept", "Accept-Encoding", vary])),
+        }
+        if is_not_modified(request, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers, background=background)
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return Response(body, media_type=media or "application/json", headers=headers, background=background)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._entries.invalidate(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+# 各读接口共用的响应缓存，键的第一项为资源类型
+response_cache = ResponseCache("http_response", RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_STALE_TTL)
@@ -0,0 +1,534 @@
+"""
+排行榜存储：按分数降序维护的有序集合
+
+成员（用户ID、评分ID等整数）各有一个分数，支持 O(log N) 的更新、名次查询和分页。
+有 Redis 时使用有序集合（多进程共享同一份榜单），Redis 不可用时回退到进程内实现；
+进程内榜单只包含本进程看到的更新，因此由后台任务（refresh）按 reload_interval 定期从数据库重新加载，
+请求线程只在首次访问时加载。
+
+分区排行榜（如按地区）的每个分区是一个独立的有序集合，由同一个加载函数一次性加载。
+每个分区有一个变更计数（version），内容变化时递增，用于判断按榜单生成的响应是否需要重新生成。
+"""
+import bisect
+import contextlib
+import threading
+import time
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+import logging
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    redis = None
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+Entry = Tuple[int, float]
+
+
+class LocalSortedScores:
+    """
+    进程内有序集合
+
+    按 (-分数, 成员) 排序，数据分成若干有序小块，插入、删除只移动一个小块，
+    名次通过各块的累计偏移量定位。
+    """
+
+    LOAD = 512
+
+    def __init__(self):
+        self._scores: Dict[int, float] = {}
+        self._buckets: List[List[Tuple[float, int]]] = []
+        self._maxes: List[Tuple[float, int]] = []
+        self._offsets: Optional[List[int]] = None
+        self._version = 0
+        self._expires_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def _offsets_index(self) -> List[int]:
+        if self._offsets is None:
+            offsets = []
+            total = 0
+            for bucket in self._buckets:
+                offsets.append(total)
+                total += len(bucket)
+            self._offsets = offsets
+        return self._offsets
+
+    def _insert(self, key: Tuple[float, int]) -> None:
+        self._offsets = None
+        if not self._buckets:
+            self._buckets.append([key])
+            self._maxes.append(key)
+            return
+        pos = bisect.bisect_left(self._maxes, key)
+        if pos == len(self._buckets):
+            pos -= 1
+        bucket = self._buckets[pos]
+        bisect.insort(bucket, key)
+        self._maxes[pos] = bucket[-1]
+        if len(bucket) > self.LOAD * 2:
+            half = len(bucket) // 2
+            self._buckets[pos:pos + 1] = [bucket[:half], bucket[half:]]
+            self._maxes[pos:pos + 1] = [bucket[half - 1], bucket[-1]]
+
+    def _delete(self, key: Tuple[float, int]) -> None:
+        self._offsets = None
+        pos = bisect.bisect_left(self._maxes, key)
+        bucket = self._buckets[pos]
+        del bucket[bisect.bisect_left(bucket, key)]
+        if bucket:
+            self._maxes[pos] = bucket[-1]
+        else:
+            del self._buckets[pos]
+            del self._maxes[pos]
+
+    def add(self, member: int, score: float) -> None:
+        old = self._scores.get(member)
+        if old == score:
+            return
+        if old is not None:
+            self._delete((-old, member))
+        self._scores[member] = score
+        self._insert((-score, member))
+        self._version += 1
+
+    def add_max(self, member: int, score: float) -> bool:
+        """只在成员不在榜上或新分数更高时更新，调用方需持有榜单的锁"""
+        current = self._scores.get(member)
+        if current is not None and score <= current:
+            return False
+        self.add(member, score)
+        return True
+
+    def remove(self, member: int) -> None:
+        old = self._scores.pop(member, None)
+        if old is not None:
+            self._delete((-old, member))
+            self._version += 1
+
+    def version(self) -> int:
+        return self._version
+
+    def score(self, member: int) -> Optional[float]:
+        return self._scores.get(member)
+
+    def scores(self, members: Iterable[int]) -> Dict[int, float]:
+        return {member: self._scores[member] for member in members if member in self._scores}
+
+    def rank(self, member: int) -> Optional[int]:
+        """名次（从0开始），不在榜上返回 None"""
+        score = self._scores.get(member)
+        if score is None:
+            return None
+        key = (-score, member)
+        pos = bisect.bisect_left(self._maxes, key)
+        return self._offsets_index()[pos] + bisect.bisect_left(self._buckets[pos], key)
+
+    def count_above(self, score: float) -> int:
+        """分数高于 score 的成员数，即分数为 score 的成员在榜单中的插入位置"""
+        key = (-score, float("-inf"))
+        pos = bisect.bisect_left(self._maxes, key)
+        if pos == len(self._buckets):
+            return len(self._scores)
+        return self._offsets_index()[pos] + bisect.bisect_left(self._buckets[pos], key)
+
+    def range(self, start: int, stop: int) -> List[Entry]:
+        """第 start 到 stop-1 名"""
+        if start >= len(self._scores) or stop <= start:
+            return []
+        offsets = self._offsets_index()
+        pos = bisect.bisect_right(offsets, start) - 1
+        index = start - offsets[pos]
+        result = []
+        while pos < len(self._buckets) and len(result) < stop - start:
+            bucket = self._buckets[pos]
+            for neg_score, member in bucket[index:index + stop - start - len(result)]:
+                result.append((member, -neg_score))
+            pos += 1
+            index = 0
+        return result
+
+    def trim(self, size: int) -> None:
+        """只保留前 size 名"""
+        while len(self._scores) > size:
+            neg_score, member = self._buckets[-1][-1]
+            self.remove(member)
+
+    def expire(self, seconds: float) -> None:
+        # 到期后由 Leaderboard 在创建新分区时丢弃
+        self._expires_at = time.monotonic() + seconds
+
+    def expired(self) -> bool:
+        return self._expires_at is not None and time.monotonic() >= self._expires_at
+
+    def load(self, entries: Iterable[Entry]) -> None:
+        """整体替换为给定的成员和分数"""
+        scores = dict(entries)
+        keys = sorted((-score, member) for member, score in scores.items())
+        self._scores = scores
+        self._buckets = [keys[i:i + self.LOAD] for i in range(0, len(keys), self.LOAD)]
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        self._offsets = None
+        self._version += 1
+
+    def replace(self, other: "LocalSortedScores") -> None:
+        """换成另一个集合（在锁外建好）的内容，变更计数在原来的基础上递增"""
+        self._scores, self._buckets, self._maxes = other._scores, other._buckets, other._maxes
+        self._offsets = None
+        self._version += 1
+
+
+class RedisSortedScores:
+    """Redis 有序集合，同分时按成员编号排序与进程内实现可能不同"""
+
+    LOAD_CHUNK = 5000
+
+    def __init__(self, client, key: str):
+        self._client = client
+        self.key = key
+        # 变更计数保存在 Redis 中，各进程看到的是同一个计数
+        self.version_key = f"{key}:version"
+
+    def __len__(self) -> int:
+        return int(self._client.zcard(self.key))
+
+    def _changed(self, pipe) -> None:
+        pipe.incr(self.version_key)
+        pipe.execute()
+
+    def add(self, member: int, score: float) -> None:
+        pipe = self._client.pipeline(transaction=False)
+        pipe.zadd(self.key, {member: score})
+        self._changed(pipe)
+
+    def add_max(self, member: int, score: float) -> bool:
+        # ZADD GT 是原子的比较并更新（Redis 6.2+），CH 返回实际变化的成员数
+        if not self._client.zadd(self.key, {member: score}, gt=True, ch=True):
+            return False
+        self._client.incr(self.version_key)
+        return True
+
+    def remove(self, member: int) -> None:
+        pipe = self._client.pipeline(transaction=False)
+        pipe.zrem(self.key, member)
+        self._changed(pipe)
+
+    def version(self) -> int:
+        return int(self._client.get(self.version_key) or 0)
+
+    def score(self, member: int) -> Optional[float]:
+        return self._client.zscore(self.key, member)
+
+    def scores(self, members: Iterable[int]) -> Dict[int, float]:
+        members = list(members)
+        pipe = self._client.pipeline(transaction=False)
+        for member in members:
+            pipe.zscore(self.key, member)
+        return {member: score for member, score in zip(members, pipe.execute()) if score is not None}
+
+    def rank(self, member: int) -> Optional[int]:
+        return self._client.zrevrank(self.key, member)
+
+    def count_above(self, score: float) -> int:
+        return int(self._client.zcount(self.key, f"({score}", "+inf"))
+
+    def range(self, start: int, stop: int) -> List[Entry]:
+        if stop <= start:
+            return []
+        rows = self._client.zrevrange(self.key, start, stop - 1, withscores=True)
+        return [(int(member), score) for member, score in rows]
+
+    def trim(self, size: int) -> None:
+        pipe = self._client.pipeline(transaction=False)
+        pipe.zremrangebyrank(self.key, 0, -(size + 1))
+        self._changed(pipe)
+
+    def expire(self, seconds: float) -> None:
+        pipe = self._client.pipeline(transaction=False)
+        pipe.expire(self.key, max(int(seconds), 1))
+        pipe.expire(self.version_key, max(int(seconds), 1))
+        pipe.execute()
+
+    def load(self, entries: Iterable[Entry]) -> None:
+        """写入临时键后 RENAME，加载过程中读到的始终是完整的旧榜单"""
+        tmp = f"{self.key}:loading"
+        pipe = self._client.pipeline(transaction=False)
+        pipe.delete(tmp)
+        chunk = {}
+        for member, score in entries:
+            chunk[member] = score
+            if len(chunk) >= self.LOAD_CHUNK:
+                pipe.zadd(tmp, chunk)
+                chunk = {}
+        if chunk:
+            pipe.zadd(tmp, chunk)
+        pipe.execute()
+        if self._client.exists(tmp):
+            self._client.rename(tmp, self.key)
+        else:
+            self._client.delete(self.key)
+        self._client.incr(self.version_key)
+
+
+PartitionLoader = Callable[[], Iterable[Tuple[Hashable, int, float]]]
+PartitionTTL = Callable[[Hashable], Optional[float]]
+
+
+class Leaderboard:
+    """
+    分区排行榜
+
+    loader 返回 (分区, 成员, 分数) 的序列，用于首次访问时加载以及定期重新加载；
+    不分区的排行榜使用同一个分区键（如 "all"）。
+    partition_ttl 返回分区的剩余保留时间（秒），用于按时间分桶的榜单让旧分区自动过期。
+    """
+
+    def __init__(self, name: str, loader: PartitionLoader, client=None, reload_interval: float = 300.0,
+                 partition_ttl: Optional[PartitionTTL] = None):
+        self.name = name
+        self.loader = loader
+        self.reload_interval = reload_interval
+        self.partition_ttl = partition_ttl
+        self._client = client
+        self._partitions: Dict[Hashable, object] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = threading.RLock()
+        # 进程内榜单在锁外重新加载期间发生的增量更新，加载完成后重放
+        self._journal: Optional[List[Tuple[str, tuple]]] = None
+        # 进程内榜单的读写需要互斥，Redis 的单条命令本身是原子的
+        self._read_lock = self._lock if client is None else contextlib.nullcontext()
+
+    @property
+    def backend(self) -> str:
+        return "redis" if self._client is not None else "local"
+
+    def _partition(self, partition: Hashable):
+        scores = self._partitions.get(partition)
+        if scores is None:
+            with self._lock:
+                scores = self._partitions.get(partition)
+                if scores is None:
+                    if self._client is not None:
+                        scores = RedisSortedScores(self._client, f"leaderboard:{self.name}:{partition}")
+                    else:
+                        self._prune()
+                        scores = LocalSortedScores()
+                    self._partitions[partition] = scores
+        return scores
+
+    def _prune(self) -> None:
+        """丢弃已过期的进程内分区（Redis 的键由 Redis 自动过期）"""
+        expired = [p for p, scores in self._partitions.items() if isinstance(scores, LocalSortedScores)
+                   and scores.expired()]
+        for partition in expired:
+            del self._partitions[partition]
+        if expired:
+            logger.info(f"排行榜 {self.name} 丢弃过期分区: {', '.join(map(str, expired))}")
+
+    def _ready_key(self) -> str:
+        return f"leaderboard:{self.name}:ready"
+
+    def _needs_load(self) -> bool:
+        if self._client is not None:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < 1.0:
+                return False
+            ready = bool(self._client.exists(self._ready_key()))
+            if ready:
+                self._loaded_at = time.monotonic()
+            return not ready
+        # 进程内榜单的定期重新加载由后台任务调用 refresh，不在请求线程中执行
+        return self._loaded_at is None
+
+    def ensure_loaded(self) -> None:
+        if not self._needs_load():
+            return
+        with self._lock:
+            if self._needs_load():
+                self.reload()
+
+    def refresh(self) -> bool:
+        """后台定期调用：进程内榜单已加载且超过 reload_interval 时重新加载，返回是否重新加载"""
+        if self._client is not None or self.reload_interval <= 0 or self._loaded_at is None:
+            return False
+        if time.monotonic() - self._loaded_at < self.reload_interval:
+            return False
+        with self._lock:
+            self._prune()
+        self.reload()
+        return True
+
+    def _load_grouped(self) -> Dict[Hashable, List[Entry]]:
+        grouped: Dict[Hashable, List[Entry]] = {}
+        for partition, member, score in self.loader():
+            grouped.setdefault(partition, []).append((member, score))
+        return grouped
+
+    def _record(self, method: str, *args) -> None:
+        """重新加载期间记下增量更新（调用方持有锁）"""
+        if self._journal is not None:
+            self._journal.append((method, args))
+
+    def reload(self) -> None:
+        """
+        从数据源重新加载所有分区
+
+        进程内榜单在锁外查询数据源并建好新的有序集合，期间的增量更新记入日志；
+        最后在锁内替换各分区的内容并按顺序重放这些更新，读请求只在替换时短暂等待。
+        """
+        started = time.perf_counter()
+        if self._client is not None:
+            # Redis 榜单的读不经过锁；加载期间持有锁，避免加载前读到的数据覆盖期间发生的增量更新
+            with self._lock:
+                grouped = self._load_grouped()
+                for partition in set(self._partitions) - set(grouped):
+                    self._partition(partition).load(())
+                for partition, entries in grouped.items():
+                    scores = self._partition(partition)
+                    scores.load(entries)
+                    self._expire(partition, scores)
+                self._client.set(self._ready_key(), 1)
+                self._loaded_at = time.monotonic()
+        else:
+            with self._lock:
+                if self._journal is not None:
+                    # 其他线程正在重新加载
+                    return
+                self._journal = []
+            try:
+                grouped = self._load_grouped()
+                fresh: Dict[Hashable, LocalSortedScores] = {}
+                for partition, entries in grouped.items():
+                    fresh[partition] = LocalSortedScores()
+                    fresh[partition].load(entries)
+            except BaseException:
+                with self._lock:
+                    self._journal = None
+                raise
+            with self._lock:
+                journal, self._journal = self._journal, None
+                for partition in set(self._partitions) - set(fresh):
+                    self._partitions[partition].load(())
+                for partition, loaded in fresh.items():
+                    scores = self._partition(partition)
+                    scores.replace(loaded)
+                    self._expire(partition, scores)
+                # 加载期间的更新不一定包含在读到的数据中；每条更新重复应用的结果不变，按顺序重放即可
+                for method, args in journal:
+                    getattr(self, method)(*args)
+                self._loaded_at = time.monotonic()
+        logger.info(f"排行榜 {self.name} 已加载: {len(grouped)} 个分区, "
+                    f"{sum(len(e) for e in grouped.values())} 条, 耗时 {time.perf_counter() - started:.2f}秒")
+
+    def invalidate(self) -> None:
+        """下次访问时重新加载"""
+        with self._lock:
+            self._loaded_at = None
+            if self._client is not None:
+                self._client.delete(self._ready_key())
+
+    def _expire(self, partition: Hashable, scores) -> None:
+        if self.partition_ttl is not None:
+            ttl = self.partition_ttl(partition)
+            if ttl is not None:
+                scores.expire(ttl)
+
+    def add(self, partition: Hashable, member: int, score: float, limit: Optional[int] = None) -> None:
+        """更新成员分数；limit 不为空时分区只保留前 limit 名"""
+        with self._lock:
+            self._record("add", partition, member, score, limit)
+            scores = self._partition(partition)
+            scores.add(member, score)
+            if limit is not None:
+                scores.trim(limit)
+            self._expire(partition, scores)
+
+    def add_max(self, partition: Hashable, member: int, score: float) -> bool:
+        """原子地把成员分数提高到 score（已有更高的分数时不变），返回是否更新"""
+        with self._lock:
+            self._record("add_max", partition, member, score)
+            scores = self._partition(partition)
+            changed = scores.add_max(member, score)
+            if changed:
+                self._expire(partition, scores)
+            return changed
+
+    def remove(self, partition: Hashable, member: int) -> None:
+        with self._lock:
+            self._record("remove", partition, member)
+            self._partition(partition).remove(member)
+
+    def drop(self, partition: Hashable) -> None:
+        """清空并丢弃一个分区"""
+        with self._lock:
+            self._record("drop", partition)
+            scores = self._partitions.pop(partition, None)
+            if scores is not None:
+                scores.load(())
+
+    def score(self, partition: Hashable, member: int) -> Optional[float]:
+        self.ensure_loaded()
+        with self._read_lock:
+            return self._partition(partition).score(member)
+
+    def scores(self, partition: Hashable, members: Iterable[int]) -> Dict[int, float]:
+        """批量查询分数，不在榜上的成员不出现在结果中"""
+        self.ensure_loaded()
+        with self._read_lock:
+            return self._partition(partition).scores(members)
+
+    def rank(self, partition: Hashable, member: int) -> Optional[int]:
+        """名次（从0开始），不在榜上返回 None"""
+        self.ensure_loaded()
+        with self._read_lock:
+            return self._partition(partition).rank(member)
+
+    def page(self, partition: Hashable, offset: int, limit: int) -> List[Entry]:
+        self.ensure_loaded()
+        with self._read_lock:
+            return self._partition(partition).range(offset, offset + limit)
+
+    def count_above(self, partition: Hashable, score: float) -> int:
+        """分数高于 score 的成员数（同分同名次时的名次减一）"""
+        self.ensure_loaded()
+        with self._read_lock:
+            return self._partition(partition).count_above(score)
+
+    def around(self, partition: Hashable, score: float, count: int) -> List[Entry]:
+        """分数最接近 score 的一段：插入位置前后各最多 count 名，按名次排列"""
+        self.ensure_loaded()
+        with self._read_lock:
+            scores = self._partition(partition)
+            pos = scores.count_above(score)
+            start = max(pos - count, 0)
+            return scores.range(start, pos + count)
+
+    def count(self, partition: Hashable) -> int:
+        self.ensure_loaded()
+        with self._read_lock:
+            return len(self._partition(partition))
+
+    def version(self, partition: Hashable) -> int:
+        """分区的变更计数，内容不变时保持不变"""
+        self.ensure_loaded()
+        with self._read_lock:
+            return self._partition(partition).version()
+
+
+def create_leaderboard(name: str, loader: PartitionLoader, backend: str = "redis",
+                       redis_options: Optional[Dict] = None, reload_interval: float = 300.0,
+                       partition_ttl: Optional[PartitionTTL] = None) -> Leaderboard:
+    """创建排行榜；Redis不可用时回退到进程内有序集合"""
+    client = None
+    if backend == "redis" and REDIS_AVAILABLE:
+        try:
+            client = redis.Redis(socket_timeout=0.5, socket_connect_timeout=0.5, **(redis_options or {}))
+            client.ping()
+        except Exception as e:
+            logger.warning(f"Redis不可用，排行榜 {name} 回退为进程内有序集合: {e}")
+            client = None
+    return Leaderboard(name, loader, client=client, reload_interval=reload_interval, partition_ttl=partition_ttl)
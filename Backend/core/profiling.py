@@ -0,0 +1,206 @@
+"""
+请求级栈采样剖析
+
+开启后，带有 X-Profile 请求头（值为 PROFILER_TOKEN）或被随机抽中的请求会由后台线程
+按固定间隔采样调用栈，只保留属于该请求的栈：
+- 事件循环线程上，栈中包含该请求中间件帧的样本（即正在执行该请求的协程）
+- 线程池线程上，正在该请求的上下文中运行的同步端点或依赖项（anyio 的工作线程通过 Context.run 执行）
+请求在途但不在任何线程上执行时（等待人脸检测、等待限流配额等）记为 <await>。
+结果写成 speedscope JSON 或折叠栈文本，可直接用 speedscope / flamegraph.pl 打开。
+"""
+import contextvars
+import hmac
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+Frame = Tuple[str, str, int]
+
+_active_session: contextvars.ContextVar[Optional["ProfileSession"]] = contextvars.ContextVar(
+    "profile_session", default=None
+)
+
+AWAIT_FRAME: Frame = ("<await>", "", 0)
+
+
+def _frame_key(frame) -> Frame:
+    code = frame.f_code
+    return code.co_name, code.co_filename, frame.f_lineno
+
+
+_QUEUE_GET_CODE = queue.Queue.get.__code__
+
+
+def _runs_in_context(frame, callee, session: "ProfileSession") -> bool:
+    """线程池工作线程是否正在该会话的 Context 中执行任务"""
+    if frame.f_code.co_name != "run" or callee is None or callee.f_code is _QUEUE_GET_CODE:
+        # 空闲的工作线程阻塞在 queue.get 上，局部变量中仍保留着上一个任务的 Context
+        return False
+    context = frame.f_locals.get("context")
+    return isinstance(context, contextvars.Context) and context.get(_active_session) is session
+
+
+class ProfileSession:
+    """一次请求的采样会话"""
+
+    def __init__(self, name: str, interval: float):
+        self.name = name
+        self.interval = interval
+        self.profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.samples: Counter = Counter()
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.loop_thread = threading.get_ident()
+        self.root_frame = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self, root_frame) -> None:
+        self.root_frame = root_frame
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            found = False
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = self._request_stack(thread_id, frame)
+                if stack:
+                    self.samples[stack] += 1
+                    found = True
+            if not found:
+                self.samples[(AWAIT_FRAME,)] += 1
+
+    def _request_stack(self, thread_id: int, frame) -> Optional[Tuple[Frame, ...]]:
+        """截取属于该请求的部分栈（从根到叶），不属于该请求时返回 None"""
+        stack: List[Frame] = []
+        callee = None
+        while frame is not None:
+            if thread_id == self.loop_thread:
+                if frame is self.root_frame:
+                    return tuple(reversed(stack))
+            elif _runs_in_context(frame, callee, self):
+                # 去掉 Context.run 之上的线程池框架帧
+                return tuple(reversed(stack))
+            stack.append(_frame_key(frame))
+            callee, frame = frame, frame.f_back
+        return None
+
+    def to_folded(self) -> str:
+        lines = []
+        for stack, count in self.samples.most_common():
+            names = [f"{name} ({os.path.basename(filename)}:{line})" if filename else name
+                     for name, filename, line in stack]
+            lines.append(";".join([self.name] + names) + f" {count}")
+        return "\n".join(lines) + "\n"
+
+    def to_speedscope(self) -> str:
+        frame_index: Dict[Frame, int] = {}
+        frames = []
+        samples = []
+        weights = []
+        for stack, count in self.samples.most_common():
+            indexes = []
+            for key in stack:
+                if key not in frame_index:
+                    frame_index[key] = len(frames)
+                    name, filename, line = key
+                    frames.append({"name": name, "file": filename, "line": line} if filename else {"name": name})
+                indexes.append(frame_index[key])
+            samples.append(indexes)
+            weights.append(count * self.interval)
+        return json.dumps({
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name,
+            "exporter": "face_score_pk",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": self.name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": self.duration,
+                "samples": samples,
+                "weights": weights,
+            }],
+        })
+
+    def save(self, directory: str, fmt: str) -> str:
+        os.makedirs(directory, exist_ok=True)
+        suffix, content = (".speedscope.json", self.to_speedscope()) if fmt == "speedscope" else (".folded", self.to_folded())
+        safe_name = "".join(c if c.isalnum() else "_" for c in self.name).strip("_")[:80]
+        filename = f"{self.profile_id}-{safe_name}{suffix}"
+        with open(os.path.join(directory, filename), "w", encoding="utf-8") as f:
+            f.write(content)
+        return filename
+
+
+def profiler_enabled() -> bool:
+    return bool(settings.PROFILER_TOKEN) or settings.PROFILER_SAMPLE_RATE > 0
+
+
+class ProfilerMiddleware:
+    """
+    ASGI 中间件：按请求头或采样率剖析单个API请求
+
+    同一时间只剖析一个请求，其余请求不受影响；只有 profiler_enabled() 为真时才应安装。
+    """
+
+    def __init__(self, app, path_prefix: str = ""):
+        self.app = app
+        self.path_prefix = path_prefix
+        self._busy = threading.Lock()
+
+    def _wants_profile(self, scope) -> bool:
+        if not scope["path"].startswith(self.path_prefix):
+            return False
+        if settings.PROFILER_TOKEN:
+            for name, value in scope.get("headers", ()):
+                if name == b"x-profile":
+                    return hmac.compare_digest(value, settings.PROFILER_TOKEN.encode())
+        return settings.PROFILER_SAMPLE_RATE > 0 and random.random() < settings.PROFILER_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wants_profile(scope) or not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        session = ProfileSession(f"{scope['method']} {scope['path']}", settings.PROFILER_INTERVAL)
+        token = _active_session.set(session)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = dict(message, headers=list(message.get("headers", ())) + [(b"x-profile-id", session.profile_id.encode())])
+            await send(message)
+
+        try:
+            session.start(sys._getframe())
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _active_session.reset(token)
+            session.stop()
+            self._busy.release()
+            try:
+                saved = session.save(settings.PROFILER_OUTPUT_DIR, settings.PROFILER_FORMAT)
+                logger.info("请求剖析已保存: %s (%d 个样本, %.1fms)", saved, sum(session.samples.values()), session.duration * 1000)
+            except OSError as e:
+                logger.error(f"保存剖析结果失败: {e}")
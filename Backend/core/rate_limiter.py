@@ -0,0 +1,297 @@
+"""
+出站调用的配额限流与优先级调度
+
+令牌桶控制整体QPS，可以存放在Redis中由多个进程（API服务、批处理脚本）共享；
+等待中的请求按优先级登记，低优先级请求在有高优先级请求等待时主动让行。
+"""
+import asyncio
+import enum
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+import logging
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    redis = None
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(enum.IntEnum):
+    """调用优先级，数值越小越优先"""
+    INTERACTIVE = 0
+    BATCH = 1
+
+
+class RateLimitExceeded(Exception):
+    """在等待时间内没有获得配额"""
+
+
+class LocalTokenBucket:
+    """进程内令牌桶"""
+
+    # 调用不涉及 I/O，可以直接在事件循环中执行
+    blocking = False
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._waiting: Dict[int, int] = {}
+
+    def take(self, reserve: float = 0.0) -> float:
+        """尝试取一个令牌，桶内需保留 reserve 个令牌；成功返回0，否则返回建议等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1.0 + reserve:
+                self._tokens -= 1.0
+                return 0.0
+            return (1.0 + reserve - self._tokens) / self.rate
+
+    def enter(self, priority: int, waiter_id: str) -> None:
+        with self._lock:
+            self._waiting[priority] = self._waiting.get(priority, 0) + 1
+
+    def refresh(self, priority: int, waiter_id: str) -> None:
+        pass
+
+    def leave(self, priority: int, waiter_id: str) -> None:
+        with self._lock:
+            self._waiting[priority] = max(self._waiting.get(priority, 0) - 1, 0)
+
+    def waiting(self, priority: int) -> int:
+        return self._waiting.get(priority, 0)
+
+
+# 令牌桶脚本：使用Redis服务器时间，保证多进程之间的计算一致
+_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local reserve = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or burst
+local ts = tonumber(data[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 + reserve then
+    tokens = tokens - 1
+else
+    wait = (1 + reserve - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], 60)
+return tostring(wait)
+"""
+
+
+class RedisTokenBucket:
+    """
+    存放在Redis中的令牌桶，多个进程共享同一份配额
+
+    等待者登记在按优先级区分的有序集合中，分值为过期时间，
+    进程异常退出时登记会自动过期，不会让低优先级请求永久让行。
+    """
+
+    WAITER_TTL = 10.0
+    # 每次调用都是一次同步的网络往返
+    blocking = True
+
+    def __init__(self, client, key: str, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self._client = client
+        self._key = key
+        self._take = client.register_script(_TAKE_SCRIPT)
+        # Redis临时不可用时退回进程内令牌桶，不影响调用方
+        self._fallback = LocalTokenBucket(rate, burst)
+
+    def _waiters_key(self, priority: int) -> str:
+        return f"{self._key}:waiting:{priority}"
+
+    def _on_error(self, e: Exception) -> None:
+        logger.warning(f"Redis限流调用失败，临时使用进程内令牌桶: {e}")
+
+    def take(self, reserve: float = 0.0) -> float:
+        try:
+            return float(self._take(keys=[self._key], args=[self.rate, self.burst, reserve]))
+        except redis.RedisError as e:
+            self._on_error(e)
+            return self._fallback.take(reserve)
+
+    def enter(self, priority: int, waiter_id: str) -> None:
+        try:
+            self._client.zadd(self._waiters_key(priority), {waiter_id: time.time() + self.WAITER_TTL})
+        except redis.RedisError as e:
+            self._on_error(e)
+
+    refresh = enter
+
+    def leave(self, priority: int, waiter_id: str) -> None:
+        try:
+            self._client.zrem(self._waiters_key(priority), waiter_id)
+        except redis.RedisError as e:
+            self._on_error(e)
+
+    def waiting(self, priority: int) -> int:
+        key = self._waiters_key(priority)
+        try:
+            pipe = self._client.pipeline()
+            pipe.zremrangebyscore(key, "-inf", time.time())
+            pipe.zcard(key)
+            return int(pipe.execute()[1])
+        except redis.RedisError as e:
+            self._on_error(e)
+            return 0
+
+
+class PriorityRateLimiter:
+    """
+    按优先级调度的限流器
+
+    acquire 在给定时间内等待配额：有更高优先级的请求在等待时，当前请求让行；
+    批处理请求还可以要求桶内为交互请求保留 batch_reserve 个令牌。
+    """
+
+    USAGE_WINDOW = 10.0
+
+    def __init__(self, name: str, bucket, batch_reserve: float = 0.0):
+        self.name = name
+        self.bucket = bucket
+        self.batch_reserve = batch_reserve
+        self._lock = threading.Lock()
+        self._queue_depth: Dict[Priority, int] = {p: 0 for p in Priority}
+        self._granted: Dict[Priority, int] = {p: 0 for p in Priority}
+        self._throttled: Dict[Priority, int] = {p: 0 for p in Priority}
+        self._rejected: Dict[Priority, int] = {p: 0 for p in Priority}
+        self._wait_seconds: Dict[Priority, float] = {p: 0.0 for p in Priority}
+        self._recent: Deque[float] = deque()
+
+    def _reserve_for(self, priority: Priority) -> float:
+        return self.batch_reserve if priority > Priority.INTERACTIVE else 0.0
+
+    def _higher_waiting(self, priority: Priority) -> bool:
+        return any(self.bucket.waiting(p) > 0 for p in Priority if p < priority)
+
+    def _grant(self, priority: Priority, waited: float) -> None:
+        with self._lock:
+            self._granted[priority] += 1
+            self._wait_seconds[priority] += waited
+            now = time.monotonic()
+            self._recent.append(now)
+            while self._recent and now - self._recent[0] > self.USAGE_WINDOW:
+                self._recent.popleft()
+
+    async def _call(self, fn: Callable, *args) -> Any:
+        """调用令牌桶；Redis令牌桶的调用是同步网络请求，放到线程池中执行，不阻塞事件循环"""
+        if not self.bucket.blocking:
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def try_acquire(self, priority: Priority = Priority.INTERACTIVE) -> bool:
+        """不等待，立即尝试获得一个配额（用于对冲请求等可有可无的调用）"""
+        if (await self._call(self._higher_waiting, priority)
+                or await self._call(self.bucket.take, self._reserve_for(priority)) > 0):
+            return False
+        self._grant(priority, 0.0)
+        return True
+
+    async def acquire(self, priority: Priority = Priority.INTERACTIVE, timeout: float = 5.0) -> bool:
+        """在 timeout 秒内等待配额，成功返回 True"""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + timeout
+        waiter_id = uuid.uuid4().hex
+        registered = False
+        try:
+            while True:
+                if await self._call(self._higher_waiting, priority):
+                    wait = 1.0 / self.bucket.rate
+                else:
+                    wait = await self._call(self.bucket.take, self._reserve_for(priority))
+                    if wait <= 0:
+                        self._grant(priority, loop.time() - started)
+                        return True
+
+                if not registered:
+                    registered = True
+                    with self._lock:
+                        self._queue_depth[priority] += 1
+                        self._throttled[priority] += 1
+                    await self._call(self.bucket.enter, priority, waiter_id)
+                else:
+                    await self._call(self.bucket.refresh, priority, waiter_id)
+
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    with self._lock:
+                        self._rejected[priority] += 1
+                    return False
+                # 加入少量抖动，避免多个等待者同时醒来争抢
+                await asyncio.sleep(min(wait * random.uniform(1.0, 1.2), remaining))
+        finally:
+            if registered:
+                with self._lock:
+                    self._queue_depth[priority] -= 1
+                await self._call(self.bucket.leave, priority, waiter_id)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """队列深度、配额使用率等统计信息"""
+        with self._lock:
+            now = time.monotonic()
+            recent = sum(1 for t in self._recent if now - t <= self.USAGE_WINDOW)
+            result = {}
+            for p in Priority:
+                result[p.name.lower()] = {
+                    "queue_depth": self._queue_depth[p],
+                    "granted_total": self._granted[p],
+                    "throttled_total": self._throttled[p],
+                    "rejected_total": self._rejected[p],
+                    "wait_seconds_total": self._wait_seconds[p],
+                }
+        for p in Priority:
+            result[p.name.lower()]["global_queue_depth"] = self.bucket.waiting(p)
+        result["quota"] = {
+            "rate_limit_qps": self.bucket.rate,
+            "used_qps": recent / self.USAGE_WINDOW,
+            "usage_ratio": recent / self.USAGE_WINDOW / self.bucket.rate,
+        }
+        return result
+
+
+def create_rate_limiter(
+    name: str,
+    rate: float,
+    burst: float,
+    batch_reserve: float = 0.0,
+    backend: str = "redis",
+    redis_options: Optional[Dict] = None,
+) -> PriorityRateLimiter:
+    """创建限流器；Redis不可用时回退到进程内令牌桶（此时配额只在单个进程内生效）"""
+    if not rate > 0:
+        raise ValueError(f"限流器 {name} 配置错误: QPS 必须大于0，当前为 {rate}")
+    if not burst >= 1:
+        raise ValueError(f"限流器 {name} 配置错误: 突发容量必须至少为1，当前为 {burst}")
+    bucket = None
+    if backend == "redis" and REDIS_AVAILABLE:
+        try:
+            client = redis.Redis(socket_timeout=0.5, socket_connect_timeout=0.5, **(redis_options or {}))
+            client.ping()
+            bucket = RedisTokenBucket(client, f"ratelimit:{name}", rate, burst)
+        except Exception as e:
+            logger.warning(f"Redis不可用，{name} 限流回退为进程内令牌桶: {e}")
+    if bucket is None:
+        bucket = LocalTokenBucket(rate, burst)
+    return PriorityRateLimiter(name, bucket, batch_reserve=batch_reserve)
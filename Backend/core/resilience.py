@@ -0,0 +1,273 @@
+"""
+外部依赖调用的容错工具：截止时间、带抖动的退避重试、重试预算、熔断器以及对冲请求
+"""
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, Set
+import logging
+
+from core.rate_limiter import Priority, PriorityRateLimiter, RateLimitExceeded
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，调用被快速拒绝"""
+
+
+class DeadlineExceeded(Exception):
+    """调用超过了截止时间"""
+
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    closed: 正常放行，连续失败达到阈值后转为 open
+    open: 直接拒绝，经过 reset_timeout 后转为 half_open
+    half_open: 只放行有限的探测请求，成功则恢复 closed，失败则重新 open
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, half_open_max_calls: int = 1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self) -> None:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+
+    def allow(self) -> bool:
+        """判断当前是否允许发起调用"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+            return False
+
+    def release(self) -> None:
+        """占用了探测名额却没有发出请求（或无法判断上游状态）时归还名额"""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._half_open_calls = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(f"熔断器打开，连续失败次数: {self._failures}")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class RetryBudget:
+    """
+    重试预算
+
+    每个首次请求存入 ratio 个令牌，每次重试（或对冲请求）消耗一个令牌，
+    保证上游故障时重试流量不超过正常流量的固定比例，避免重试风暴。
+    min_reserve 保证低流量时也有少量重试机会。
+    """
+
+    def __init__(self, ratio: float = 0.2, min_reserve: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max(min_reserve, 1.0)
+        self._tokens = self.max_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+
+def _discard_result(future: asyncio.Future) -> None:
+    if not future.cancelled():
+        future.exception()
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """指数退避加完全抖动（full jitter）"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class ResilientCaller:
+    """
+    对阻塞调用进行容错包装，在线程池中执行，不阻塞事件循环
+
+    被包装的函数签名为 fn(timeout: float) -> Any，失败时抛出异常；
+    is_retryable(exc) 决定异常是否可以重试以及是否计入熔断失败。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        attempt_timeout: float,
+        deadline: float,
+        max_retries: int = 2,
+        backoff_base: float = 0.1,
+        backoff_max: float = 1.0,
+        hedge_delay: float = 0.0,
+        breaker: Optional[CircuitBreaker] = None,
+        budget: Optional[RetryBudget] = None,
+        max_workers: int = 16,
+        is_retryable: Optional[Callable[[BaseException], bool]] = None,
+        rate_limiter: Optional[PriorityRateLimiter] = None,
+    ):
+        self.name = name
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_delay = hedge_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.budget = budget or RetryBudget()
+        self.is_retryable = is_retryable or (lambda exc: True)
+        self.rate_limiter = rate_limiter
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+
+    async def call(self, fn: Callable[[float], Any], priority: Priority = Priority.INTERACTIVE) -> Any:
+        """在截止时间内执行调用，必要时重试或发起对冲请求；每个物理请求都需要先获得配额"""
+        loop = asyncio.get_running_loop()
+        deadline_at = loop.time() + self.deadline
+        self.budget.deposit()
+
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"{self.name} 熔断中，拒绝调用")
+
+            if self.rate_limiter is not None:
+                remaining = deadline_at - loop.time()
+                acquired = False
+                try:
+                    acquired = remaining > 0 and await self.rate_limiter.acquire(priority, remaining)
+                finally:
+                    if not acquired:
+                        # 没有发出请求，归还半开状态下的探测名额
+                        self.breaker.release()
+                if not acquired:
+                    raise RateLimitExceeded(f"{self.name} 在截止时间内未获得调用配额")
+
+            try:
+                return await self._attempt(fn, deadline_at, priority)
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                retryable = self.is_retryable(e)
+                remaining = deadline_at - loop.time()
+                if not retryable or attempt >= self.max_retries or remaining <= 0:
+                    raise
+                if not self.budget.try_withdraw():
+                    logger.warning(f"{self.name} 重试预算耗尽，放弃重试: {e}")
+                    raise
+
+                delay = min(backoff_delay(attempt, self.backoff_base, self.backoff_max), remaining)
+                attempt += 1
+                logger.warning(f"{self.name} 第{attempt}次重试，{delay:.3f}秒后执行，原因: {e}")
+                await asyncio.sleep(delay)
+
+    async def _attempt(self, fn: Callable[[float], Any], deadline_at: float, priority: Priority) -> Any:
+        """执行一次逻辑调用；开启对冲时可能并发两个物理请求，取先成功者"""
+        loop = asyncio.get_running_loop()
+        remaining = deadline_at - loop.time()
+        if remaining <= 0:
+            self.breaker.release()
+            raise DeadlineExceeded(f"{self.name} 已超过截止时间")
+
+        timeout = min(self.attempt_timeout, remaining)
+        primary = self._submit(fn, timeout)
+        pending: Set[asyncio.Future] = {primary}
+
+        if self.hedge_delay > 0 and self.hedge_delay < timeout:
+            done, _ = await asyncio.wait(pending, timeout=self.hedge_delay)
+            if not done and await self._may_hedge(priority):
+                hedge_timeout = min(self.attempt_timeout, deadline_at - loop.time())
+                if hedge_timeout > 0:
+                    logger.info(f"{self.name} 首个请求{self.hedge_delay}秒未返回，发起对冲请求")
+                    pending.add(self._submit(fn, hedge_timeout))
+                else:
+                    self.breaker.release()
+
+        try:
+            return await self._first_success(pending, deadline_at)
+        finally:
+            # 被放弃的请求仍在线程中运行，取走其结果以免产生未处理异常的警告
+            for future in pending:
+                future.add_done_callback(_discard_result)
+
+    async def _may_hedge(self, priority: Priority) -> bool:
+        if not self.breaker.allow():
+            return False
+        # 对冲请求不等待配额，拿不到就放弃（并归还 allow() 占用的探测名额）
+        if self.budget.try_withdraw() and (self.rate_limiter is None or await self.rate_limiter.try_acquire(priority)):
+            return True
+        self.breaker.release()
+        return False
+
+    async def _first_success(self, pending: Set[asyncio.Future], deadline_at: float) -> Any:
+        loop = asyncio.get_running_loop()
+        last_error: Optional[BaseException] = None
+        while pending:
+            # 线程中的请求自带超时，这里额外留出少量余量防止线程卡死
+            wait_for = max(deadline_at - loop.time(), 0) + 0.05
+            done, _ = await asyncio.wait(pending, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            pending -= done
+            for future in done:
+                error = future.exception()
+                if error is None:
+                    self.breaker.record_success()
+                    return future.result()
+                if not self.is_retryable(error):
+                    # 业务性失败（如未检测到人脸）说明上游是健康的，直接返回给调用方
+                    self.breaker.record_success()
+                    raise error
+                last_error = error
+                self.breaker.record_failure()
+
+        if last_error is None:
+            self.breaker.record_failure()
+            raise DeadlineExceeded(f"{self.name} 调用超时")
+        raise last_error
+
+    def _submit(self, fn: Callable[[float], Any], timeout: float) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self._executor, fn, timeout)
@@ -1,5 +1,7 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, Optional, Tuple, Union
 import logging
 
 from jose import jwt, JWTError
@@ -8,13 +10,22 @@ from sqlalchemy.orm import Session
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 
-from config.settings import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from config.settings import (
+    SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES,
+    BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING, PASSWORD_HASH_QUEUE_TIMEOUT
+)
 
 # 设置日志
 logger = logging.getLogger(__name__)
 
 # 密码上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# hex_sha256 仅用于校验早期开发环境遗留的简单哈希，登录成功后会自动升级为bcrypt；
+# 调整 BCRYPT_ROUNDS 后，旧成本参数的哈希同样会在登录时重新计算
+pwd_context = CryptContext(schemes=["bcrypt", "hex_sha256"], deprecated=["hex_sha256"], bcrypt__rounds=BCRYPT_ROUNDS)
+
+# bcrypt 计算耗时上百毫秒，放到独立线程池中执行，避免阻塞事件循环
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_hash_semaphore: Optional[asyncio.Semaphore] = None
 
 # OAuth2登录表单
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/auth/login")
@@ -22,16 +33,20 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/auth/login")
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """验证密码"""
     try:
-        logger.info(f"验证密码: plain_password类型={type(plain_password)}, hashed_password类型={type(hashed_password)}")
-        logger.info(f"hashed_password值={hashed_password[:10]}...")
-        result = pwd_context.verify(plain_password, hashed_password)
-        logger.info(f"密码验证结果: {result}")
-        return result
+        return pwd_context.verify(plain_password, hashed_password)
     except Exception as e:
         logger.error(f"密码验证出错: {str(e)}")
         # 如果出错，返回False而不是抛出异常
         return False
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """验证密码，若哈希算法或成本参数已过时，同时返回重新计算的哈希"""
+    try:
+        return pwd_context.verify_and_update(plain_password, hashed_password)
+    except Exception as e:
+        logger.error(f"密码验证出错: {str(e)}")
+        return False, None
+
 def get_password_hash(password: str) -> str:
     """获取密码哈希"""
     try:
@@ -42,6 +57,33 @@ def get_password_hash(password: str) -> str:
         import hashlib
         return hashlib.sha256(password.encode()).hexdigest()
 
+async def _run_hash_job(func, *args):
+    """在密码哈希线程池中执行任务，排队的任务数超过上限时等待，超时返回503"""
+    global _hash_semaphore
+    if _hash_semaphore is None:
+        _hash_semaphore = asyncio.Semaphore(PASSWORD_HASH_MAX_PENDING)
+    try:
+        await asyncio.wait_for(_hash_semaphore.acquire(), timeout=PASSWORD_HASH_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("密码哈希任务排队超时")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="服务繁忙，请稍后再试",
+        )
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, func, *args)
+    finally:
+        _hash_semaphore.release()
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """异步验证密码，返回 (是否通过, 需要更新时的新哈希)"""
+    return await _run_hash_job(verify_and_update_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """异步计算密码哈希"""
+    return await _run_hash_job(get_password_hash, password)
+
 def create_access_token(subject: Union[str, Any], expires_delta: Optional[timedelta] = None) -> str:
     """创建访问令牌"""
     if expires_delta:
@@ -54,21 +96,24 @@ def create_access_token(subject: Union[str, Any], expires_delta: Optional[timede
     
     return encoded_jwt
 
-def decode_token(token: str) -> str:
-    """解码令牌并返回用户ID (sub字段)"""
+def decode_token_payload(token: str) -> Dict[str, Any]:
+    """解码令牌并返回完整负载，令牌无效或缺少sub字段时抛出401"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="无效的身份认证凭据",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        return user_id
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="无效的身份认证凭据",
             headers={"WWW-Authenticate": "Bearer"},
-        ) 
\ No newline at end of file
+        )
+    if payload.get("sub") is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="无效的身份认证凭据",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return payload
+
+def decode_token(token: str) -> str:
+    """解码令牌并返回用户ID (sub字段)"""
+    return decode_token_payload(token)["sub"]
@@ -0,0 +1,182 @@
+"""
+请求级追踪
+
+中间件为每个请求创建一个 RequestTrace 放入上下文变量，SQLAlchemy 引擎事件在执行SQL时
+累计查询次数、数据库耗时和最慢的语句；请求结束时写入响应头（X-DB-Query-Count、Server-Timing），
+并记录慢查询和慢请求日志。
+"""
+import contextvars
+import logging
+import time
+import uuid
+from typing import Any, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import settings
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+DB_QUERIES = metrics.counter("db_queries_total", "执行的SQL语句数")
+DB_QUERY_SECONDS = metrics.histogram("db_query_seconds", "单条SQL执行耗时（秒）")
+REQUEST_QUERIES = metrics.histogram(
+    "http_request_db_queries", "每个请求执行的SQL语句数", ["route"],
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100, 200, 500),
+)
+
+# 日志中SQL和参数的最大长度
+_MAX_LOG_LENGTH = 2000
+
+
+class RequestTrace:
+    """单个请求的追踪数据"""
+
+    __slots__ = ("request_id", "started", "query_count", "db_time", "slowest_time", "slowest_statement")
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.db_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement: Optional[str] = None
+
+    def record_query(self, statement: str, duration: float) -> None:
+        self.query_count += 1
+        self.db_time += duration
+        if duration > self.slowest_time:
+            self.slowest_time = duration
+            self.slowest_statement = statement
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+
+_current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar("request_trace", default=None)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    """当前请求的追踪数据，不在请求中时为 None"""
+    return _current_trace.get()
+
+
+def _truncate(value: Any) -> str:
+    text = str(value)
+    return text if len(text) <= _MAX_LOG_LENGTH else text[:_MAX_LOG_LENGTH] + "..."
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    duration = time.perf_counter() - started
+    DB_QUERIES.inc()
+    DB_QUERY_SECONDS.observe(duration)
+
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.record_query(statement, duration)
+
+    if settings.SLOW_QUERY_MS and duration * 1000 >= settings.SLOW_QUERY_MS:
+        logger.warning(
+            "慢查询 %.1fms: %s 参数: %s",
+            duration * 1000,
+            _truncate(statement),
+            _truncate(parameters) if settings.SLOW_QUERY_LOG_PARAMS else "<hidden>",
+            extra={
+                "request_id": trace.request_id if trace else None,
+                "duration_ms": round(duration * 1000, 2),
+            },
+        )
+
+
+def _handle_error(exception_context):
+    # 执行失败时不会触发 after_cursor_execute，清理开始时间
+    stack = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if stack:
+        stack.pop()
+
+
+def install_query_hooks(engine: Engine) -> None:
+    """在引擎上注册SQL计时钩子（重复调用不会重复注册）"""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+class RequestTracingMiddleware:
+    """
+    ASGI 中间件：为每个HTTP请求建立追踪上下文，并在响应头中返回SQL统计
+
+    响应头在响应开始时写出，此后（如依赖项清理阶段）执行的SQL只计入日志和指标。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        trace = RequestTrace(request_id or uuid.uuid4().hex)
+        token = _current_trace.set(trace)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                elapsed_ms = trace.elapsed * 1000
+                db_ms = trace.db_time * 1000
+                headers = list(message.get("headers", ()))
+                headers.extend([
+                    (b"x-request-id", trace.request_id.encode("latin-1")),
+                    (b"x-db-query-count", str(trace.query_count).encode()),
+                    (b"server-timing", (
+                        f'db;dur={db_ms:.1f};desc="{trace.query_count} queries", app;dur={elapsed_ms:.1f}'
+                    ).encode()),
+                ])
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_trace.reset(token)
+            self._finish(scope, trace)
+
+    @staticmethod
+    def _finish(scope, trace: RequestTrace) -> None:
+        route = scope.get("route")
+        route_path = getattr(route, "path", None) or "unmatched"
+        REQUEST_QUERIES.labels(route=route_path).observe(trace.query_count)
+
+        elapsed_ms = trace.elapsed * 1000
+        if settings.SLOW_REQUEST_MS and elapsed_ms >= settings.SLOW_REQUEST_MS:
+            log = logger.warning
+        elif logger.isEnabledFor(logging.DEBUG):
+            log = logger.debug
+        else:
+            return
+        log(
+            "%s %s 耗时 %.1fms, SQL %d 条共 %.1fms, 最慢 %.1fms: %s",
+            scope["method"], scope["path"], elapsed_ms, trace.query_count, trace.db_time * 1000,
+            trace.slowest_time * 1000, _truncate(trace.slowest_statement or "-"),
+            extra={
+                "request_id": trace.request_id,
+                "route": route_path,
+                "duration_ms": round(elapsed_ms, 2),
+                "db_queries": trace.query_count,
+                "db_time_ms": round(trace.db_time * 1000, 2),
+            },
+        )
@@ -36,6 +36,10 @@ def init_db():
         logger.info("创建数据库表...")
         Base.metadata.create_all(bind=engine)
         
+        # 已有数据库补充新增的列并转换旧数据
+        from migrate_db import run_migrations
+        run_migrations(engine)
+        
         # 检查表是否创建成功
         inspector = inspect(engine)
         tables = inspector.get_table_names()
@@ -184,6 +188,13 @@ def init_db():
                 
                 # 提交评分数据
                 db.commit()
+                
+                # 按初始数据生成用户统计
+                from services.stats import StatsService
+                StatsService(db).rebuild()
+                db.commit()
+                from services.leaderboard import invalidate_boards
+                invalidate_boards()
                 logger.info("初始排行榜数据添加完成!")
                 
                 # 验证数据是否添加成功
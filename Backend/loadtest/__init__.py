@@ -0,0 +1,3 @@
+"""
+端到端压测
+"""
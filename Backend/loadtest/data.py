@@ -0,0 +1,57 @@
+"""
+压测数据生成：填充数据库、生成合成人脸图片
+"""
+import io
+import os
+import random
+
+from PIL import Image, ImageDraw
+
+from benchmarks.common import prepare_workdir
+
+PASSWORD = "loadtest-password"
+
+
+def synthetic_jpeg(seed: int, size: int = 256) -> bytes:
+    """生成一张简单的合成人脸图片（相同种子结果相同）"""
+    rng = random.Random(seed)
+    skin = (rng.randint(180, 255), rng.randint(140, 210), rng.randint(110, 180))
+    image = Image.new("RGB", (size, size))
+    draw = ImageDraw.Draw(image)
+    # 随机色块背景，保证不同种子的图片不会被判定为相似图片
+    block = size // 8
+    for bx in range(8):
+        for by in range(8):
+            color = tuple(rng.randint(0, 255) for _ in range(3))
+            draw.rectangle([bx * block, by * block, (bx + 1) * block, (by + 1) * block], fill=color)
+
+    cx, cy = size / 2 + rng.uniform(-20, 20), size / 2 + rng.uniform(-20, 20)
+    rx, ry = size * rng.uniform(0.25, 0.32), size * rng.uniform(0.32, 0.4)
+    draw.ellipse([cx - rx, cy - ry, cx + rx, cy + ry], fill=skin)
+    eye_y = cy - ry * 0.2
+    for side in (-1, 1):
+        ex = cx + side * rx * 0.4
+        draw.ellipse([ex - 10, eye_y - 6, ex + 10, eye_y + 6], fill=(255, 255, 255))
+        draw.ellipse([ex - 4, eye_y - 4, ex + 4, eye_y + 4], fill=(40, 30, 20))
+    mouth_y = cy + ry * 0.45
+    draw.arc([cx - rx * 0.4, mouth_y - 12, cx + rx * 0.4, mouth_y + 12], 0, 180, fill=(160, 40, 40), width=4)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def seed_workdir(users: int, scores: int, images: int, seed: int = 42, password: str = PASSWORD) -> str:
+    """
+    创建压测用的临时工作目录（数据库 + uploads），并切换到该目录
+
+    用户名为 bench1..benchN，密码均为 password；前 images 条评分记录会写入真实图片文件，
+    使相似图片查找的开销与线上接近。
+    """
+    from core.security import get_password_hash
+
+    workdir = prepare_workdir(users=users, scores=scores, seed=seed, password_hash=get_password_hash(password))
+    for i in range(1, min(images, scores) + 1):
+        with open(os.path.join(workdir, "uploads", f"bench_{i}.jpg"), "wb") as f:
+            f.write(synthetic_jpeg(seed * 1000003 + i))
+    return workdir
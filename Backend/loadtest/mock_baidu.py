@@ -0,0 +1,133 @@
+"""
+模拟百度AI人脸检测服务
+
+实现 access_token 和 face/v3/detect 两个接口，返回结构与百度AI一致，可配置延迟和错误率：
+    python -m loadtest.mock_baidu --port 9100 --latency 0.15 --jitter 0.1 --error-rate 0.01
+
+API服务通过 BAIDU_AI_TOKEN_URL / BAIDU_AI_DETECT_URL 指向该服务。
+"""
+import os
+import sys
+import json
+import time
+import base64
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+# 添加后端根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.face_provider import synthetic_face_info
+
+TOKEN_PATH = "/oauth/2.0/token"
+DETECT_PATH = "/rest/2.0/face/v3/detect"
+
+
+class MockBaiduServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency: float, jitter: float, error_rate: float,
+                 qps_error_rate: float, no_face_rate: float, seed: int):
+        super().__init__(address, MockBaiduHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.qps_error_rate = qps_error_rate
+        self.no_face_rate = no_face_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def roll(self):
+        with self._lock:
+            self.requests += 1
+            return self._rng.random(), self.latency + self._rng.uniform(0, self.jitter)
+
+
+class MockBaiduHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        path = urlparse(self.path).path
+
+        if path == TOKEN_PATH:
+            self._reply(200, {"access_token": "mock-token", "expires_in": 2592000})
+            return
+        if path != DETECT_PATH:
+            self._reply(404, {"error_code": 404, "error_msg": "not found"})
+            return
+
+        server: MockBaiduServer = self.server
+        roll, delay = server.roll()
+        time.sleep(delay)
+
+        if roll < server.error_rate:
+            self._reply(500, {"error_code": 282000, "error_msg": "internal error"})
+            return
+        roll -= server.error_rate
+        if roll < server.qps_error_rate:
+            self._reply(200, {"error_code": 18, "error_msg": "Open api qps request limit reached"})
+            return
+        roll -= server.qps_error_rate
+        if roll < server.no_face_rate:
+            self._reply(200, {"error_code": 222202, "error_msg": "pic not has face"})
+            return
+
+        try:
+            image = base64.b64decode(json.loads(body)["image"])
+        except (ValueError, KeyError):
+            self._reply(200, {"error_code": 222203, "error_msg": "image check fail"})
+            return
+        face = synthetic_face_info(hashlib.md5(image).hexdigest())
+        self._reply(200, {
+            "error_code": 0,
+            "error_msg": "SUCCESS",
+            "log_id": server.requests,
+            "timestamp": int(time.time()),
+            "result": {"face_num": 1, "face_list": [face]},
+        })
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency", type=float, default=0.15, help="基础延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.1, help="随机抖动（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="HTTP 500 的比例")
+    parser.add_argument("--qps-error-rate", type=float, default=0.0, help="QPS超限错误（error_code=18）的比例")
+    parser.add_argument("--no-face-rate", type=float, default=0.0, help="未检测到人脸的比例")
+
+
+def serve(host: str, port: int, args, seed: int = 42) -> MockBaiduServer:
+    return MockBaiduServer(
+        (host, port), args.latency, args.jitter, args.error_rate, args.qps_error_rate, args.no_face_rate, seed
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="模拟百度AI人脸检测服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server = serve(args.host, args.port, args)
+    print(f"模拟百度AI服务: http://{args.host}:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,313 @@
+"""
+端到端压测
+
+在临时目录中生成数据库、启动模拟百度AI服务和API服务，按配置的流量比例模拟用户
+（登录、上传评分、排行榜、PK、历史记录），输出每个接口的吞吐量和 p50/p95/p99：
+    python -m loadtest.run --users 200 --scores 5000 --concurrency 50 --duration 60
+    python -m loadtest.run --mix rankings=10,upload=1 --detect-latency 0.3 --detect-error-rate 0.02
+    python -m loadtest.run --url http://staging:8000 --users 200   # 压测已部署的服务（需已用本工具的数据初始化）
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import sqlite3
+import asyncio
+import argparse
+import subprocess
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+# 添加后端根目录到Python路径
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+import httpx
+
+from benchmarks.common import summarize
+from loadtest import mock_baidu
+from loadtest.data import PASSWORD, seed_workdir, synthetic_jpeg
+
+API = "/api/v1"
+DEFAULT_MIX = "login=1,upload=2,rankings=10,pk=3,history=4"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for item in spec.split(","):
+        name, weight = item.split("=", 1)
+        if name.strip() not in ACTIONS:
+            raise SystemExit(f"未知的流量类型: {name}，可选: {', '.join(ACTIONS)}")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+class Recorder:
+    """按接口记录延迟和状态码"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.reconnects = 0
+        self.recording = False
+
+    async def request(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        for attempt in range(2):
+            try:
+                response = await client.request(method, url, **kwargs)
+                status = response.status_code
+                break
+            except (httpx.ReadError, httpx.WriteError, httpx.RemoteProtocolError) as e:
+                # 服务端在500错误后会关闭连接，复用该连接的下一个请求会失败，换一个连接重试一次
+                response, status = None, type(e).__name__
+                if attempt == 0 and self.recording:
+                    self.reconnects += 1
+            except httpx.HTTPError as e:
+                response, status = None, type(e).__name__
+                break
+        if self.recording:
+            self.latencies[name].append(time.perf_counter() - started)
+            self.statuses[name][status] += 1
+        return response
+
+    def report(self, elapsed: float) -> Dict:
+        endpoints = {}
+        for name in sorted(self.latencies):
+            statuses = self.statuses[name]
+            errors = sum(count for status, count in statuses.items() if not (isinstance(status, int) and status < 400))
+            endpoints[name] = dict(
+                summarize(self.latencies[name]),
+                rps=len(self.latencies[name]) / elapsed,
+                error_rate=errors / max(len(self.latencies[name]), 1),
+                statuses={str(status): count for status, count in statuses.items()},
+            )
+        total = sum(len(values) for values in self.latencies.values())
+        return {"elapsed_s": elapsed, "requests": total, "rps": total / elapsed, "reconnects": self.reconnects,
+                "endpoints": endpoints}
+
+
+class VirtualUser:
+    """一个模拟用户：先登录并上传一张照片，然后按流量比例循环发起请求"""
+
+    def __init__(self, user_id: int, ctx: "LoadContext"):
+        self.user_id = user_id
+        self.ctx = ctx
+        self.rng = random.Random(ctx.seed * 7919 + user_id)
+        self.headers: Dict[str, str] = {}
+        self.score_id: Optional[int] = None
+        # 每个用户使用自己的照片，重复上传时命中相似图片逻辑但不会拿到别人的评分记录
+        self.images = [synthetic_jpeg(ctx.seed * 1000003 + user_id * 97 + i) for i in range(ctx.images_per_user)]
+
+    async def login(self, client):
+        response = await self.ctx.recorder.request(
+            client, "POST /auth/login", "POST", f"{API}/auth/login",
+            data={"username": f"bench{self.user_id}", "password": PASSWORD},
+        )
+        if response is not None and response.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    async def upload(self, client):
+        image = self.rng.choice(self.images)
+        response = await self.ctx.recorder.request(
+            client, "POST /scores/", "POST", f"{API}/scores/", headers=self.headers,
+            files={"image": ("face.jpg", image, "image/jpeg")}, data={"is_public": "true"},
+        )
+        if response is not None and response.status_code == 201:
+            self.score_id = response.json()["score_id"]
+
+    async def rankings(self, client):
+        page = self.rng.randint(1, 5)
+        await self.ctx.recorder.request(
+            client, "GET /rankings/global", "GET", f"{API}/rankings/global",
+            params={"page": page, "limit": 20}, headers=self.headers,
+        )
+
+    async def pk(self, client):
+        if self.score_id is None:
+            await self.upload(client)
+            return
+        opponent_id = self.rng.choice(self.ctx.opponents)
+        if opponent_id == self.user_id:
+            return
+        await self.ctx.recorder.request(
+            client, "POST /matches/", "POST", f"{API}/matches/", headers=self.headers,
+            json={"opponent_id": opponent_id, "score_id": self.score_id},
+        )
+
+    async def history(self, client):
+        if self.rng.random() < 0.5:
+            await self.ctx.recorder.request(
+                client, "GET /matches/user/{id}", "GET", f"{API}/matches/user/{self.user_id}",
+                params={"page": 1, "limit": 10}, headers=self.headers,
+            )
+        else:
+            await self.ctx.recorder.request(
+                client, "GET /scores/", "GET", f"{API}/scores/", params={"page": 1, "limit": 10}, headers=self.headers,
+            )
+
+    async def run(self, client, deadline: float) -> None:
+        await self.login(client)
+        await self.upload(client)
+        names = list(self.ctx.mix)
+        weights = list(self.ctx.mix.values())
+        while time.monotonic() < deadline:
+            action = self.rng.choices(names, weights)[0]
+            await ACTIONS[action](self, client)
+            if self.ctx.think_time:
+                await asyncio.sleep(self.rng.expovariate(1 / self.ctx.think_time))
+
+
+ACTIONS = {
+    "login": VirtualUser.login,
+    "upload": VirtualUser.upload,
+    "rankings": VirtualUser.rankings,
+    "pk": VirtualUser.pk,
+    "history": VirtualUser.history,
+}
+
+
+class LoadContext:
+    def __init__(self, args, opponents: List[int]):
+        self.seed = args.seed
+        self.mix = parse_mix(args.mix)
+        self.think_time = args.think_time
+        self.opponents = opponents
+        self.images_per_user = args.images_per_user
+        self.recorder = Recorder()
+
+
+async def drive(base_url: str, ctx: LoadContext, args) -> Dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(args.request_timeout)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        vus = [VirtualUser(i % args.users + 1, ctx) for i in range(args.concurrency)]
+        # 预热阶段不计入结果
+        ctx.recorder.recording = False
+        warmup_deadline = time.monotonic() + args.warmup
+        await asyncio.gather(*(vu.run(client, warmup_deadline) for vu in vus))
+
+        ctx.recorder.recording = True
+        started = time.monotonic()
+        await asyncio.gather(*(vu.run(client, started + args.duration) for vu in vus))
+        return ctx.recorder.report(time.monotonic() - started)
+
+
+def wait_until_ready(url: str, process: Optional[subprocess.Popen], timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise SystemExit(f"进程已退出: {process.args}")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise SystemExit(f"等待服务启动超时: {url}")
+
+
+def print_report(result: Dict) -> None:
+    print(f"\n耗时 {result['elapsed_s']:.1f}秒  请求 {result['requests']}  吞吐量 {result['rps']:.1f} 次/秒  "
+          f"断线重试 {result['reconnects']}")
+    print(f"{'接口':<26}{'次数':>7}{'次/秒':>9}{'错误率':>8}{'p50':>10}{'p95':>10}{'p99':>10}  状态码")
+    for name, stats in result["endpoints"].items():
+        print(
+            f"{name:<26}{stats['count']:>7}{stats['rps']:>9.1f}{stats['error_rate']:>8.1%}"
+            f"{stats['p50_ms']:>8.1f}ms{stats['p95_ms']:>8.1f}ms{stats['p99_ms']:>8.1f}ms  {stats['statuses']}"
+        )
+
+
+def main(args) -> None:
+    processes: List[subprocess.Popen] = []
+    try:
+        if args.url:
+            base_url = args.url.rstrip("/")
+            opponents = list(range(1, args.users + 1))
+        else:
+            workdir = seed_workdir(args.users, args.scores, args.images, seed=args.seed)
+            with sqlite3.connect(os.path.join(workdir, "face_score_pk.db")) as conn:
+                opponents = [row[0] for row in conn.execute("SELECT DISTINCT user_id FROM scores WHERE is_public = 1")]
+            print(f"测试数据: {workdir} (用户 {args.users}, 评分 {args.scores}, 图片 {args.images})")
+
+            mock_port = free_port()
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "loadtest.mock_baidu", "--port", str(mock_port),
+                 "--latency", str(args.detect_latency), "--jitter", str(args.detect_jitter),
+                 "--error-rate", str(args.detect_error_rate), "--qps-error-rate", str(args.detect_qps_error_rate),
+                 "--no-face-rate", str(args.detect_no_face_rate)],
+                cwd=BACKEND_DIR, stdout=subprocess.DEVNULL,
+            ))
+            wait_until_ready(f"http://127.0.0.1:{mock_port}/", processes[-1])
+
+            port = free_port()
+            env = dict(
+                os.environ,
+                BAIDU_AI_API_KEY="loadtest", BAIDU_AI_SECRET_KEY="loadtest",
+                BAIDU_AI_TOKEN_URL=f"http://127.0.0.1:{mock_port}{mock_baidu.TOKEN_PATH}",
+                BAIDU_AI_DETECT_URL=f"http://127.0.0.1:{mock_port}{mock_baidu.DETECT_PATH}",
+                FACE_DETECT_PROVIDER="baidu",
+                FACE_DETECT_QPS=str(args.detect_qps),
+                FACE_DETECT_BURST=str(args.detect_qps),
+                FACE_DETECT_RATE_LIMIT_BACKEND="local",
+                LOG_LEVEL=args.app_log_level,
+                SLOW_REQUEST_MS=os.environ.get("SLOW_REQUEST_MS", "0"),
+            )
+            processes.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND_DIR,
+                 "--host", "127.0.0.1", "--port", str(port), "--workers", str(args.workers),
+                 "--log-level", "warning", "--no-access-log", "--timeout-keep-alive", "120"],
+                cwd=workdir, env=env,
+            ))
+            base_url = f"http://127.0.0.1:{port}"
+            wait_until_ready(f"{base_url}/metrics", processes[-1])
+
+        ctx = LoadContext(args, opponents)
+        print(f"目标: {base_url}  并发: {args.concurrency}  时长: {args.duration}秒  流量比例: {args.mix}")
+        result = asyncio.run(drive(base_url, ctx, args))
+        result["config"] = {key: value for key, value in vars(args).items()}
+        print_report(result)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            print(f"结果已写入 {args.output}")
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="端到端压测")
+    parser.add_argument("--url", help="压测已运行的服务，不再启动本地服务")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--scores", type=int, default=2000)
+    parser.add_argument("--images", type=int, default=200, help="写入真实图片文件的评分记录数")
+    parser.add_argument("--images-per-user", type=int, default=2, help="每个模拟用户轮流上传的图片数量")
+    parser.add_argument("--workers", type=int, default=1, help="API服务进程数")
+    parser.add_argument("--concurrency", type=int, default=20, help="并发用户数")
+    parser.add_argument("--duration", type=float, default=30, help="压测时长（秒）")
+    parser.add_argument("--warmup", type=float, default=5, help="预热时长（秒），不计入结果")
+    parser.add_argument("--think-time", type=float, default=0.0, help="用户两次请求之间的平均间隔（秒）")
+    parser.add_argument("--request-timeout", type=float, default=30.0)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"流量比例，默认 {DEFAULT_MIX}")
+    parser.add_argument("--detect-latency", type=float, default=0.15, help="模拟人脸检测的基础延迟（秒）")
+    parser.add_argument("--detect-jitter", type=float, default=0.1)
+    parser.add_argument("--detect-error-rate", type=float, default=0.0)
+    parser.add_argument("--detect-qps-error-rate", type=float, default=0.0)
+    parser.add_argument("--detect-no-face-rate", type=float, default=0.0)
+    parser.add_argument("--detect-qps", type=float, default=1000, help="API服务的人脸检测配额（QPS）")
+    parser.add_argument("--app-log-level", default="WARNING", help="API服务的日志级别")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="将结果写入JSON文件")
+    main(parser.parse_args())
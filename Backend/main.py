@@ -1,19 +1,28 @@
 import os
 import sys
+import asyncio
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, Response
 from fastapi.staticfiles import StaticFiles
 
 # 添加当前目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # 使用普通导入
-from config.settings import PROJECT_NAME, VERSION, API_V1_STR, BACKEND_CORS_ORIGINS
-from config.logging_config import setup_logging
+from config.settings import (
+    PROJECT_NAME, VERSION, API_V1_STR, BACKEND_CORS_ORIGINS, REQUEST_TRACING, AUTO_MIGRATE, RANK_REFRESH_INTERVAL,
+    LEADERBOARD_RELOAD_SECONDS,
+)
+from config.logging_config import setup_logging, stop_logging
+from core.metrics import CONTENT_TYPE, render_metrics
+from core.tracing import RequestTracingMiddleware
+from core.profiling import ProfilerMiddleware, profiler_enabled
+from core.http_cache import FastJSONResponse
+from core.encoding import EncodingMiddleware
 # 导入API路由模块
-from api.v1 import auth, scores, rankings, matches
+from api.v1 import auth, scores, rankings, matches, users, friends
 
 # 设置日志
 logger = setup_logging()
@@ -22,7 +31,8 @@ logger = setup_logging()
 app = FastAPI(
     title=PROJECT_NAME,
     version=VERSION,
-    description="魔镜Mirror颜值PK平台API"
+    description="魔镜Mirror颜值PK平台API",
+    default_response_class=FastJSONResponse
 )
 
 # 设置CORS
@@ -35,6 +45,17 @@ if BACKEND_CORS_ORIGINS:
         allow_headers=["*"],
     )
 
+# 请求追踪（SQL数量、数据库耗时写入响应头）
+if REQUEST_TRACING:
+    app.add_middleware(RequestTracingMiddleware)
+
+# 请求剖析（只在配置了 PROFILER_TOKEN 或 PROFILER_SAMPLE_RATE 时安装）
+if profiler_enabled():
+    app.add_middleware(ProfilerMiddleware, path_prefix=API_V1_STR)
+
+# 响应压缩和 MessagePack 协商（最外层，压缩的是最终的响应体）
+app.add_middleware(EncodingMiddleware)
+
 # 添加静态文件目录，用于上传的图片
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
@@ -43,21 +64,43 @@ app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 async def root():
     return RedirectResponse(url="/docs")
 
+# 监控指标（Prometheus文本格式），只在被抓取时汇总
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
+
 # 包含API路由 - 暂时注释掉，等创建好相应文件后再取消注释
 app.include_router(auth.router, prefix=API_V1_STR)
 app.include_router(scores.router, prefix=API_V1_STR)
 app.include_router(rankings.router, prefix=API_V1_STR)
 app.include_router(matches.router, prefix=API_V1_STR)
+app.include_router(users.router, prefix=API_V1_STR)
+app.include_router(friends.router, prefix=API_V1_STR)
 
 # 启动事件
 @app.on_event("startup")
 async def startup_event():
     logger.info(f"Starting {PROJECT_NAME} v{VERSION}")
+    if AUTO_MIGRATE:
+        from config.database import engine
+        from migrate_db import run_migrations
+        run_migrations(engine)
+    # 提前创建检测限流器，配额配置有误时启动即失败
+    from services.face_provider import get_detect_rate_limiter
+    get_detect_rate_limiter()
+    if RANK_REFRESH_INTERVAL > 0 or LEADERBOARD_RELOAD_SECONDS > 0:
+        from services.leaderboard import rank_refresh_loop
+        app.state.rank_refresh_task = asyncio.create_task(
+            rank_refresh_loop(RANK_REFRESH_INTERVAL, LEADERBOARD_RELOAD_SECONDS))
 
 # 关闭事件
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info(f"Shutting down {PROJECT_NAME}")
+    rank_refresh_task = getattr(app.state, "rank_refresh_task", None)
+    if rank_refresh_task is not None:
+        rank_refresh_task.cancel()
+    stop_logging()
 
 # 直接运行
 if __name__ == "__main__":
@@ -0,0 +1,215 @@
+"""
+数据库结构迁移
+
+create_all 只会创建缺失的表，已有表新增列、转换数据需要在这里登记迁移步骤。
+每个步骤只执行一次（记录在 schema_migrations 表中），步骤本身也可以重复执行：
+    python migrate_db.py                 # 执行所有未执行的迁移
+    python migrate_db.py --list          # 查看迁移状态
+    python migrate_db.py --vacuum        # 迁移后整理SQLite数据库文件，回收空间
+服务启动时默认自动执行（AUTO_MIGRATE=false 可关闭）。
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, bindparam, create_engine, inspect, select
+
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config.settings import DATABASE_URL
+from db.base import Base
+import db.models_import  # noqa: F401  注册所有模型
+from models.friend import UserFriend
+from models.match import Match
+from models.user import User
+from models.score import Score
+from models.stats import UserStats
+from core.face_features import is_legacy_feature_data, split_face_info
+
+logger = logging.getLogger(__name__)
+
+# 迁移记录表不属于业务模型，不放进 Base.metadata
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _metadata,
+    Column("name", String(100), primary_key=True),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+MIGRATIONS: List[Tuple[str, Callable]] = []
+
+BATCH_SIZE = 5000
+
+
+def migration(name: str) -> Callable:
+    """装饰器：按定义顺序登记迁移步骤"""
+    def decorator(func: Callable) -> Callable:
+        MIGRATIONS.append((name, func))
+        return func
+    return decorator
+
+
+def add_missing_columns(conn, table: Table, names: List[str]) -> List[str]:
+    """按模型定义为已有表补充缺失的列，返回实际新增的列名"""
+    existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+    added = []
+    for name in names:
+        if name in existing:
+            continue
+        column = table.c[name]
+        column_type = column.type.compile(dialect=conn.dialect)
+        conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {name} {column_type}")
+        added.append(name)
+    if added:
+        logger.info(f"{table.name} 表新增列: {', '.join(added)}")
+    return added
+
+
+@migration("0001_score_face_columns")
+def score_face_columns(conn) -> None:
+    """将 feature_data 中的常用字段拆分为独立列，关键点打包为二进制"""
+    table = Score.__table__
+    columns = ["beauty", "age", "gender", "face_shape", "expression", "landmarks"]
+    add_missing_columns(conn, table, columns)
+
+    update = table.update().where(table.c.score_id == bindparam("_score_id")).values(
+        {name: bindparam(name) for name in columns + ["feature_data"]}
+    )
+    last_id = 0
+    converted = 0
+    while True:
+        rows = conn.execute(
+            select(table.c.score_id, table.c.feature_data)
+            .where(table.c.score_id > last_id, table.c.feature_data.isnot(None))
+            .order_by(table.c.score_id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].score_id
+        params = [
+            dict(split_face_info(row.feature_data), _score_id=row.score_id)
+            for row in rows if is_legacy_feature_data(row.feature_data)
+        ]
+        if params:
+            conn.execute(update, params)
+            converted += len(params)
+    logger.info(f"已转换 {converted} 条评分记录的特征数据")
+
+
+@migration("0002_user_stats_aggregates")
+def user_stats_aggregates(conn) -> None:
+    """user_stats 改为增量维护，补充评分数列并按已有数据重算一次"""
+    from services.stats import StatsService
+
+    add_missing_columns(conn, UserStats.__table__, ["scores_total"])
+    StatsService(conn).rebuild()
+
+
+@migration("0003_score_user_best_index")
+def score_user_best_index(conn) -> None:
+    """按用户取公开评分最高分的索引"""
+    for index in Score.__table__.indexes:
+        if index.name == "ix_scores_user_public_score":
+            index.create(bind=conn, checkfirst=True)
+
+
+@migration("0004_score_scored_at_index")
+def score_scored_at_index(conn) -> None:
+    """按评分时间加载公开评分的索引"""
+    for index in Score.__table__.indexes:
+        if index.name == "ix_scores_public_scored_at":
+            index.create(bind=conn, checkfirst=True)
+
+
+@migration("0005_user_friends_indexes")
+def user_friends_indexes(conn) -> None:
+    """按用户查询好友关系的索引"""
+    for index in UserFriend.__table__.indexes:
+        index.create(bind=conn, checkfirst=True)
+
+
+@migration("0006_matches_user_indexes")
+def matches_user_indexes(conn) -> None:
+    """按用户查询对战记录的索引"""
+    for index in Match.__table__.indexes:
+        index.create(bind=conn, checkfirst=True)
+
+
+@migration("0007_users_elo_rating_index")
+def users_elo_rating_index(conn) -> None:
+    """按Elo分数查询用户的索引"""
+    for index in User.__table__.indexes:
+        if index.name == "ix_users_elo_rating":
+            index.create(bind=conn, checkfirst=True)
+
+
+@migration("0008_matches_challenger_rating")
+def matches_challenger_rating(conn) -> None:
+    """对战记录保存对战后挑战者的Elo分数，已有记录保持为空"""
+    add_missing_columns(conn, Match.__table__, ["challenger_rating"])
+
+
+def applied_migrations(conn) -> set:
+    _metadata.create_all(bind=conn)
+    return set(conn.execute(select(schema_migrations.c.name)).scalars())
+
+
+def run_migrations(engine=None) -> List[str]:
+    """执行所有未执行的迁移，每个步骤一个事务，返回本次执行的迁移名称"""
+    engine = engine or create_engine(DATABASE_URL)
+    executed = []
+    with engine.begin() as conn:
+        # 新数据库直接按当前模型建表，迁移步骤只需登记
+        Base.metadata.create_all(bind=conn)
+        done = applied_migrations(conn)
+    for name, func in MIGRATIONS:
+        if name in done:
+            continue
+        started = time.perf_counter()
+        logger.info(f"执行迁移 {name}...")
+        with engine.begin() as conn:
+            func(conn)
+            conn.execute(schema_migrations.insert().values(name=name, applied_at=datetime.utcnow()))
+        logger.info(f"迁移 {name} 完成，耗时 {time.perf_counter() - started:.1f}秒")
+        executed.append(name)
+    if executed:
+        # 迁移可能改写了榜单依赖的数据
+        from services.leaderboard import invalidate_boards
+        invalidate_boards()
+    return executed
+
+
+def vacuum(engine) -> None:
+    """SQLite 删改大量数据后文件不会自动缩小，需要 VACUUM 回收空间"""
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("VACUUM")
+        conn.exec_driver_sql("ANALYZE")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="数据库结构迁移")
+    parser.add_argument("--database", default=DATABASE_URL, help="数据库URL，默认为当前配置的数据库")
+    parser.add_argument("--list", action="store_true", help="只列出迁移状态")
+    parser.add_argument("--vacuum", action="store_true", help="迁移完成后整理SQLite数据库文件")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database)
+    if args.list:
+        with engine.begin() as conn:
+            done = applied_migrations(conn)
+        for name, _ in MIGRATIONS:
+            print(f"{'[x]' if name in done else '[ ]'} {name}")
+    else:
+        executed = run_migrations(engine)
+        logger.info(f"本次执行 {len(executed)} 个迁移" if executed else "没有需要执行的迁移")
+        if args.vacuum:
+            vacuum(engine)
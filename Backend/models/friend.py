@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Index
 from sqlalchemy.sql import func
 import enum
 
@@ -11,6 +11,11 @@ class FriendStatus(str, enum.Enum):
 
 class UserFriend(Base):
     __tablename__ = "user_friends"
+    __table_args__ = (
+        # 按用户取好友集合（关系的两个方向）
+        Index("ix_user_friends_user_status", "user_id", "status"),
+        Index("ix_user_friends_friend_status", "friend_id", "status"),
+    )
 
     relation_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, Index
 from sqlalchemy.sql import func
 import enum
 
@@ -11,6 +11,11 @@ class MatchResult(str, enum.Enum):
 
 class Match(Base):
     __tablename__ = "matches"
+    __table_args__ = (
+        # 按用户查询对战历史、最近的对手
+        Index("ix_matches_challenger_matched_at", "challenger_id", "matched_at"),
+        Index("ix_matches_opponent_matched_at", "opponent_id", "matched_at"),
+    )
 
     match_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     challenger_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
@@ -21,4 +26,6 @@ class Match(Base):
     opponent_score = Column(Float, nullable=False)
     result = Column(Enum(MatchResult), nullable=False)
     points_changed = Column(Integer, nullable=False)
+    # 对战后挑战者的Elo分数（对战详情中的 new_rating），早期记录为空
+    challenger_rating = Column(Integer, nullable=True)
     matched_at = Column(DateTime, default=func.now()) 
\ No newline at end of file
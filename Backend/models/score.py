@@ -1,8 +1,10 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, JSON, Enum
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, JSON, Enum, LargeBinary, Index
+from sqlalchemy.orm import deferred
+from datetime import datetime
 import enum
 
 from db.base import Base
+from core.face_features import split_face_info, merge_face_info
 
 class ServiceType(str, enum.Enum):
     BAIDU = "baidu"
@@ -10,13 +12,41 @@ class ServiceType(str, enum.Enum):
 
 class Score(Base):
     __tablename__ = "scores"
+    __table_args__ = (
+        # 按用户取公开评分的最高分（排行榜、用户统计）
+        Index("ix_scores_user_public_score", "user_id", "is_public", "face_score"),
+        # 日榜/周榜/月榜按评分时间加载最近的公开评分
+        Index("ix_scores_public_scored_at", "is_public", "scored_at"),
+    )
 
     score_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.user_id"), nullable=False)
     image_url = Column(String(255), nullable=False)
     image_hash = Column(String(64), nullable=True)
     face_score = Column(Float, nullable=False)
-    feature_data = Column(JSON, nullable=True)
-    scored_at = Column(DateTime, default=func.now())
+    # 由应用按 UTC 写入（不用数据库的 CURRENT_TIMESTAMP，MySQL 中它是服务器本地时间），按天分桶的榜单依赖这一点
+    scored_at = Column(DateTime, default=datetime.utcnow)
     is_public = Column(Boolean, default=True)
-    service_type = Column(Enum(ServiceType), default=ServiceType.BAIDU) 
\ No newline at end of file
+    service_type = Column(Enum(ServiceType), default=ServiceType.BAIDU)
+
+    # 人脸特征常用字段，列表、PK等查询直接读取
+    beauty = Column(Float, nullable=True)
+    age = Column(Integer, nullable=True)
+    gender = Column(String(10), nullable=True)
+    face_shape = Column(String(20), nullable=True)
+    expression = Column(String(20), nullable=True)
+    # 关键点（float32打包）和其余特征字段，只有查看评分详情时才加载
+    landmarks = deferred(Column(LargeBinary, nullable=True), group="face_detail")
+    feature_data = deferred(Column(JSON, nullable=True), group="face_detail")
+
+    def set_face_info(self, face_info):
+        """保存百度AI返回的完整特征数据，拆分到各列"""
+        for key, value in split_face_info(face_info).items():
+            setattr(self, key, value)
+
+    @property
+    def face_info(self):
+        """按百度AI返回的结构拼回完整特征数据（会触发延迟加载）"""
+        return merge_face_info(self.beauty, self.age, self.gender, self.face_shape,
+                               self.expression, self.landmarks, self.feature_data)
+ 
\ No newline at end of file
@@ -8,6 +8,7 @@ class UserStats(Base):
 
     stat_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.user_id"), unique=True, nullable=False)
+    scores_total = Column(Integer, default=0)
     matches_total = Column(Integer, default=0)
     matches_won = Column(Integer, default=0)
     matches_lost = Column(Integer, default=0)
@@ -14,7 +14,7 @@ class User(Base):
     avatar_url = Column(String(255), nullable=True)
     bio = Column(String(500), nullable=True)
     phone_number = Column(String(20), nullable=True)
-    elo_rating = Column(Integer, default=1500)
+    elo_rating = Column(Integer, default=1500, index=True)
     created_at = Column(DateTime, default=func.now())
     last_login = Column(DateTime, nullable=True)
     is_active = Column(Boolean, default=True)
@@ -0,0 +1,48 @@
+"""
+按 scores/matches 重算用户统计（user_stats）
+
+统计在评分和PK时增量维护，这个脚本用于初始化历史数据或修复偏差：
+    python rebuild_stats.py                  # 重算所有用户并更新全站/地区排名
+    python rebuild_stats.py --user 3 --user 7
+    python rebuild_stats.py --ranks-only     # 只重算排名（可由定时任务执行）
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine
+
+from config.settings import DATABASE_URL
+import db.models_import  # noqa: F401  注册所有模型
+from services.leaderboard import invalidate_boards
+from services.stats import StatsService
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+
+def main(args) -> None:
+    engine = create_engine(args.database)
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        service = StatsService(conn)
+        if args.ranks_only:
+            count = service.update_ranks()
+            logger.info(f"已更新 {count} 个用户的全站排名和地区排名")
+        else:
+            service.rebuild(args.user or None)
+    invalidate_boards()
+    logger.info(f"完成，耗时 {time.perf_counter() - started:.1f}秒")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="重算用户统计")
+    parser.add_argument("--database", default=DATABASE_URL, help="数据库URL，默认为当前配置的数据库")
+    parser.add_argument("--user", type=int, action="append", help="只重算指定用户，可重复")
+    parser.add_argument("--ranks-only", action="store_true", help="只重算排名")
+    main(parser.parse_args())
@@ -0,0 +1,25 @@
+from typing import List, Optional
+from pydantic import BaseModel
+from datetime import datetime
+
+# 好友申请
+class FriendRequestCreate(BaseModel):
+    friend_id: int
+
+# 好友信息
+class FriendUser(BaseModel):
+    user_id: int
+    username: str
+    nickname: Optional[str] = None
+    avatar_url: Optional[str] = None
+    since: Optional[datetime] = None
+
+# 好友列表
+class FriendList(BaseModel):
+    total: int
+    data: List[FriendUser]
+
+# 好友操作结果
+class FriendActionResponse(BaseModel):
+    success: bool = True
+    status: Optional[str] = None
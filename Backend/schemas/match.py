@@ -7,6 +7,24 @@ class MatchCreate(BaseModel):
     opponent_id: int
     score_id: int
 
+# 自动匹配请求
+class AutoMatchCreate(BaseModel):
+    score_id: int
+
+# 推荐的对手
+class MatchSuggestion(BaseModel):
+    user_id: int
+    username: str
+    nickname: Optional[str] = None
+    avatar_url: Optional[str] = None
+    elo_rating: int
+    rating_diff: int
+
+# 推荐对手列表
+class MatchSuggestionList(BaseModel):
+    elo_rating: int
+    data: List[MatchSuggestion]
+
 # 用户信息简略
 class UserBrief(BaseModel):
     user_id: int
@@ -39,6 +57,27 @@ class MatchBrief(BaseModel):
     points_change: int
     matched_at: datetime
 
+# 对战历史中的用户信息（用户视角）
+class MatchHistoryUser(UserBrief):
+    score: float
+    beauty: Optional[float] = None
+
+# 对战历史记录（字段可通过 fields 参数选择）
+class MatchHistoryItem(BaseModel):
+    match_id: Optional[int] = None
+    challenger: Optional[MatchHistoryUser] = None
+    opponent: Optional[MatchHistoryUser] = None
+    result: Optional[str] = None
+    points_change: Optional[int] = None
+    matched_at: Optional[datetime] = None
+
+# 对战历史分页
+class MatchHistoryPagination(BaseModel):
+    total: int
+    page: int
+    limit: int
+    data: List[MatchHistoryItem]
+
 # 对战分页
 class MatchPagination(BaseModel):
     total: int
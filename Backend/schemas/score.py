@@ -16,12 +16,15 @@ class ScoreResponse(BaseModel):
     """评分结果响应模型"""
     success: bool
     score_id: Optional[int] = None
+    user_id: Optional[int] = None
     face_score: Optional[float] = None
     image_url: Optional[str] = None
     feature_highlights: Optional[Dict[str, Any]] = None
     score_details: Optional[List[ScoreDetail]] = None
+    feature_data: Optional[Dict[str, Any]] = None
     created_at: Optional[str] = None
     is_public: Optional[bool] = None
+    service_type: Optional[str] = None
     error: Optional[str] = None
     
     class Config:
@@ -0,0 +1,18 @@
+from typing import Optional
+from pydantic import BaseModel
+from datetime import datetime
+
+# 用户统计
+class UserStatsResponse(BaseModel):
+    user_id: int
+    scores_total: int = 0
+    avg_score: float = 0.0
+    highest_score: float = 0.0
+    matches_total: int = 0
+    matches_won: int = 0
+    matches_lost: int = 0
+    matches_tied: int = 0
+    win_rate: float = 0.0
+    rank_global: Optional[int] = None
+    rank_regional: Optional[int] = None
+    last_updated: Optional[datetime] = None
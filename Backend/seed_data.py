@@ -0,0 +1,284 @@
+"""
+批量生成压测/开发用数据（用户、评分记录、PK对战）
+
+相同的种子和参数生成完全相同的数据，可用于复现线上规模的性能问题：
+    python seed_data.py --reset --users 100000 --scores 1000000 --matches 500000
+    python seed_data.py --database sqlite:///./big.db --reset --scores 5000000 --seed 7
+
+- 所有用户的密码均为 --password（只计算一次哈希）
+- 人脸特征数据按百度AI返回结构生成并拆分存储（见 core/face_features.py），关键点从预先打包的池中选取，beauty 与 face_score 一致
+- 按批 executemany 写入，整个过程在一个事务内完成；--reset 时先建表、导入后再建索引，最后重算用户统计
+- 时间戳相对 --end-date（默认固定日期，保证结果可复现）分布
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+from datetime import datetime, timedelta
+from typing import Iterator, List, Sequence, Tuple
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.schema import CreateTable
+
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config.settings import DATABASE_URL
+from db.base import Base
+import db.models_import  # noqa: F401  注册所有模型
+from models.user import User
+from models.score import Score
+from models.match import Match, MatchResult
+from core.face_features import pack_landmarks
+from services.leaderboard import invalidate_boards
+from services.stats import StatsService
+
+# 设置日志
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+NICKNAME_PREFIXES = ["快乐", "阳光", "星空", "清风", "微笑", "月光", "小鹿", "橘子", "海盐", "森林", "奶茶", "云朵"]
+NICKNAME_SUFFIXES = ["少年", "女孩", "同学", "先生", "小姐", "达人", "旅人", "画家", "猫", "熊", "鱼", "侠"]
+# 省级行政区划代码
+REGION_CODES = ["11", "12", "31", "32", "33", "35", "37", "42", "44", "50", "51", "61"]
+REGION_WEIGHTS = [10, 3, 12, 9, 8, 4, 7, 5, 14, 4, 6, 3]
+
+EXPRESSIONS = ["none", "smile", "laugh"]
+GENDERS = ["male", "female"]
+FACE_SHAPES = ["square", "triangle", "oval", "heart", "round"]
+
+# 拆分出独立列之后 feature_data 中剩余的字段
+FEATURE_TEMPLATE = (
+    '{"face_token": "%032x", "location": %s, "face_probability": 1, "angle": %s, '
+    '"expression": {"probability": 1}, "gender": {"probability": 1}, "face_shape": {"probability": %s}}'
+)
+
+
+def _batches(rows: Iterator[tuple], size: int) -> Iterator[List[tuple]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class FaceFeaturePool:
+    """预先序列化的人脸位置/角度片段和打包好的关键点，按行拼接成各列的值"""
+
+    def __init__(self, rng: random.Random, size: int = 512):
+        self.parts = []
+        for _ in range(size):
+            left, top, width = rng.uniform(50, 300), rng.uniform(50, 300), rng.uniform(120, 240)
+            landmark72 = [
+                {"x": round(left + rng.uniform(0, width), 2), "y": round(top + rng.uniform(0, width), 2)}
+                for _ in range(72)
+            ]
+            self.parts.append((
+                json.dumps({"left": round(left, 2), "top": round(top, 2), "width": round(width),
+                            "height": round(width), "rotation": rng.randint(-20, 20)}),
+                json.dumps({"yaw": round(rng.uniform(-30, 30), 2), "pitch": round(rng.uniform(-20, 20), 2),
+                            "roll": round(rng.uniform(-20, 20), 2)}),
+                pack_landmarks({"landmark": landmark72[:4], "landmark72": landmark72}),
+            ))
+
+    def build(self, rng: random.Random, beauty: float) -> tuple:
+        """返回 beauty, age, gender, face_shape, expression, landmarks, feature_data 各列的值"""
+        location, angle, landmarks = rng.choice(self.parts)
+        feature_data = FEATURE_TEMPLATE % (rng.getrandbits(128), location, angle, round(rng.uniform(0.5, 1), 2))
+        return (
+            beauty, rng.randint(16, 60), rng.choice(GENDERS), rng.choice(FACE_SHAPES), rng.choice(EXPRESSIONS),
+            landmarks, feature_data,
+        )
+
+
+class Seeder:
+    def __init__(self, conn, args):
+        self.conn = conn
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.end = datetime.strptime(args.end_date, "%Y-%m-%d")
+        self.start = self.end - timedelta(days=args.days)
+        self.span = (self.end - self.start).total_seconds()
+        self.paramstyle = conn.dialect.paramstyle
+
+    def _random_time(self) -> datetime:
+        return self.start + timedelta(seconds=self.rng.random() * self.span)
+
+    def _insert(self, table, columns: Sequence[str], rows: Iterator[tuple]) -> int:
+        """按批 executemany 写入，绕过ORM和列类型处理（JSON列传入预先序列化的字符串）"""
+        marker = "?" if self.paramstyle == "qmark" else "%s"
+        sql = f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join([marker] * len(columns))})"
+        total = 0
+        for batch in _batches(rows, self.args.batch_size):
+            self.conn.exec_driver_sql(sql, batch)
+            total += len(batch)
+        return total
+
+    def _next_id(self, column) -> int:
+        return (self.conn.execute(select(func.max(column))).scalar() or 0) + 1
+
+    def seed_users(self) -> Tuple[int, int]:
+        from core.security import get_password_hash
+
+        first_id = self._next_id(User.user_id)
+        password_hash = get_password_hash(self.args.password)
+        rng = self.rng
+        created_start = self.start - timedelta(days=30)
+
+        def rows():
+            for user_id in range(first_id, first_id + self.args.users):
+                created_at = created_start + timedelta(seconds=rng.random() * self.span)
+                last_login = created_at + timedelta(seconds=rng.random() * (self.end - created_at).total_seconds())
+                yield (
+                    user_id, f"user{user_id:07d}", f"user{user_id:07d}@example.com", password_hash,
+                    rng.choice(NICKNAME_PREFIXES) + rng.choice(NICKNAME_SUFFIXES), None,
+                    int(max(0, rng.gauss(1500, 200))), created_at, last_login, True,
+                    rng.choices(REGION_CODES, REGION_WEIGHTS)[0],
+                )
+
+        count = self._insert(User.__table__, [
+            "user_id", "username", "email", "password_hash", "nickname", "avatar_url",
+            "elo_rating", "created_at", "last_login", "is_active", "region_code",
+        ], rows())
+        return first_id, count
+
+    def seed_scores(self, user_ids: range) -> Tuple[List[int], List[int], List[float]]:
+        """生成评分记录，返回每条记录的 user_id 和 face_score（供生成对战使用）"""
+        rng = self.rng
+        pool = FaceFeaturePool(rng)
+        first_id = self._next_id(Score.score_id)
+        # 少数活跃用户贡献大部分评分记录
+        cum_weights = []
+        total = 0.0
+        for rank in range(1, len(user_ids) + 1):
+            total += 1.0 / rank ** 0.8
+            cum_weights.append(total)
+        owners = [user_ids[i] for i in range(len(user_ids))]
+        rng.shuffle(owners)
+        score_users = rng.choices(owners, cum_weights=cum_weights, k=self.args.scores)
+        face_scores = [round(min(99.5, max(10.0, rng.gauss(62, 14))), 2) for _ in range(self.args.scores)]
+        with_features = self.args.features
+
+        def rows():
+            for i in range(self.args.scores):
+                score_id = first_id + i
+                user_id = score_users[i]
+                beauty = face_scores[i]
+                features = pool.build(rng, beauty) if with_features else (None,) * 7
+                yield (
+                    score_id, user_id, f"/uploads/{user_id}_{score_id:08x}.jpg", f"{rng.getrandbits(128):032x}",
+                    beauty, self._random_time(), rng.random() < 0.9, "BAIDU",
+                ) + features
+
+        self._insert(Score.__table__, [
+            "score_id", "user_id", "image_url", "image_hash", "face_score",
+            "scored_at", "is_public", "service_type",
+            "beauty", "age", "gender", "face_shape", "expression", "landmarks", "feature_data",
+        ], rows())
+        return [first_id + i for i in range(self.args.scores)], score_users, face_scores
+
+    def seed_matches(self, score_ids: List[int], score_users: List[int], face_scores: List[float]) -> int:
+        rng = self.rng
+        n = len(score_ids)
+
+        def rows():
+            produced = 0
+            while produced < self.args.matches:
+                a, b = rng.randrange(n), rng.randrange(n)
+                if score_users[a] == score_users[b]:
+                    continue
+                produced += 1
+                if face_scores[a] == face_scores[b]:
+                    result, points = MatchResult.TIE, 3
+                elif face_scores[a] > face_scores[b]:
+                    result, points = MatchResult.WIN, 15
+                else:
+                    result, points = MatchResult.LOSE, -10
+                yield (
+                    score_users[a], score_users[b], score_ids[a], score_ids[b],
+                    face_scores[a], face_scores[b], result.name, points, self._random_time(),
+                )
+
+        return self._insert(Match.__table__, [
+            "challenger_id", "opponent_id", "challenger_score_id", "opponent_score_id",
+            "challenger_score", "opponent_score", "result", "points_changed", "matched_at",
+        ], rows())
+
+
+def main(args) -> None:
+    started = time.perf_counter()
+    engine = create_engine(args.database)
+    is_sqlite = engine.dialect.name == "sqlite"
+
+    with engine.begin() as conn:
+        if is_sqlite:
+            # 导入期间关闭同步和回滚日志，中途失败需要用 --reset 重新生成
+            conn.exec_driver_sql("PRAGMA synchronous = OFF")
+            conn.exec_driver_sql("PRAGMA journal_mode = MEMORY")
+            conn.exec_driver_sql("PRAGMA cache_size = -262144")
+            conn.exec_driver_sql("PRAGMA temp_store = MEMORY")
+
+        if args.reset:
+            logger.info("重建数据表...")
+            Base.metadata.drop_all(bind=conn)
+            # 先建表不建索引，导入完成后再统一建索引
+            for table in Base.metadata.sorted_tables:
+                conn.execute(CreateTable(table))
+        else:
+            Base.metadata.create_all(bind=conn)
+
+        seeder = Seeder(conn, args)
+        t0 = time.perf_counter()
+        first_user, user_count = seeder.seed_users()
+        user_ids = range(first_user, first_user + user_count)
+        if not user_ids:
+            user_ids = range(1, seeder._next_id(User.user_id))
+        logger.info(f"用户: {user_count} 条, {time.perf_counter() - t0:.1f}秒")
+
+        t0 = time.perf_counter()
+        score_ids, score_users, face_scores = seeder.seed_scores(user_ids)
+        logger.info(f"评分记录: {len(score_ids)} 条, {time.perf_counter() - t0:.1f}秒")
+
+        if score_ids and args.matches:
+            t0 = time.perf_counter()
+            match_count = seeder.seed_matches(score_ids, score_users, face_scores)
+            logger.info(f"PK对战: {match_count} 条, {time.perf_counter() - t0:.1f}秒")
+
+        if args.reset:
+            t0 = time.perf_counter()
+            for table in Base.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(bind=conn)
+            logger.info(f"创建索引: {time.perf_counter() - t0:.1f}秒")
+
+        t0 = time.perf_counter()
+        StatsService(conn).rebuild()
+        logger.info(f"用户统计: {time.perf_counter() - t0:.1f}秒")
+
+    if is_sqlite:
+        with engine.connect() as conn:
+            conn.exec_driver_sql("ANALYZE")
+    invalidate_boards()
+    logger.info(f"数据生成完成，总耗时 {time.perf_counter() - started:.1f}秒")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批量生成测试数据")
+    parser.add_argument("--database", default=DATABASE_URL, help="数据库URL，默认为当前配置的数据库")
+    parser.add_argument("--reset", action="store_true", help="删除并重建所有数据表")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--scores", type=int, default=100000)
+    parser.add_argument("--matches", type=int, default=50000)
+    parser.add_argument("--no-features", dest="features", action="store_false", help="不生成人脸特征数据")
+    parser.add_argument("--password", default="password123", help="所有生成用户的密码")
+    parser.add_argument("--days", type=int, default=180, help="数据覆盖的天数")
+    parser.add_argument("--end-date", default="2025-07-01", help="数据的截止日期（YYYY-MM-DD）")
+    parser.add_argument("--batch-size", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    main(parser.parse_args())
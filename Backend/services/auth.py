@@ -1,15 +1,66 @@
 """
 用户认证服务
 """
+import time
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from fastapi import Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
 from sqlalchemy.exc import IntegrityError
+from config.settings import AUTH_CACHE_TTL, AUTH_CACHE_SIZE
+from core.cache import TTLCache
 from db.session import get_db
 from models.user import User
 from schemas.user import UserCreate
-from core.security import oauth2_scheme, decode_token, verify_password, get_password_hash, create_access_token
+from core.security import oauth2_scheme, decode_token, decode_token_payload, verify_password_async, get_password_hash_async, create_access_token
+
+# 令牌 -> 用户ID，过期时间不超过令牌本身的有效期
+_token_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL, name="auth_token")
+# 用户ID -> 脱离会话的用户快照，用户信息变更时失效
+_principal_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL, name="auth_principal")
+# 频繁变化、可能被其他进程修改的字段不使用缓存值，访问时再从数据库加载
+_VOLATILE_ATTRS = ["elo_rating", "last_login"]
+
+def _snapshot_user(user: User) -> User:
+    """复制用户的列属性，得到一个不属于任何会话的干净对象"""
+    values = {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+    snapshot = User(**values)
+    make_transient_to_detached(snapshot)
+    return snapshot
+
+def invalidate_user_cache(user_id: int) -> None:
+    """用户资料或状态变更后清除缓存"""
+    _principal_cache.invalidate(user_id)
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _evict_user(mapper, connection, target: User) -> None:
+    invalidate_user_cache(target.user_id)
+
+def _resolve_user_id(db: Session, token: str) -> int:
+    """解析令牌得到用户ID，结果按令牌缓存"""
+    user_id = _token_cache.get(token)
+    if user_id is not None:
+        return user_id
+
+    payload = decode_token_payload(token)
+    subject = payload["sub"]
+    try:
+        user_id = int(subject)
+    except ValueError:
+        # 如果无法转换为整数，可能是旧令牌，尝试通过username查询
+        user = db.query(User).filter(User.username == subject).first()
+        if user is None:
+            raise ValueError(subject)
+        user_id = user.user_id
+
+    ttl = AUTH_CACHE_TTL
+    if payload.get("exp") is not None:
+        ttl = min(ttl, payload["exp"] - time.time())
+    if ttl > 0:
+        _token_cache.set(token, user_id, ttl=ttl)
+    return user_id
 
 async def get_current_user(
     db: Session = Depends(get_db),
@@ -17,6 +68,8 @@ async def get_current_user(
 ) -> User:
     """
     根据令牌获取当前用户
+
+    命中缓存时把用户快照合并进当前会话（load=False），不产生数据库查询
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -26,24 +79,22 @@ async def get_current_user(
     
     # 解析令牌，获取用户ID
     try:
-        user_id = decode_token(token)
-        if user_id is None:
-            raise credentials_exception
+        user_id = _resolve_user_id(db, token)
     except:
         raise credentials_exception
+    
+    snapshot = _principal_cache.get(user_id)
+    if snapshot is not None:
+        user = db.merge(snapshot, load=False)
+        db.expire(user, _VOLATILE_ATTRS)
+        return user
         
     # 根据用户ID查询用户
-    try:
-        user_id_int = int(user_id)
-        user = db.query(User).filter(User.user_id == user_id_int).first()
-        if user is None:
-            raise credentials_exception
-    except ValueError:
-        # 如果无法转换为整数，可能是旧令牌，尝试通过username查询
-        user = db.query(User).filter(User.username == user_id).first()
-        if user is None:
-            raise credentials_exception
-        
+    user = db.query(User).filter(User.user_id == user_id).first()
+    if user is None:
+        raise credentials_exception
+    
+    _principal_cache.set(user_id, _snapshot_user(user))
     return user
 
 class AuthService:
@@ -53,7 +104,7 @@ class AuthService:
         """初始化服务"""
         self.db = db
     
-    def register_user(self, user_data: UserCreate) -> User:
+    async def register_user(self, user_data: UserCreate) -> User:
         """注册新用户"""
         # 检查用户名是否已存在
         existing_user = self.db.query(User).filter(User.username == user_data.username).first()
@@ -75,7 +126,7 @@ class AuthService:
         # 创建新用户
         try:
             # 密码哈希处理
-            hashed_password = get_password_hash(user_data.password)
+            hashed_password = await get_password_hash_async(user_data.password)
             
             # 创建用户记录
             db_user = User(
@@ -99,7 +150,7 @@ class AuthService:
                 detail="用户创建失败，请检查输入信息"
             )
     
-    def authenticate_user(self, username: str, password: str) -> Optional[User]:
+    async def authenticate_user(self, username: str, password: str) -> Optional[User]:
         """验证用户"""
         user = self.db.query(User).filter(User.username == username).first()
         
@@ -107,8 +158,14 @@ class AuthService:
             return None
         
         # 确保将密码哈希转换为字符串
-        if not verify_password(password, str(user.password_hash)):
+        valid, new_hash = await verify_password_async(password, str(user.password_hash))
+        if not valid:
             return None
+        
+        # 哈希算法或成本参数已变更，借登录时机透明升级
+        if new_hash:
+            user.password_hash = new_hash
+            self.db.commit()
             
         return user
     
@@ -126,6 +183,8 @@ class AuthService:
             {"last_login": current_time}
         )
         self.db.commit()
+        # 批量更新不会触发ORM事件，需要手动清除缓存
+        invalidate_user_cache(user_id)
     
     def validate_token(self, token: str) -> Optional[int]:
         """验证令牌有效性并返回用户ID"""
@@ -0,0 +1,379 @@
+"""
+人脸检测服务提供方
+
+BaiduFaceProvider 调用百度AI人脸检测接口，MockFaceProvider 用于本地故障注入和压测，
+FaceDetector 在提供方外层加上截止时间、重试预算、熔断和对冲请求。
+"""
+import base64
+import hashlib
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import settings
+from core import metrics
+from core.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceeded,
+    ResilientCaller,
+    RetryBudget,
+)
+from core.rate_limiter import Priority, RateLimitExceeded, create_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+FACE_FIELDS = "age,beauty,expression,face_shape,gender,landmark"
+
+# 百度AI错误码
+BAIDU_QPS_LIMIT_CODES = {4, 18}  # 请求量/QPS超限
+BAIDU_TOKEN_INVALID_CODES = {110, 111}  # access_token无效或过期
+BAIDU_SERVER_ERROR_CODES = {1, 2, 282000}  # 服务端内部错误或暂不可用
+BAIDU_NO_FACE_CODE = 222202
+
+DETECT_OUTCOMES = metrics.counter(
+    "face_detect_outcomes_total", "人脸检测结果计数", ["outcome"]
+)
+PROVIDER_LATENCY = metrics.histogram(
+    "face_detect_provider_seconds", "人脸检测提供方单次调用耗时（秒）", ["stage"]
+)
+_TOKEN_FETCH_TIMER = PROVIDER_LATENCY.labels(stage="token_fetch")
+_DETECT_REQUEST_TIMER = PROVIDER_LATENCY.labels(stage="detect_request")
+
+
+class FaceDetectionError(Exception):
+    """人脸检测失败
+
+    retryable 为 True 表示上游暂时不可用（超时、5xx、限流等），可以重试并计入熔断；
+    为 False 表示请求本身的问题（未检测到人脸、图片格式错误等），重试没有意义。
+    """
+
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.message = message
+        self.retryable = retryable
+
+
+class BaiduFaceProvider:
+    """百度AI人脸检测"""
+
+    # access_token 有效期为30天，这里提前刷新
+    TOKEN_TTL = 24 * 3600
+
+    def __init__(self, api_key: Optional[str], secret_key: Optional[str], pool_size: int = 16):
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self._token: Optional[str] = None
+        self._token_expires_at = 0.0
+        self._token_lock = threading.Lock()
+        # 复用连接，避免每次检测都重新握手
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+    def get_access_token(self, timeout: float) -> str:
+        """获取并缓存百度AI访问令牌"""
+        with self._token_lock:
+            if self._token and time.monotonic() < self._token_expires_at:
+                return self._token
+
+            if not self.api_key or not self.secret_key:
+                logger.error("百度AI API密钥未配置")
+                raise FaceDetectionError("无法获取百度AI访问令牌")
+
+            params = {
+                'grant_type': 'client_credentials',
+                'client_id': self.api_key,
+                'client_secret': self.secret_key
+            }
+            try:
+                with _TOKEN_FETCH_TIMER.time():
+                    response = self._session.post(settings.BAIDU_AI_TOKEN_URL, params=params, timeout=timeout).json()
+            except requests.RequestException as e:
+                logger.error(f"获取access_token失败: {e}")
+                raise FaceDetectionError("无法获取百度AI访问令牌", retryable=True)
+
+            token = response.get('access_token')
+            if not token:
+                logger.error(f"获取access_token失败: {response}")
+                raise FaceDetectionError("无法获取百度AI访问令牌")
+
+            self._token = token
+            self._token_expires_at = time.monotonic() + self.TOKEN_TTL
+            return token
+
+    def invalidate_token(self) -> None:
+        with self._token_lock:
+            self._token = None
+
+    def detect(self, image_data: bytes, timeout: float) -> Dict[str, Any]:
+        """检测人脸，返回第一张人脸的特征数据"""
+        started = time.monotonic()
+        access_token = self.get_access_token(timeout)
+        remaining = max(timeout - (time.monotonic() - started), 0.1)
+
+        payload = {
+            "image": base64.b64encode(image_data).decode("utf-8"),
+            "image_type": "BASE64",
+            "face_field": FACE_FIELDS
+        }
+        try:
+            with _DETECT_REQUEST_TIMER.time():
+                response = self._session.post(
+                    settings.BAIDU_AI_DETECT_URL,
+                    params={"access_token": access_token},
+                    json=payload,
+                    timeout=remaining
+                )
+        except requests.Timeout:
+            raise FaceDetectionError("人脸检测请求超时", retryable=True)
+        except requests.RequestException as e:
+            raise FaceDetectionError(f"人脸检测请求失败: {e}", retryable=True)
+
+        if response.status_code >= 500:
+            raise FaceDetectionError(f"人脸检测服务异常: HTTP {response.status_code}", retryable=True)
+
+        try:
+            result = response.json()
+        except ValueError:
+            raise FaceDetectionError("人脸检测返回格式错误", retryable=True)
+
+        logger.debug("百度AI返回结果: %s", result)
+
+        error_code = result.get('error_code', 0) or 0
+        if error_code != 0:
+            error_msg = result.get('error_msg', '未知错误')
+            if error_code in BAIDU_TOKEN_INVALID_CODES:
+                self.invalidate_token()
+                raise FaceDetectionError(error_msg, retryable=True)
+            if error_code in BAIDU_QPS_LIMIT_CODES or error_code in BAIDU_SERVER_ERROR_CODES:
+                raise FaceDetectionError(error_msg, retryable=True)
+            if error_code == BAIDU_NO_FACE_CODE:
+                raise FaceDetectionError("未检测到人脸")
+            logger.error(f"人脸检测失败: {error_code} {error_msg}")
+            raise FaceDetectionError(error_msg)
+
+        face_list = (result.get('result') or {}).get('face_list', [])
+        if not face_list:
+            raise FaceDetectionError("未检测到人脸")
+
+        return face_list[0]
+
+
+def synthetic_face_info(seed: Any) -> Dict[str, Any]:
+    """根据种子生成与百度AI返回结构一致的人脸特征数据（相同种子结果相同）"""
+    rng = random.Random(seed)
+    left = rng.uniform(50, 300)
+    top = rng.uniform(50, 300)
+    width = rng.uniform(120, 240)
+    landmark72 = [
+        {"x": round(left + rng.uniform(0, width), 2), "y": round(top + rng.uniform(0, width), 2)}
+        for _ in range(72)
+    ]
+    return {
+        "face_token": hashlib.md5(str(seed).encode()).hexdigest(),
+        "location": {"left": round(left, 2), "top": round(top, 2), "width": round(width), "height": round(width), "rotation": rng.randint(-20, 20)},
+        "face_probability": 1,
+        "angle": {"yaw": round(rng.uniform(-30, 30), 2), "pitch": round(rng.uniform(-20, 20), 2), "roll": round(rng.uniform(-20, 20), 2)},
+        "landmark": landmark72[:4],
+        "landmark72": landmark72,
+        "age": rng.randint(16, 60),
+        "beauty": round(rng.uniform(20, 95), 2),
+        "expression": {"type": rng.choice(["none", "smile", "laugh"]), "probability": 1},
+        "gender": {"type": rng.choice(["male", "female"]), "probability": 1},
+        "face_shape": {"type": rng.choice(["square", "triangle", "oval", "heart", "round"]), "probability": round(rng.uniform(0.5, 1), 2)},
+    }
+
+
+class MockFaceProvider:
+    """
+    本地模拟人脸检测，可注入延迟、长尾和错误，用于验证容错策略和压测
+
+    latency: 基础延迟（秒），jitter: 随机抖动（秒），
+    tail_rate/tail_latency: 以一定概率出现的长尾延迟，error_rate: 可重试错误的概率
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.02,
+        tail_rate: float = 0.0,
+        tail_latency: float = 2.0,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def detect(self, image_data: bytes, timeout: float) -> Dict[str, Any]:
+        with self._lock:
+            self.calls += 1
+            roll = self._rng.random()
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+            if self._rng.random() < self.tail_rate:
+                delay = self.tail_latency
+
+        if delay > timeout:
+            time.sleep(timeout)
+            raise FaceDetectionError("人脸检测请求超时", retryable=True)
+        time.sleep(delay)
+
+        if roll < self.error_rate:
+            raise FaceDetectionError("模拟服务暂不可用", retryable=True)
+
+        return synthetic_face_info(hashlib.md5(image_data).hexdigest())
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, FaceDetectionError):
+        return exc.retryable
+    return isinstance(exc, (DeadlineExceeded, TimeoutError, requests.RequestException))
+
+
+class FaceDetector:
+    """带容错策略的人脸检测入口，返回值与 ScoringService.detect_face 保持一致"""
+
+    def __init__(self, provider: Any, caller: ResilientCaller):
+        self.provider = provider
+        self.caller = caller
+
+    async def detect(self, image_data: bytes, priority: Priority = Priority.INTERACTIVE) -> Dict:
+        try:
+            face_info = await self.caller.call(
+                lambda timeout: self.provider.detect(image_data, timeout),
+                priority=priority
+            )
+            DETECT_OUTCOMES.labels(outcome="success").inc()
+            return {"success": True, "face_info": face_info}
+        except RateLimitExceeded:
+            DETECT_OUTCOMES.labels(outcome="rate_limited").inc()
+            return {"success": False, "error": "人脸检测请求繁忙，请稍后再试"}
+        except CircuitOpenError:
+            DETECT_OUTCOMES.labels(outcome="circuit_open").inc()
+            return {"success": False, "error": "人脸检测服务暂时不可用，请稍后再试"}
+        except DeadlineExceeded:
+            DETECT_OUTCOMES.labels(outcome="timeout").inc()
+            return {"success": False, "error": "人脸检测超时，请稍后再试"}
+        except FaceDetectionError as e:
+            DETECT_OUTCOMES.labels(outcome="upstream_error" if e.retryable else "rejected").inc()
+            return {"success": False, "error": e.message}
+        except Exception as e:
+            DETECT_OUTCOMES.labels(outcome="error").inc()
+            logger.error(f"人脸检测异常: {e}")
+            return {"success": False, "error": str(e)}
+
+
+def build_face_detector(provider: Any, **overrides: Any) -> FaceDetector:
+    """按配置创建人脸检测器，overrides 可覆盖 ResilientCaller 的参数"""
+    options = dict(
+        attempt_timeout=settings.FACE_DETECT_ATTEMPT_TIMEOUT,
+        deadline=settings.FACE_DETECT_DEADLINE,
+        max_retries=settings.FACE_DETECT_MAX_RETRIES,
+        backoff_base=settings.FACE_DETECT_BACKOFF_BASE,
+        backoff_max=settings.FACE_DETECT_BACKOFF_MAX,
+        hedge_delay=settings.FACE_DETECT_HEDGE_DELAY,
+        max_workers=settings.FACE_DETECT_MAX_WORKERS,
+    )
+    options.update(overrides)
+    if "rate_limiter" not in options:
+        options["rate_limiter"] = get_detect_rate_limiter()
+    breaker = options.pop("breaker", None) or CircuitBreaker(
+        failure_threshold=settings.FACE_DETECT_BREAKER_THRESHOLD,
+        reset_timeout=settings.FACE_DETECT_BREAKER_RESET,
+    )
+    budget = options.pop("budget", None) or RetryBudget(ratio=settings.FACE_DETECT_RETRY_BUDGET_RATIO)
+    caller = ResilientCaller(
+        name="face-detect",
+        breaker=breaker,
+        budget=budget,
+        is_retryable=_is_retryable,
+        **options
+    )
+    return FaceDetector(provider, caller)
+
+
+_detector: Optional[FaceDetector] = None
+_detector_lock = threading.RLock()
+_rate_limiter = None
+
+
+def get_detect_rate_limiter():
+    """获取人脸检测的配额限流器，同一进程内的所有检测器共享"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _detector_lock:
+            if _rate_limiter is None:
+                _rate_limiter = create_rate_limiter(
+                    "face_detect",
+                    rate=settings.FACE_DETECT_QPS,
+                    burst=settings.FACE_DETECT_BURST,
+                    batch_reserve=settings.FACE_DETECT_BATCH_RESERVE,
+                    backend=settings.FACE_DETECT_RATE_LIMIT_BACKEND,
+                    redis_options={
+                        "host": settings.REDIS_HOST,
+                        "port": settings.REDIS_PORT,
+                        "db": settings.REDIS_DB,
+                        "password": settings.REDIS_PASSWORD or None,
+                    },
+                )
+    return _rate_limiter
+
+
+def get_face_detector() -> FaceDetector:
+    """获取进程内共享的人脸检测器，熔断和重试预算状态在请求之间共享"""
+    global _detector
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                if settings.FACE_DETECT_PROVIDER == "mock":
+                    provider = MockFaceProvider()
+                else:
+                    provider = BaiduFaceProvider(
+                        settings.BAIDU_AI_API_KEY,
+                        settings.BAIDU_AI_SECRET_KEY,
+                        pool_size=settings.FACE_DETECT_MAX_WORKERS,
+                    )
+                _detector = build_face_detector(provider)
+    return _detector
+
+
+_BREAKER_STATES = (CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN)
+
+
+@metrics.collector
+def _collect_detect_metrics():
+    """抓取时读取共享检测器的熔断状态和限流器统计；尚未创建时不输出"""
+    if _detector is not None:
+        state = _detector.caller.breaker.state
+        yield (
+            "face_detect_breaker_state", "gauge", "人脸检测熔断器状态（当前状态为1）",
+            [("face_detect_breaker_state", {"state": item}, 1 if item == state else 0) for item in _BREAKER_STATES],
+        )
+    if _rate_limiter is not None:
+        stats = _rate_limiter.stats()
+        quota = stats.pop("quota")
+        for key, kind, doc in (
+            ("queue_depth", "gauge", "本进程内等待配额的请求数"),
+            ("global_queue_depth", "gauge", "所有实例等待配额的请求数"),
+            ("granted_total", "counter", "获得配额的请求数"),
+            ("throttled_total", "counter", "需要排队等待配额的请求数"),
+            ("rejected_total", "counter", "等待配额超时被拒绝的请求数"),
+            ("wait_seconds_total", "counter", "等待配额的累计时间（秒）"),
+        ):
+            name = f"face_detect_quota_{key}"
+            yield name, kind, doc, [(name, {"priority": p}, values[key]) for p, values in stats.items()]
+        yield "face_detect_quota_usage_ratio", "gauge", "最近一段时间的配额使用率", [
+            ("face_detect_quota_usage_ratio", {}, quota["usage_ratio"])
+        ]
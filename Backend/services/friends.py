@@ -0,0 +1,192 @@
+"""
+好友关系服务
+
+user_friends 中每对用户最多一行：好友申请由申请人写入（PENDING），对方同意后改为 ACCEPTED；
+BLOCKED 行由拉黑的一方写入。好友关系是双向的，查询时两个方向都要看。
+
+每个用户的好友ID集合（邻接表）缓存在进程内，关系变更时通过映射事件清除双方的缓存，
+好友排行榜、共同好友和好友PK历史都基于这个集合，代价与好友数成正比，不需要关联整张表。
+"""
+import logging
+from typing import Dict, FrozenSet, List, Optional
+
+from sqlalchemy import and_, event, or_, select
+from sqlalchemy.orm import Session
+
+from config.settings import FRIEND_CACHE_SIZE, FRIEND_CACHE_TTL, MAX_FRIENDS
+from core.cache import TTLCache
+from models.friend import FriendStatus, UserFriend
+from models.user import User
+
+logger = logging.getLogger(__name__)
+
+# 用户ID -> 好友ID集合，多进程部署时各进程的缓存最多滞后 FRIEND_CACHE_TTL 秒
+_friends_cache = TTLCache(maxsize=FRIEND_CACHE_SIZE, ttl=FRIEND_CACHE_TTL, name="friends")
+
+
+def invalidate_friend_cache(*user_ids: int) -> None:
+    for user_id in user_ids:
+        _friends_cache.invalidate(user_id)
+
+
+@event.listens_for(UserFriend, "after_insert")
+@event.listens_for(UserFriend, "after_update")
+@event.listens_for(UserFriend, "after_delete")
+def _evict_relation(mapper, connection, target: UserFriend) -> None:
+    invalidate_friend_cache(target.user_id, target.friend_id)
+
+
+def _between(user_id: int, other_id: int):
+    return or_(
+        and_(UserFriend.user_id == user_id, UserFriend.friend_id == other_id),
+        and_(UserFriend.user_id == other_id, UserFriend.friend_id == user_id),
+    )
+
+
+def _user_brief(user: User, since=None) -> Dict:
+    return {
+        "user_id": user.user_id,
+        "username": user.username,
+        "nickname": user.nickname or user.username,
+        "avatar_url": user.avatar_url,
+        "since": since,
+    }
+
+
+class FriendService:
+    """好友申请、删除、拉黑以及基于好友集合的查询"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def friend_ids(self, user_id: int) -> FrozenSet[int]:
+        """用户的好友ID集合（已同意的关系）"""
+        cached = _friends_cache.get(user_id)
+        if cached is not None:
+            return cached
+        rows = self.db.execute(
+            select(UserFriend.user_id, UserFriend.friend_id).where(
+                UserFriend.status == FriendStatus.ACCEPTED,
+                or_(UserFriend.user_id == user_id, UserFriend.friend_id == user_id),
+            )
+        )
+        ids = frozenset(friend_id if owner_id == user_id else owner_id for owner_id, friend_id in rows)
+        _friends_cache.set(user_id, ids)
+        return ids
+
+    def _relation(self, user_id: int, other_id: int) -> Optional[UserFriend]:
+        return self.db.query(UserFriend).filter(_between(user_id, other_id)).first()
+
+    def send_request(self, user_id: int, friend_id: int) -> Dict:
+        """发送好友申请；对方已向自己发出申请时直接成为好友"""
+        if user_id == friend_id:
+            return {"success": False, "error": "不能添加自己为好友"}
+        if self.db.get(User, friend_id) is None:
+            return {"success": False, "error": "用户不存在"}
+        if len(self.friend_ids(user_id)) >= MAX_FRIENDS:
+            return {"success": False, "error": f"好友数量已达上限({MAX_FRIENDS})"}
+
+        relation = self._relation(user_id, friend_id)
+        if relation is not None:
+            if relation.status == FriendStatus.BLOCKED:
+                return {"success": False, "error": "无法添加该用户为好友"}
+            if relation.status == FriendStatus.ACCEPTED:
+                return {"success": False, "error": "已经是好友"}
+            if relation.user_id == user_id:
+                return {"success": False, "error": "已发送过好友申请"}
+            relation.status = FriendStatus.ACCEPTED
+            self.db.commit()
+            return {"success": True, "status": FriendStatus.ACCEPTED.value}
+
+        self.db.add(UserFriend(user_id=user_id, friend_id=friend_id, status=FriendStatus.PENDING))
+        self.db.commit()
+        return {"success": True, "status": FriendStatus.PENDING.value}
+
+    def accept_request(self, user_id: int, requester_id: int) -> Dict:
+        relation = self.db.query(UserFriend).filter(
+            UserFriend.user_id == requester_id,
+            UserFriend.friend_id == user_id,
+            UserFriend.status == FriendStatus.PENDING,
+        ).first()
+        if relation is None:
+            return {"success": False, "error": "好友申请不存在"}
+        if len(self.friend_ids(user_id)) >= MAX_FRIENDS:
+            return {"success": False, "error": f"好友数量已达上限({MAX_FRIENDS})"}
+        relation.status = FriendStatus.ACCEPTED
+        self.db.commit()
+        return {"success": True, "status": FriendStatus.ACCEPTED.value}
+
+    def remove(self, user_id: int, other_id: int) -> Dict:
+        """删除好友，或撤回/拒绝双方之间的好友申请"""
+        relation = self._relation(user_id, other_id)
+        if relation is None or relation.status == FriendStatus.BLOCKED:
+            return {"success": False, "error": "好友关系不存在"}
+        self.db.delete(relation)
+        self.db.commit()
+        return {"success": True}
+
+    def block(self, user_id: int, target_id: int) -> Dict:
+        """拉黑用户，同时解除好友关系和未处理的申请"""
+        if user_id == target_id:
+            return {"success": False, "error": "不能拉黑自己"}
+        if self.db.get(User, target_id) is None:
+            return {"success": False, "error": "用户不存在"}
+        relation = self._relation(user_id, target_id)
+        if relation is not None and relation.status == FriendStatus.BLOCKED:
+            if relation.user_id == user_id:
+                return {"success": True, "status": FriendStatus.BLOCKED.value}
+            # 对方已拉黑自己，保留对方的记录
+            return {"success": False, "error": "无法拉黑该用户"}
+        if relation is not None:
+            self.db.delete(relation)
+            self.db.flush()
+        self.db.add(UserFriend(user_id=user_id, friend_id=target_id, status=FriendStatus.BLOCKED))
+        self.db.commit()
+        return {"success": True, "status": FriendStatus.BLOCKED.value}
+
+    def unblock(self, user_id: int, target_id: int) -> Dict:
+        relation = self.db.query(UserFriend).filter(
+            UserFriend.user_id == user_id,
+            UserFriend.friend_id == target_id,
+            UserFriend.status == FriendStatus.BLOCKED,
+        ).first()
+        if relation is None:
+            return {"success": False, "error": "未拉黑该用户"}
+        self.db.delete(relation)
+        self.db.commit()
+        return {"success": True}
+
+    def _users(self, user_ids) -> List[User]:
+        if not user_ids:
+            return []
+        return self.db.query(User).filter(User.user_id.in_(list(user_ids))).order_by(User.user_id).all()
+
+    def list_friends(self, user_id: int) -> Dict:
+        since = {
+            (row.friend_id if row.user_id == user_id else row.user_id): row.created_at
+            for row in self.db.execute(
+                select(UserFriend.user_id, UserFriend.friend_id, UserFriend.created_at).where(
+                    UserFriend.status == FriendStatus.ACCEPTED,
+                    or_(UserFriend.user_id == user_id, UserFriend.friend_id == user_id),
+                )
+            )
+        }
+        data = [_user_brief(user, since.get(user.user_id)) for user in self._users(self.friend_ids(user_id))]
+        return {"total": len(data), "data": data}
+
+    def list_requests(self, user_id: int) -> Dict:
+        """收到的、尚未处理的好友申请"""
+        rows = self.db.execute(
+            select(UserFriend.user_id, UserFriend.created_at).where(
+                UserFriend.friend_id == user_id, UserFriend.status == FriendStatus.PENDING,
+            )
+        ).all()
+        since = {row.user_id: row.created_at for row in rows}
+        data = [_user_brief(user, since[user.user_id]) for user in self._users(since)]
+        return {"total": len(data), "data": data}
+
+    def mutual_friends(self, user_id: int, other_id: int) -> Dict:
+        """共同好友：两个好友集合求交集"""
+        mutual = self.friend_ids(user_id) & self.friend_ids(other_id)
+        data = [_user_brief(user) for user in self._users(mutual)]
+        return {"total": len(data), "data": data}
@@ -0,0 +1,658 @@
+"""
+排行榜服务
+
+全站榜有两种视图：照片榜（每张公开照片一条）和用户榜（每个用户以公开评分中的最高分上榜）；
+地区排行榜是按 User.region_code 分区的用户榜；Elo天梯按 User.elo_rating 排列参加过PK的用户。
+榜单由 core.leaderboard 维护（Redis有序集合或进程内有序集合），首次访问时从数据库加载，
+之后在评分写入后增量更新，分页和名次查询都是 O(log N)，不再对 scores 表排序或分组。
+
+日榜、周榜、月榜按 Score.scored_at 的日期分桶（UTC），每个桶只保留当天的前 K 张公开照片。
+一个周期由最近几天的桶归并得到，每个桶只需读取前 offset+limit 条；
+新的一天写入新桶即可，超出最长周期的旧桶自动过期。
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session
+
+from config import settings
+from core.fields import pick
+from core.leaderboard import Leaderboard, create_leaderboard
+from models.score import Score
+from models.user import User
+from models.stats import UserStats
+from services.stats import StatsService, best_public_scores
+
+logger = logging.getLogger(__name__)
+
+_boards: Dict[str, Leaderboard] = {}
+_boards_lock = threading.Lock()
+
+# 不分区的榜单使用的分区键
+GLOBAL_PARTITION = "all"
+
+# 没有Elo分数的用户按初始分计算
+DEFAULT_RATING = 1500
+
+# 全站榜视图
+VIEWS = ("photo", "user")
+
+# 周期名称 -> 包含的天数（含今天）
+WINDOWS = {"daily": 1, "weekly": 7, "monthly": 30}
+_RETENTION_DAYS = max(WINDOWS.values())
+
+# 排行榜条目可选择的字段（见 core/fields.py），各榜单只返回其中自己提供的字段
+RANKING_FIELDS = ("rank", "user_id", "score_id", "username", "nickname", "avatar", "region_code",
+                  "highest_score", "elo_rating", "image_url", "scored_at")
+# 需要查询用户资料、照片记录的字段，未选择时跳过对应的查询
+_USER_FIELDS = ("username", "nickname", "avatar", "region_code")
+_PHOTO_FIELDS = ("score_id", "image_url", "scored_at")
+
+
+def _wants(fields: Optional[Sequence[str]], names: Sequence[str]) -> bool:
+    return fields is None or any(name in fields for name in names)
+
+
+def _load_public_photos() -> List[Tuple[str, int, float]]:
+    from config.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return [
+            (GLOBAL_PARTITION, row.score_id, row.face_score)
+            for row in db.execute(select(Score.score_id, Score.face_score).where(Score.is_public.is_(True)))
+        ]
+    finally:
+        db.close()
+
+
+def _load_user_best() -> List[Tuple[str, int, float]]:
+    from config.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return [(GLOBAL_PARTITION, row.user_id, row.best_score) for row in db.execute(best_public_scores())]
+    finally:
+        db.close()
+
+
+def _load_elo_pool() -> List[Tuple[str, int, float]]:
+    from config.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        has_public_score = select(Score.user_id).where(Score.is_public.is_(True))
+        return [
+            (GLOBAL_PARTITION, row.user_id, row.elo_rating if row.elo_rating is not None else DEFAULT_RATING)
+            for row in db.execute(
+                select(User.user_id, User.elo_rating).where(User.user_id.in_(has_public_score))
+            )
+        ]
+    finally:
+        db.close()
+
+
+def _load_elo_ladder() -> List[Tuple[str, int, float]]:
+    from config.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return [
+            (GLOBAL_PARTITION, row.user_id, row.elo_rating if row.elo_rating is not None else DEFAULT_RATING)
+            for row in db.execute(
+                select(User.user_id, User.elo_rating)
+                .join(UserStats, UserStats.user_id == User.user_id)
+                .where(UserStats.matches_total > 0)
+            )
+        ]
+    finally:
+        db.close()
+
+
+def _load_regional_best() -> List[Tuple[str, int, float]]:
+    from config.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return [
+            (row.region_code, row.user_id, row.best_score)
+            for row in db.execute(best_public_scores()) if row.region_code
+        ]
+    finally:
+        db.close()
+
+
+def _bucket_key(day: date) -> str:
+    return day.isoformat()
+
+
+def _window_days(window: str, today: Optional[date] = None) -> List[str]:
+    today = today or datetime.utcnow().date()
+    return [_bucket_key(today - timedelta(days=i)) for i in range(WINDOWS[window])]
+
+
+def _bucket_ttl(partition: str) -> float:
+    """桶在最长周期滑出后过期"""
+    expires = datetime.fromisoformat(partition) + timedelta(days=_RETENTION_DAYS)
+    return (expires - datetime.utcnow()).total_seconds()
+
+
+def _load_window_buckets() -> List[Tuple[str, int, float]]:
+    from config.database import SessionLocal
+
+    since = datetime.combine(datetime.utcnow().date() - timedelta(days=_RETENTION_DAYS - 1), datetime.min.time())
+    buckets: Dict[str, List[Tuple[float, int]]] = {}
+    db = SessionLocal()
+    try:
+        for row in db.execute(
+            select(Score.score_id, Score.face_score, Score.scored_at)
+            .where(Score.is_public.is_(True), Score.scored_at >= since)
+        ):
+            buckets.setdefault(_bucket_key(row.scored_at.date()), []).append((row.face_score, row.score_id))
+    finally:
+        db.close()
+    top_k = settings.LEADERBOARD_WINDOW_TOP_K
+    return [
+        (partition, score_id, face_score)
+        for partition, entries in buckets.items()
+        for face_score, score_id in heapq.nlargest(top_k, entries)
+    ]
+
+
+def _get_board(name: str, loader, partition_ttl=None) -> Leaderboard:
+    board = _boards.get(name)
+    if board is None:
+        with _boards_lock:
+            board = _boards.get(name)
+            if board is None:
+                board = _boards[name] = create_leaderboard(
+                    name, loader,
+                    backend=settings.LEADERBOARD_BACKEND,
+                    redis_options={
+                        "host": settings.REDIS_HOST,
+                        "port": settings.REDIS_PORT,
+                        "db": settings.REDIS_DB,
+                        "password": settings.REDIS_PASSWORD,
+                    },
+                    reload_interval=settings.LEADERBOARD_RELOAD_SECONDS,
+                    partition_ttl=partition_ttl,
+                )
+    return board
+
+
+def get_photo_board() -> Leaderboard:
+    """全站照片榜：成员为公开评分的评分ID"""
+    return _get_board("photo", _load_public_photos)
+
+
+def get_user_board() -> Leaderboard:
+    """全站用户榜：成员为用户ID，分数为公开评分中的最高分"""
+    return _get_board("user_best", _load_user_best)
+
+
+def get_elo_pool() -> Leaderboard:
+    """PK匹配池：有公开评分（可以被挑战）的用户，分数为Elo分数"""
+    return _get_board("elo_pool", _load_elo_pool)
+
+
+def get_elo_ladder() -> Leaderboard:
+    """Elo天梯：参加过PK的用户，分数为Elo分数"""
+    return _get_board("elo_ladder", _load_elo_ladder)
+
+
+def get_regional_board() -> Leaderboard:
+    """地区排行榜：分区为地区代码，成员为用户ID，分数为公开评分中的最高分"""
+    return _get_board("region_best", _load_regional_best)
+
+
+def get_window_board() -> Leaderboard:
+    """按天分桶的照片榜：分区为日期，成员为评分ID，每个分区只保留前 K 名"""
+    return _get_board("daily_top", _load_window_buckets, partition_ttl=_bucket_ttl)
+
+
+def _normalize_image_url(image_url: Optional[str]) -> Optional[str]:
+    # 处理图片URL，确保使用正斜杠
+    if image_url and not image_url.startswith('http'):
+        image_url = image_url.replace('\\', '/')
+        if not image_url.startswith('/'):
+            image_url = f"/{image_url}"
+    return image_url
+
+
+class LeaderboardService:
+    """排行榜查询与增量更新"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _best_public_score(self, user_id: int) -> Optional[float]:
+        return self.db.execute(
+            select(func.max(Score.face_score)).where(Score.user_id == user_id, Score.is_public.is_(True))
+        ).scalar()
+
+    def _region_of(self, user_id: int) -> Optional[str]:
+        return self.db.execute(select(User.region_code).where(User.user_id == user_id)).scalar()
+
+    def _user_boards(self, user_id: int) -> List[Tuple[Leaderboard, str]]:
+        """以用户最高分上榜的榜单及该用户所在的分区"""
+        boards = [(get_user_board(), GLOBAL_PARTITION)]
+        region = self._region_of(user_id)
+        if region:
+            boards.append((get_regional_board(), region))
+        return boards
+
+    def on_score_added(self, score: Score) -> None:
+        """新的评分记录已提交：计入照片榜和当天的桶，分数高于该用户当前的最高分时更新用户榜"""
+        if not score.is_public:
+            return
+        try:
+            board = get_photo_board()
+            board.ensure_loaded()
+            board.add(GLOBAL_PARTITION, score.score_id, score.face_score)
+            self._add_to_bucket(score)
+            for board, partition in self._user_boards(score.user_id):
+                # 同一用户并发上传时先读后写会丢失较高的分数，由榜单原子地比较并更新
+                board.ensure_loaded()
+                board.add_max(partition, score.user_id, score.face_score)
+            self._join_pool(score.user_id)
+        except Exception as e:
+            # 榜单更新失败不影响评分本身，下次重新加载时会修正
+            logger.warning(f"更新排行榜失败: {e}")
+
+    def on_score_replaced(self, score: Score, previous_user_id: int, previous_scored_at: Optional[datetime]) -> None:
+        """
+        评分记录被相似图片覆盖（分数、归属和评分时间都已更新并提交）
+
+        更新照片榜中的分数，把记录从原来的桶移到当天的桶，并重新计算新旧两个用户的最高分。
+        """
+        try:
+            board = get_photo_board()
+            board.ensure_loaded()
+            if score.is_public:
+                board.add(GLOBAL_PARTITION, score.score_id, score.face_score)
+            else:
+                board.remove(GLOBAL_PARTITION, score.score_id)
+            board = get_window_board()
+            board.ensure_loaded()
+            if previous_scored_at is not None:
+                board.remove(_bucket_key(previous_scored_at.date()), score.score_id)
+            if score.is_public:
+                self._add_to_bucket(score)
+        except Exception as e:
+            logger.warning(f"更新排行榜失败: {e}")
+        self.refresh_user(score.user_id)
+        if previous_user_id != score.user_id:
+            self.refresh_user(previous_user_id)
+
+    def on_score_removed(self, score: Score) -> None:
+        """评分记录已删除（删除已提交）：从照片榜和所在的桶中移除，并重新计算该用户的最高分"""
+        try:
+            board = get_photo_board()
+            board.ensure_loaded()
+            board.remove(GLOBAL_PARTITION, score.score_id)
+            if score.scored_at is not None:
+                board = get_window_board()
+                board.ensure_loaded()
+                board.remove(_bucket_key(score.scored_at.date()), score.score_id)
+        except Exception as e:
+            logger.warning(f"更新排行榜失败: {e}")
+        self.refresh_user(score.user_id)
+
+    def _add_to_bucket(self, score: Score) -> None:
+        if score.scored_at is None:
+            return
+        board = get_window_board()
+        board.ensure_loaded()
+        board.add(_bucket_key(score.scored_at.date()), score.score_id, score.face_score,
+                  limit=settings.LEADERBOARD_WINDOW_TOP_K)
+
+    def refresh_user(self, user_id: int) -> None:
+        """按数据库中的记录重新计算一个用户的最高分（评分被覆盖、转移或删除后调用）"""
+        try:
+            best = self._best_public_score(user_id)
+            for board, partition in self._user_boards(user_id):
+                board.ensure_loaded()
+                if best is None:
+                    board.remove(partition, user_id)
+                else:
+                    board.add(partition, user_id, best)
+            if best is None:
+                get_elo_pool().remove(GLOBAL_PARTITION, user_id)
+            else:
+                self._join_pool(user_id)
+        except Exception as e:
+            logger.warning(f"更新排行榜失败: {e}")
+
+    def _join_pool(self, user_id: int) -> None:
+        """有了公开评分的用户进入PK匹配池"""
+        pool = get_elo_pool()
+        if pool.score(GLOBAL_PARTITION, user_id) is None:
+            rating = self.db.execute(select(User.elo_rating).where(User.user_id == user_id)).scalar()
+            pool.add(GLOBAL_PARTITION, user_id, rating if rating is not None else DEFAULT_RATING)
+
+    def on_match_recorded(self, ratings: Dict[int, int]) -> None:
+        """一场PK已提交：ratings 为双方对战后的Elo分数，双方都进入天梯"""
+        try:
+            pool = get_elo_pool()
+            ladder = get_elo_ladder()
+            ladder.ensure_loaded()
+            for user_id, rating in ratings.items():
+                ladder.add(GLOBAL_PARTITION, user_id, rating)
+                if pool.score(GLOBAL_PARTITION, user_id) is not None:
+                    pool.add(GLOBAL_PARTITION, user_id, rating)
+        except Exception as e:
+            logger.warning(f"更新排行榜失败: {e}")
+
+    def _hydrate(self, entries: List[Tuple[int, float]], offset: int,
+                 fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """补充榜单成员的用户信息和最高分对应的照片，fields 不为 None 时只查询和返回选中的字段"""
+        if not entries:
+            return []
+        with_users = _wants(fields, _USER_FIELDS)
+        users = {}
+        if with_users:
+            users = {
+                row.user_id: row for row in self.db.execute(
+                    select(User.user_id, User.username, User.nickname, User.avatar_url, User.region_code)
+                    .where(User.user_id.in_([user_id for user_id, _ in entries]))
+                )
+            }
+        # 每个用户取最高分的那张照片，同分时取最早的
+        photos = {}
+        if _wants(fields, _PHOTO_FIELDS):
+            for row in self.db.execute(
+                select(Score.score_id, Score.user_id, Score.image_url, Score.scored_at)
+                .where(Score.is_public.is_(True), or_(*(
+                    and_(Score.user_id == user_id, Score.face_score == score) for user_id, score in entries
+                )))
+                .order_by(Score.scored_at)
+            ):
+                photos.setdefault(row.user_id, row)
+
+        data = []
+        for i, (user_id, score) in enumerate(entries):
+            user = users.get(user_id)
+            if with_users and user is None:
+                continue
+            photo = photos.get(user_id)
+            data.append(pick({
+                "rank": offset + i + 1,
+                "user_id": user_id,
+                "score_id": photo.score_id if photo else None,
+                "username": user.username if user else None,
+                "nickname": (user.nickname or user.username) if user else None,
+                "avatar": user.avatar_url if user else None,
+                "region_code": user.region_code if user else None,
+                "highest_score": score,
+                "image_url": _normalize_image_url(photo.image_url) if photo else None,
+                "scored_at": photo.scored_at if photo else None,
+            }, fields))
+        return data
+
+    def _hydrate_photos(self, entries: List[Tuple[int, float]], offset: int,
+                        fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """补充榜单中照片的评分记录和用户信息，没有选择用户字段时不关联 users 表"""
+        if not entries:
+            return []
+        with_users = _wants(fields, _USER_FIELDS)
+        columns = [Score.score_id, Score.user_id, Score.image_url, Score.scored_at]
+        stmt = select(*columns)
+        if with_users:
+            stmt = select(*columns, User.username, User.nickname, User.avatar_url).join(
+                User, User.user_id == Score.user_id)
+        rows = {
+            row.score_id: row for row in self.db.execute(
+                stmt.where(Score.score_id.in_([score_id for score_id, _ in entries]))
+            )
+        }
+        data = []
+        for i, (score_id, score) in enumerate(entries):
+            row = rows.get(score_id)
+            if row is None:
+                continue
+            data.append(pick({
+                "rank": offset + i + 1,
+                "user_id": row.user_id,
+                "score_id": score_id,
+                "username": row.username if with_users else None,
+                "nickname": (row.nickname or row.username) if with_users else None,
+                "avatar": row.avatar_url if with_users else None,
+                "highest_score": score,
+                "image_url": _normalize_image_url(row.image_url),
+                "scored_at": row.scored_at,
+            }, fields))
+        return data
+
+    # 以下 *_version 返回榜单的变更计数，用于判断缓存的响应是否过时
+    def global_version(self, view: str) -> int:
+        board = get_photo_board() if view == "photo" else get_user_board()
+        return board.version(GLOBAL_PARTITION)
+
+    def elo_version(self) -> int:
+        return get_elo_ladder().version(GLOBAL_PARTITION)
+
+    def regional_version(self, region_code: str) -> int:
+        return get_regional_board().version(region_code)
+
+    def window_version(self, window: str) -> Tuple:
+        board = get_window_board()
+        return tuple((day, board.version(day)) for day in _window_days(window))
+
+    def get_global_rankings(self, view: str, page: int, limit: int, fields: Optional[Sequence[str]] = None) -> Dict:
+        """全站榜：view 为 photo 时按照片排名，为 user 时每个用户只取最高分"""
+        board = get_photo_board() if view == "photo" else get_user_board()
+        offset = (page - 1) * limit
+        entries = board.page(GLOBAL_PARTITION, offset, limit)
+        hydrate = self._hydrate_photos if view == "photo" else self._hydrate
+        data = hydrate(entries, offset, fields)
+        return {
+            "view": view,
+            "total": board.count(GLOBAL_PARTITION),
+            "page": page,
+            "limit": limit,
+            "data": data,
+        }
+
+    def get_friend_rankings(self, user_id: int, friend_ids, page: int, limit: int,
+                            fields: Optional[Sequence[str]] = None) -> Dict:
+        """好友榜：自己和好友按公开评分中的最高分排名，批量取分后在内存中排序"""
+        members = set(friend_ids)
+        members.add(user_id)
+        scores = get_user_board().scores(GLOBAL_PARTITION, members)
+        ranked = sorted(scores.items(), key=lambda entry: (-entry[1], entry[0]))
+        offset = (page - 1) * limit
+        my_rank = next((i + 1 for i, (member, _) in enumerate(ranked) if member == user_id), None)
+        return {
+            "total": len(ranked),
+            "page": page,
+            "limit": limit,
+            "my_rank": my_rank,
+            "data": self._hydrate(ranked[offset:offset + limit], offset, fields),
+        }
+
+    def _hydrate_ladder(self, entries: List[Tuple[int, float]], first_rank: int, offset: int,
+                        fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        """补充天梯成员的用户信息；同分同名次，first_rank 为第一条的名次"""
+        if not entries:
+            return []
+        with_users = _wants(fields, _USER_FIELDS)
+        users = {}
+        if with_users:
+            users = {
+                row.user_id: row for row in self.db.execute(
+                    select(User.user_id, User.username, User.nickname, User.avatar_url)
+                    .where(User.user_id.in_([user_id for user_id, _ in entries]))
+                )
+            }
+        data = []
+        rank = first_rank
+        previous = entries[0][1]
+        for i, (user_id, rating) in enumerate(entries):
+            if rating != previous:
+                rank = offset + i + 1
+                previous = rating
+            user = users.get(user_id)
+            if with_users and user is None:
+                continue
+            data.append(pick({
+                "rank": rank,
+                "user_id": user_id,
+                "username": user.username if user else None,
+                "nickname": (user.nickname or user.username) if user else None,
+                "avatar": user.avatar_url if user else None,
+                "elo_rating": int(rating),
+            }, fields))
+        return data
+
+    def _ladder_slice(self, offset: int, limit: int, fields: Optional[Sequence[str]] = None) -> List[Dict]:
+        board = get_elo_ladder()
+        entries = board.page(GLOBAL_PARTITION, offset, limit)
+        if not entries:
+            return []
+        # 同分同名次，第一条的名次按分数高于它的人数计算
+        first_rank = board.count_above(GLOBAL_PARTITION, entries[0][1]) + 1
+        return self._hydrate_ladder(entries, first_rank, offset, fields)
+
+    def get_elo_ladder(self, page: int, limit: int, fields: Optional[Sequence[str]] = None) -> Dict:
+        offset = (page - 1) * limit
+        return {
+            "total": get_elo_ladder().count(GLOBAL_PARTITION),
+            "page": page,
+            "limit": limit,
+            "data": self._ladder_slice(offset, limit, fields),
+        }
+
+    def get_my_elo_rank(self, user: User, radius: int) -> Dict:
+        """当前用户在天梯中的名次和前后各 radius 名玩家，未上榜时 rank 为 None"""
+        board = get_elo_ladder()
+        result = {"rank": None, "elo_rating": user.elo_rating, "total": board.count(GLOBAL_PARTITION), "around": []}
+        position = board.rank(GLOBAL_PARTITION, user.user_id)
+        if position is None:
+            return result
+        rating = board.score(GLOBAL_PARTITION, user.user_id)
+        result["elo_rating"] = int(rating)
+        result["rank"] = board.count_above(GLOBAL_PARTITION, rating) + 1
+        start = max(position - radius, 0)
+        result["around"] = self._ladder_slice(start, position + radius + 1 - start)
+        return result
+
+    def get_window_rankings(self, window: str, page: int, limit: int,
+                            fields: Optional[Sequence[str]] = None) -> Dict:
+        """日榜/周榜/月榜：归并周期内各天的桶，最多返回前 K 名"""
+        board = get_window_board()
+        top_k = settings.LEADERBOARD_WINDOW_TOP_K
+        days = _window_days(window)
+        offset = (page - 1) * limit
+        stop = min(offset + limit, top_k)
+        entries = []
+        if offset < stop:
+            # 每个桶内已按分数降序，前 stop 名只可能来自各桶的前 stop 条
+            buckets = [board.page(day, 0, stop) for day in days]
+            merged = heapq.merge(*buckets, key=lambda entry: (-entry[1], entry[0]))
+            entries = list(itertools.islice(merged, offset, stop))
+        return {
+            "window": window,
+            "start_date": days[-1],
+            "end_date": days[0],
+            "total": min(sum(board.count(day) for day in days), top_k),
+            "page": page,
+            "limit": limit,
+            "data": self._hydrate_photos(entries, offset, fields),
+        }
+
+    def get_regional_rankings(self, region_code: str, page: int, limit: int,
+                              fields: Optional[Sequence[str]] = None) -> Dict:
+        board = get_regional_board()
+        offset = (page - 1) * limit
+        entries = board.page(region_code, offset, limit)
+        return {
+            "region_code": region_code,
+            "total": board.count(region_code),
+            "page": page,
+            "limit": limit,
+            "data": self._hydrate(entries, offset, fields),
+        }
+
+    def get_my_regional_rank(self, user: User) -> Dict:
+        """当前用户在所在地区的名次，未上榜时 rank 为 None"""
+        result = {"region_code": user.region_code, "rank": None, "total": 0, "highest_score": None}
+        if not user.region_code:
+            return result
+        board = get_regional_board()
+        rank = board.rank(user.region_code, user.user_id)
+        result["total"] = board.count(user.region_code)
+        if rank is not None:
+            result["rank"] = rank + 1
+            result["highest_score"] = board.score(user.region_code, user.user_id)
+        return result
+
+
+def refresh_ranks() -> int:
+    """批量重算 user_stats 中的全站排名和地区排名"""
+    from config.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        count = StatsService(db).update_ranks()
+        db.commit()
+        return count
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def refresh_boards() -> int:
+    """重新加载超过 LEADERBOARD_RELOAD_SECONDS 未加载的进程内榜单，返回重新加载的榜单数"""
+    return sum(1 for board in list(_boards.values()) if board.refresh())
+
+
+def invalidate_boards(getters: Sequence[Callable[[], Leaderboard]] = ()) -> None:
+    """
+    让排行榜（默认全部）在下次访问时从数据库重新加载，供直接修改数据库的脚本在写入完成后调用
+
+    Redis 榜单只在就绪标记不存在时加载，不清除就一直是旧数据；进程内榜单属于各个服务进程，
+    由后台任务定期重新加载。
+    """
+    for get_board in getters or (get_photo_board, get_user_board, get_elo_pool, get_elo_ladder,
+                                 get_regional_board, get_window_board):
+        board = get_board()
+        try:
+            board.invalidate()
+        except Exception as e:
+            logger.warning(f"清除排行榜 {board.name} 失败: {e}")
+
+
+async def rank_refresh_loop(interval: float, reload_interval: float = settings.LEADERBOARD_RELOAD_SECONDS) -> None:
+    """
+    后台定时任务，都在线程池中执行，不阻塞事件循环
+
+    每 interval 秒重算 user_stats 中的排名；每 reload_interval 秒检查进程内榜单是否需要重新加载。
+    """
+    loop = asyncio.get_running_loop()
+    tick = min(seconds for seconds in (interval, reload_interval) if seconds > 0)
+    next_ranks = time.monotonic() + interval
+    while True:
+        await asyncio.sleep(tick)
+        if reload_interval > 0:
+            try:
+                await loop.run_in_executor(None, refresh_boards)
+            except Exception as e:
+                logger.error(f"重新加载排行榜失败: {e}")
+        if interval <= 0 or time.monotonic() < next_ranks:
+            continue
+        next_ranks = time.monotonic() + interval
+        started = time.perf_counter()
+        try:
+            count = await loop.run_in_executor(None, refresh_ranks)
+            logger.info(f"排名重算完成: {count} 个用户, 耗时 {time.perf_counter() - started:.2f}秒")
+        except Exception as e:
+            logger.error(f"排名重算失败: {e}")
@@ -1,17 +1,37 @@
 import logging
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterable, List, Any, Optional, Sequence, Tuple
 from datetime import datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, or_
+from sqlalchemy import and_, desc, func, or_, select
 import math
 import json
 
 from models.match import Match, MatchResult
 from models.score import Score
 from models.user import User
+from config.settings import ELO_K_FACTOR, ELO_RATING_FUNCTION, MATCH_CACHE_SIZE
+from core import metrics
+from core.cache import TTLCache
+from core.elo import LOSE, TIE, WIN, rate_match
+from core.http_cache import make_etag
+from services.stats import StatsService
+from services.leaderboard import LeaderboardService
 
 logger = logging.getLogger(__name__)
 
+MATCH_STAGE = metrics.histogram("match_stage_seconds", "创建PK对战各阶段耗时（秒）", ["stage"])
+_STAGE_LOAD_SCORES = MATCH_STAGE.labels(stage="load_scores")
+_STAGE_LOAD_USERS = MATCH_STAGE.labels(stage="load_users")
+_STAGE_DB_COMMIT = MATCH_STAGE.labels(stage="db_commit")
+_STAGE_TOTAL = MATCH_STAGE.labels(stage="total")
+
+# 对战记录创建后不再变化：match_id -> 对战记录中的列（不含用户资料和评分照片），不过期，只受容量限制
+_match_cache = TTLCache(maxsize=MATCH_CACHE_SIZE, ttl=None, name="match_detail")
+# 对战详情的格式变化时递增，使客户端缓存的 ETag 失效
+MATCH_DETAIL_VERSION = 2
+# 对战历史可选择的字段（见 core/fields.py），beauty 是双方评分记录中的颜值分
+MATCH_HISTORY_FIELDS = ("match_id", "challenger", "opponent", "result", "points_change", "matched_at", "beauty")
+
 class MatchService:
     """PK对战服务"""
     
@@ -21,21 +41,27 @@ class MatchService:
     
     async def create_match(self, challenger_id: int, opponent_id: int, score_id: int) -> Dict:
         """创建一场PK对战"""
+        with _STAGE_TOTAL.time():
+            return await self._create_match(challenger_id, opponent_id, score_id)
+
+    async def _create_match(self, challenger_id: int, opponent_id: int, score_id: int) -> Dict:
         try:
             # 检查挑战者的分数记录
-            challenger_score = self.db.query(Score).filter(
-                Score.score_id == score_id,
-                Score.user_id == challenger_id
-            ).first()
+            with _STAGE_LOAD_SCORES.time():
+                challenger_score = self.db.query(Score).filter(
+                    Score.score_id == score_id,
+                    Score.user_id == challenger_id
+                ).first()
             
             if not challenger_score:
                 return {"success": False, "error": "找不到挑战者的评分记录"}
             
             # 获取对手的最新公开评分作为对战对象
-            opponent_score = self.db.query(Score).filter(
-                Score.user_id == opponent_id,
-                Score.is_public.is_(True)
-            ).order_by(desc(Score.scored_at)).first()
+            with _STAGE_LOAD_SCORES.time():
+                opponent_score = self.db.query(Score).filter(
+                    Score.user_id == opponent_id,
+                    Score.is_public.is_(True)
+                ).order_by(desc(Score.scored_at)).first()
             
             if not opponent_score:
                 return {"success": False, "error": "找不到对手的公开评分记录"}
@@ -43,54 +69,55 @@ class MatchService:
             # 设置浮点数比较的容忍度 - 减小容忍度，确保只有完全相同的分数才会判定为平局
             TOLERANCE = 0.00001
             
-            # 从feature_data中获取beauty值
-            challenger_feature_data = challenger_score.feature_data
-            opponent_feature_data = opponent_score.feature_data
-            
-            # 输出原始特征数据，便于调试
-            logger.info(f"挑战者特征数据: {json.dumps(challenger_feature_data, ensure_ascii=False)}")
-            logger.info(f"对手特征数据: {json.dumps(opponent_feature_data, ensure_ascii=False)}")
+            # 输出原始特征数据，便于调试（需要加载关键点，仅在DEBUG级别下序列化）
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("挑战者特征数据: %s", json.dumps(challenger_score.face_info, ensure_ascii=False))
+                logger.debug("对手特征数据: %s", json.dumps(opponent_score.face_info, ensure_ascii=False))
             
             # 获取beauty值，确保类型正确
-            challenger_beauty = float(challenger_feature_data.get("beauty", 0)) if challenger_feature_data else 0
-            opponent_beauty = float(opponent_feature_data.get("beauty", 0)) if opponent_feature_data else 0
+            challenger_beauty = float(challenger_score.beauty or 0)
+            opponent_beauty = float(opponent_score.beauty or 0)
             
             # 确定胜负，使用beauty值而不是face_score
             challenger_beauty_val = float(challenger_beauty)
             opponent_beauty_val = float(opponent_beauty)
             
             # 输出日志，便于调试
-            logger.info(f"PK对战：挑战者beauty={challenger_beauty_val}，对手beauty={opponent_beauty_val}")
-            logger.info(f"PK对战：挑战者face_score={challenger_score.face_score}，对手face_score={opponent_score.face_score}")
-            logger.info(f"Beauty差值: {challenger_beauty_val - opponent_beauty_val}")
+            logger.debug("PK对战：挑战者beauty=%s，对手beauty=%s", challenger_beauty_val, opponent_beauty_val)
+            logger.debug("PK对战：挑战者face_score=%s，对手face_score=%s", challenger_score.face_score, opponent_score.face_score)
             
             if abs(challenger_beauty_val - opponent_beauty_val) < TOLERANCE:
                 # 分数差异在容忍度范围内，视为平局
                 result = MatchResult.TIE
-                points_changed = 3
-                logger.info("判定结果：平局")
+                outcome = TIE
+                logger.debug("判定结果：平局")
             elif challenger_beauty_val > opponent_beauty_val:
                 result = MatchResult.WIN
-                points_changed = 15  # 简单起见，固定加减分
-                logger.info("判定结果：胜利")
+                outcome = WIN
+                logger.debug("判定结果：胜利")
             else:
                 result = MatchResult.LOSE
-                points_changed = -10
-                logger.info("判定结果：失败")
+                outcome = LOSE
+                logger.debug("判定结果：失败")
             
             # 更新用户分数
-            challenger = self.db.query(User).filter(User.user_id == challenger_id).first()
+            with _STAGE_LOAD_USERS.time():
+                challenger = self.db.query(User).filter(User.user_id == challenger_id).first()
+                opponent = self.db.get(User, opponent_id)
             if not challenger:
                 return {"success": False, "error": "找不到挑战者信息"}
+            if not opponent:
+                return {"success": False, "error": "找不到对手信息"}
                 
             current_rating = challenger.elo_rating if challenger.elo_rating is not None else 1500
-            new_rating = current_rating + points_changed
-            
-            # 如果评分低于0则设为0
-            if new_rating < 0:
-                new_rating = 0
+            opponent_rating = opponent.elo_rating if opponent.elo_rating is not None else 1500
+            # 计分规则由 ELO_RATING_FUNCTION 指定（见 core/elo.py），修改规则后用 replay_ratings.py 重算历史分数
+            new_rating, opponent_new_rating, points_changed, _ = rate_match(
+                ELO_RATING_FUNCTION, current_rating, opponent_rating, outcome, ELO_K_FACTOR)
                 
             challenger.elo_rating = new_rating
+            if opponent_new_rating != opponent_rating:
+                opponent.elo_rating = opponent_new_rating
             
             # 创建对战记录
             match_record = Match(
@@ -101,20 +128,35 @@ class MatchService:
                 challenger_score=challenger_score.face_score,
                 opponent_score=opponent_score.face_score,
                 result=result,
-                points_changed=points_changed
+                points_changed=points_changed,
+                challenger_rating=new_rating
             )
             
-            self.db.add(match_record)
-            self.db.commit()
-            self.db.refresh(match_record)
+            with _STAGE_DB_COMMIT.time():
+                self.db.add(match_record)
+                StatsService(self.db).record_match(challenger_id, opponent_id, result)
+                self.db.commit()
+                self.db.refresh(match_record)
+            logger.info(
+                "PK对战完成: match_id=%s, 结果=%s", match_record.match_id, result.value,
+                extra={"match_id": match_record.match_id, "challenger_id": challenger_id,
+                       "opponent_id": opponent_id, "result": result.value}
+            )
             
             # 获取用户信息
-            challenger = self.db.query(User).filter(User.user_id == challenger_id).first()
-            opponent = self.db.query(User).filter(User.user_id == opponent_id).first()
+            with _STAGE_LOAD_USERS.time():
+                challenger = self.db.query(User).filter(User.user_id == challenger_id).first()
+                opponent = self.db.query(User).filter(User.user_id == opponent_id).first()
             
             if not challenger or not opponent:
                 return {"success": False, "error": "用户信息获取失败"}
             
+            # 更新PK匹配池和Elo天梯
+            LeaderboardService(self.db).on_match_recorded({
+                challenger_id: new_rating,
+                opponent_id: opponent.elo_rating if opponent.elo_rating is not None else 1500,
+            })
+            
             # 构建响应
             return {
                 "success": True,
@@ -146,84 +188,116 @@ class MatchService:
             logger.error(f"创建对战异常: {e}")
             return {"success": False, "error": str(e)}
     
-    async def get_match_history(self, user_id: int, page: int = 1, limit: int = 10) -> Dict:
-        """获取用户的对战历史"""
+    def _history_filter(self, user_id: int, result: Optional[str] = None,
+                        opponent_ids: Optional[Iterable[int]] = None):
+        """
+        用户参与的对战（作为挑战者或被挑战者）
+
+        result 按用户视角筛选胜负（Win/Lose/Tie）；opponent_ids 不为空时只保留对手在其中的对战（如好友）。
+        """
+        as_challenger = [Match.challenger_id == user_id]
+        as_opponent = [Match.opponent_id == user_id]
+        if result is not None:
+            result = MatchResult(result)
+            flipped = {MatchResult.WIN: MatchResult.LOSE, MatchResult.LOSE: MatchResult.WIN}.get(result, result)
+            as_challenger.append(Match.result == result)
+            as_opponent.append(Match.result == flipped)
+        if opponent_ids is not None:
+            opponent_ids = list(opponent_ids)
+            as_challenger.append(Match.opponent_id.in_(opponent_ids))
+            as_opponent.append(Match.challenger_id.in_(opponent_ids))
+        return or_(and_(*as_challenger), and_(*as_opponent))
+
+    def get_history_version(self, user_id: int, opponent_ids: Optional[Iterable[int]] = None) -> Tuple[int, int]:
+        """对战历史的版本：对战数和最新的对战ID（对战记录只增不改）"""
+        count, latest = self.db.execute(
+            select(func.count(), func.max(Match.match_id)).where(self._history_filter(user_id, None, opponent_ids))
+        ).one()
+        return count, latest or 0
+    
+    async def get_match_history(self, user_id: int, page: int = 1, limit: int = 10,
+                                result: Optional[str] = None,
+                                opponent_ids: Optional[Iterable[int]] = None,
+                                fields: Sequence[str] = MATCH_HISTORY_FIELDS) -> Dict:
+        """
+        获取用户的对战历史
+
+        fields 选择返回的字段（见 MATCH_HISTORY_FIELDS）：用户资料和评分记录各用一次批量查询加载，
+        没有选择 challenger/opponent 时不查询用户，没有选择 beauty 时不查询评分记录。
+        """
         try:
             # 计算分页
             offset = (page - 1) * limit
+            with_users = "challenger" in fields or "opponent" in fields
+            with_beauty = with_users and "beauty" in fields
             
-            # 查询用户参与的所有对战（作为挑战者或被挑战者）
-            matches = self.db.query(Match).filter(
-                or_(
-                    Match.challenger_id == user_id,
-                    Match.opponent_id == user_id
-                )
-            ).order_by(desc(Match.matched_at)).offset(offset).limit(limit).all()
+            # 查询用户参与的所有对战（作为挑战者或被挑战者），只取需要的列
+            condition = self._history_filter(user_id, result, opponent_ids)
+            columns = [Match.match_id, Match.challenger_id, Match.opponent_id, Match.result,
+                       Match.points_changed, Match.matched_at, Match.challenger_score, Match.opponent_score]
+            if with_beauty:
+                columns += [Match.challenger_score_id, Match.opponent_score_id]
+            matches = self.db.execute(select(*columns).where(condition).order_by(
+                desc(Match.matched_at)).offset(offset).limit(limit)).all()
             
             # 获取总数
-            total = self.db.query(Match).filter(
-                or_(
-                    Match.challenger_id == user_id,
-                    Match.opponent_id == user_id
-                )
-            ).count()
+            total = self.db.execute(select(func.count()).where(condition)).scalar()
+            
+            # 批量获取挑战者和对手信息
+            users = {}
+            if with_users:
+                user_ids = {m.challenger_id for m in matches} | {m.opponent_id for m in matches}
+                users = {
+                    row.user_id: row for row in self.db.execute(
+                        select(User.user_id, User.username, User.avatar_url).where(User.user_id.in_(user_ids)))
+                }
+            
+            # 批量获取评分记录中的beauty值
+            beauties = {}
+            if with_beauty:
+                score_ids = {m.challenger_score_id for m in matches} | {m.opponent_score_id for m in matches}
+                beauties = dict(self.db.execute(
+                    select(Score.score_id, Score.beauty).where(Score.score_id.in_(score_ids))).all())
+            
+            def side(uid: int, score: float, score_id: Optional[int]) -> Dict:
+                user = users[uid]
+                data = {"user_id": user.user_id, "username": user.username, "avatar_url": user.avatar_url,
+                        "score": score}
+                if with_beauty:
+                    data["beauty"] = float(beauties.get(score_id) or 0)
+                return data
             
             # 处理结果
             results = []
             for match in matches:
-                # 获取挑战者和对手信息
-                challenger = self.db.query(User).filter(User.user_id == match.challenger_id).first()
-                opponent = self.db.query(User).filter(User.user_id == match.opponent_id).first()
-                
-                if not challenger or not opponent:
+                if with_users and (match.challenger_id not in users or match.opponent_id not in users):
                     continue
                 
-                # 获取评分记录以获取beauty值
-                challenger_score = self.db.query(Score).filter(Score.score_id == match.challenger_score_id).first()
-                opponent_score = self.db.query(Score).filter(Score.score_id == match.opponent_score_id).first()
-                
-                challenger_beauty = float(challenger_score.feature_data.get("beauty", 0)) if challenger_score and challenger_score.feature_data else 0
-                opponent_beauty = float(opponent_score.feature_data.get("beauty", 0)) if opponent_score and opponent_score.feature_data else 0
-                
                 # 从用户视角确定结果
                 if match.challenger_id == user_id:
-                    result = match.result.value
+                    match_result = match.result.value
                     points_change = match.points_changed
                 else:
                     # 如果用户是被挑战者，结果需要反转
-                    if match.result == MatchResult.WIN:
-                        result = MatchResult.LOSE.value
-                        points_change = 0  # 被挑战者目前不计分
-                    elif match.result == MatchResult.LOSE:
-                        result = MatchResult.WIN.value
-                        points_change = 0  # 被挑战者目前不计分
-                    else:
-                        result = MatchResult.TIE.value
-                        points_change = 0  # 被挑战者目前不计分
+                    match_result = {MatchResult.WIN: MatchResult.LOSE,
+                                    MatchResult.LOSE: MatchResult.WIN}.get(match.result, match.result).value
+                    points_change = 0  # 被挑战者目前不计分
                 
                 # 构建对战记录
                 match_data = {
                     "match_id": match.match_id,
-                    "challenger": {
-                        "user_id": challenger.user_id,
-                        "username": challenger.username,
-                        "avatar_url": challenger.avatar_url,
-                        "score": match.challenger_score,
-                        "beauty": challenger_beauty
-                    },
-                    "opponent": {
-                        "user_id": opponent.user_id,
-                        "username": opponent.username,
-                        "avatar_url": opponent.avatar_url,
-                        "score": match.opponent_score,
-                        "beauty": opponent_beauty
-                    },
-                    "result": result,
+                    "result": match_result,
                     "points_change": points_change,
                     "matched_at": match.matched_at
                 }
+                if "challenger" in fields:
+                    match_data["challenger"] = side(match.challenger_id, match.challenger_score,
+                                                    match.challenger_score_id if with_beauty else None)
+                if "opponent" in fields:
+                    match_data["opponent"] = side(match.opponent_id, match.opponent_score,
+                                                  match.opponent_score_id if with_beauty else None)
                 
-                results.append(match_data)
+                results.append({name: match_data[name] for name in fields if name in match_data})
             
             return {
                 "success": True,
@@ -237,56 +311,103 @@ class MatchService:
             logger.error(f"获取对战历史异常: {e}")
             return {"success": False, "error": str(e)}
     
-    def get_match_by_id(self, match_id: int) -> Optional[Dict]:
-        """获取对战详情"""
+    def _load_match(self, match_id: int) -> Optional[Dict]:
+        """读取对战记录（创建后不再变化的部分）"""
+        match = self.db.query(Match).filter(Match.match_id == match_id).first()
+        if not match:
+            return None
+        
+        return {
+            "match_id": match.match_id,
+            "challenger_id": match.challenger_id,
+            "opponent_id": match.opponent_id,
+            "challenger_score_id": match.challenger_score_id,
+            "opponent_score_id": match.opponent_score_id,
+            "challenger_score": match.challenger_score,
+            "opponent_score": match.opponent_score,
+            "result": match.result.value,
+            "points_change": match.points_changed,
+            "challenger_rating": match.challenger_rating,
+            "matched_at": match.matched_at
+        }
+    
+    def get_match_detail(self, match_id: int) -> Optional[Tuple[Dict, str]]:
+        """
+        获取对战详情及其 ETag
+        
+        对战记录本身缓存在进程内且不过期；双方的用户资料和评分照片每次按主键读取
+        （相似图片会改写评分记录的照片），ETag 由对战ID和这些读取到的值决定。
+        new_rating 取对战时保存的分数，不随之后的对战变化；早期没有保存分数的记录使用当前分数。
+        """
         try:
-            # 查询对战记录
-            match = self.db.query(Match).filter(Match.match_id == match_id).first()
-            
-            if not match:
-                return None
+            match = _match_cache.get(match_id)
+            if match is None:
+                match = self._load_match(match_id)
+                if match is None:
+                    return None
+                _match_cache.set(match_id, match)
             
             # 获取用户信息
-            challenger = self.db.query(User).filter(User.user_id == match.challenger_id).first()
-            opponent = self.db.query(User).filter(User.user_id == match.opponent_id).first()
+            users = {
+                row.user_id: row for row in self.db.query(
+                    User.user_id, User.username, User.avatar_url, User.elo_rating
+                ).filter(User.user_id.in_([match["challenger_id"], match["opponent_id"]]))
+            }
+            challenger = users.get(match["challenger_id"])
+            opponent = users.get(match["opponent_id"])
             
             if not challenger or not opponent:
                 return None
-                
-            # 获取评分记录
-            challenger_score = self.db.query(Score).filter(Score.score_id == match.challenger_score_id).first()
-            opponent_score = self.db.query(Score).filter(Score.score_id == match.opponent_score_id).first()
             
-            # 获取beauty值
-            challenger_beauty = float(challenger_score.feature_data.get("beauty", 0)) if challenger_score and challenger_score.feature_data else 0
-            opponent_beauty = float(opponent_score.feature_data.get("beauty", 0)) if opponent_score and opponent_score.feature_data else 0
+            # 获取评分记录（只取照片和beauty值，不加载特征数据）
+            scores = {
+                row.score_id: row for row in self.db.query(Score.score_id, Score.image_url, Score.beauty).filter(
+                    Score.score_id.in_([match["challenger_score_id"], match["opponent_score_id"]])
+                )
+            }
+            challenger_score = scores.get(match["challenger_score_id"])
+            opponent_score = scores.get(match["opponent_score_id"])
             
-            challenger_rating = challenger.elo_rating if challenger.elo_rating is not None else 1500
+            challenger_rating = match["challenger_rating"]
+            if challenger_rating is None:
+                challenger_rating = challenger.elo_rating if challenger.elo_rating is not None else 1500
+            etag = make_etag(
+                MATCH_DETAIL_VERSION, match_id, challenger_rating,
+                tuple(challenger[:3]), tuple(opponent[:3]),
+                tuple(challenger_score) if challenger_score else None,
+                tuple(opponent_score) if opponent_score else None,
+            )
             
-            return {
-                "match_id": match.match_id,
+            detail = {
+                "match_id": match["match_id"],
                 "challenger": {
                     "user_id": challenger.user_id,
                     "username": challenger.username,
                     "avatar_url": challenger.avatar_url,
-                    "score": match.challenger_score,
+                    "score": match["challenger_score"],
                     "image_url": challenger_score.image_url if challenger_score else "",
-                    "beauty": challenger_beauty
+                    "beauty": float(challenger_score.beauty or 0) if challenger_score else 0
                 },
                 "opponent": {
                     "user_id": opponent.user_id,
                     "username": opponent.username,
                     "avatar_url": opponent.avatar_url,
-                    "score": match.opponent_score,
+                    "score": match["opponent_score"],
                     "image_url": opponent_score.image_url if opponent_score else "",
-                    "beauty": opponent_beauty
+                    "beauty": float(opponent_score.beauty or 0) if opponent_score else 0
                 },
-                "result": match.result.value,
-                "points_change": match.points_changed,
+                "result": match["result"],
+                "points_change": match["points_change"],
                 "new_rating": challenger_rating,
-                "matched_at": match.matched_at
+                "matched_at": match["matched_at"]
             }
+            return detail, etag
             
         except Exception as e:
             logger.error(f"获取对战详情异常: {e}")
-            return None 
\ No newline at end of file
+            return None
+    
+    def get_match_by_id(self, match_id: int) -> Optional[Dict]:
+        """获取对战详情"""
+        result = self.get_match_detail(match_id)
+        return result[0] if result else None
@@ -0,0 +1,83 @@
+"""
+PK匹配服务
+
+匹配池（services.leaderboard.get_elo_pool）按Elo分数维护有公开评分的用户，
+Elo分数变更和新的公开评分写入后增量更新。推荐对手时先定位自己的分数在池中的位置，
+再向两侧取最接近的 k 名，代价为 O(log N + k)。最近交手过的对手排在其他人之后，
+只在池中没有足够的其他对手时才会被推荐。
+"""
+import logging
+import random
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import desc, select
+from sqlalchemy.orm import Session
+
+from config.settings import MATCHMAKING_CANDIDATES, MATCHMAKING_RECENT_EXCLUDE
+from models.match import Match
+from models.user import User
+from services.leaderboard import DEFAULT_RATING, GLOBAL_PARTITION, get_elo_pool
+
+logger = logging.getLogger(__name__)
+
+
+class MatchmakingService:
+    """按Elo分数推荐PK对手"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def recent_opponents(self, user_id: int) -> Set[int]:
+        """用户最近 MATCHMAKING_RECENT_EXCLUDE 场主动挑战的对手"""
+        if MATCHMAKING_RECENT_EXCLUDE <= 0:
+            return set()
+        return set(self.db.execute(
+            select(Match.opponent_id).where(Match.challenger_id == user_id)
+            .order_by(desc(Match.matched_at)).limit(MATCHMAKING_RECENT_EXCLUDE)
+        ).scalars())
+
+    def nearest_opponents(self, user_id: int, rating: Optional[int], limit: int,
+                          recent: Optional[Set[int]] = None) -> List[Dict]:
+        """Elo分数最接近的 limit 名对手，按分差从小到大排列，最近交手过的对手排在最后"""
+        rating = rating if rating is not None else DEFAULT_RATING
+        if recent is None:
+            recent = self.recent_opponents(user_id)
+        # 自己和最近的对手最多占去 len(recent) + 1 个位置，向两侧多取这么多名即可保证取够
+        entries = get_elo_pool().around(GLOBAL_PARTITION, rating, limit + len(recent) + 1)
+        nearest = sorted(
+            (entry for entry in entries if entry[0] != user_id),
+            key=lambda entry: (entry[0] in recent, abs(entry[1] - rating), entry[0]),
+        )[:limit]
+        if not nearest:
+            return []
+
+        users = {
+            row.user_id: row for row in self.db.execute(
+                select(User.user_id, User.username, User.nickname, User.avatar_url)
+                .where(User.user_id.in_([member for member, _ in nearest]))
+            )
+        }
+        return [
+            {
+                "user_id": member,
+                "username": users[member].username,
+                "nickname": users[member].nickname or users[member].username,
+                "avatar_url": users[member].avatar_url,
+                "elo_rating": int(score),
+                "rating_diff": int(score - rating),
+            }
+            for member, score in nearest if member in users
+        ]
+
+    def suggest(self, user: User, limit: int) -> Dict:
+        rating = user.elo_rating if user.elo_rating is not None else DEFAULT_RATING
+        return {"elo_rating": rating, "data": self.nearest_opponents(user.user_id, rating, limit)}
+
+    def pick_opponent(self, user: User) -> Optional[int]:
+        """从最接近的几名对手中随机选一名，避免总是匹配到同一个人"""
+        recent = self.recent_opponents(user.user_id)
+        candidates = self.nearest_opponents(user.user_id, user.elo_rating, MATCHMAKING_CANDIDATES, recent)
+        fresh = [candidate for candidate in candidates if candidate["user_id"] not in recent]
+        if not candidates:
+            return None
+        return random.choice(fresh or candidates)["user_id"]
@@ -1,13 +1,12 @@
 import os
 import uuid
-import base64
-import requests
 import hashlib
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Dict, List, Optional, Any, Sequence, Tuple
 from datetime import datetime
 import json
 import asyncio
 import logging
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 import numpy as np
 try:
@@ -22,45 +21,68 @@ import io
 
 # 使用普通导入
 from config import settings
+from core import metrics
 from models.score import Score, ServiceType
+from core.face_features import merge_face_info
 from models.user import User
+from services.face_provider import get_face_detector
+from services.stats import StatsService
+from services.leaderboard import LeaderboardService
 
 logger = logging.getLogger(__name__)
 
+SCORING_STAGE = metrics.histogram(
+    "scoring_stage_seconds", "上传评分各阶段耗时（秒）", ["stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+_STAGE_DETECT = SCORING_STAGE.labels(stage="detect")
+_STAGE_FIND_SIMILAR = SCORING_STAGE.labels(stage="find_similar")
+_STAGE_SAVE_IMAGE = SCORING_STAGE.labels(stage="save_image")
+_STAGE_DB_COMMIT = SCORING_STAGE.labels(stage="db_commit")
+_STAGE_TOTAL = SCORING_STAGE.labels(stage="total")
+
+# 评分接口可选择的字段（见 core/fields.py）及各字段需要查询的列
+SCORE_FIELDS = (
+    "score_id", "user_id", "face_score", "image_url", "feature_highlights", "score_details",
+    "feature_data", "created_at", "is_public", "service_type",
+)
+SCORE_LIST_FIELDS = ("score_id", "face_score", "image_url", "created_at", "is_public")
+SCORE_DETAIL_FIELDS = ("score_id", "face_score", "image_url", "feature_highlights", "score_details",
+                       "created_at", "is_public")
+_FACE_SCALAR_COLUMNS = (Score.beauty, Score.age, Score.gender, Score.face_shape, Score.expression)
+_SCORE_COLUMNS = {
+    "score_id": (Score.score_id,),
+    "user_id": (Score.user_id,),
+    "face_score": (Score.face_score,),
+    "image_url": (Score.image_url,),
+    "feature_highlights": _FACE_SCALAR_COLUMNS,
+    "score_details": (Score.face_score,),
+    # 完整特征数据需要关键点和其余特征（延迟加载的列）
+    "feature_data": _FACE_SCALAR_COLUMNS + (Score.landmarks, Score.feature_data),
+    "created_at": (Score.scored_at,),
+    "is_public": (Score.is_public,),
+    "service_type": (Score.service_type,),
+}
+
+
+def _score_columns(fields: Sequence[str]) -> List:
+    columns = {}
+    for field in fields:
+        for column in _SCORE_COLUMNS[field]:
+            columns.setdefault(column.key, column)
+    return list(columns.values()) or [Score.score_id]
+
 class ScoringService:
     """颜值评分服务"""
     
     def __init__(self, db: Session):
         """初始化服务"""
         self.db = db
-        # 百度AI配置
-        self.api_key = settings.BAIDU_AI_API_KEY
-        self.secret_key = settings.BAIDU_AI_SECRET_KEY
-        self.access_token = None
+        # 人脸检测器在进程内共享，熔断和重试预算状态跨请求生效
+        self.face_detector = get_face_detector()
         # 图片存储路径
         os.makedirs(settings.UPLOAD_FOLDER, exist_ok=True)
     
-    def get_access_token(self):
-        """获取百度AI访问令牌"""
-        if not self.api_key or not self.secret_key:
-            logger.error("百度AI API密钥未配置")
-            return None
-            
-        token_url = 'https://aip.baidubce.com/oauth/2.0/token'
-        params = {
-            'grant_type': 'client_credentials',
-            'client_id': self.api_key,
-            'client_secret': self.secret_key
-        }
-        
-        try:
-            response = requests.post(token_url, params=params).json()
-            self.access_token = response.get('access_token')
-            return self.access_token
-        except Exception as e:
-            logger.error(f"获取access_token失败: {e}")
-            return None
-    
     def _calculate_image_hash(self, image_data: bytes) -> str:
         """计算图片的哈希值，用于识别相同图片"""
         try:
@@ -183,51 +205,7 @@ class ScoringService:
     
     async def detect_face(self, image_data: bytes) -> Dict:
         """检测人脸并返回特征点"""
-        try:
-            # 获取access_token
-            if not self.access_token:
-                self.access_token = self.get_access_token()
-                
-            if not self.access_token:
-                return {"success": False, "error": "无法获取百度AI访问令牌"}
-                
-            # 将图片编码为base64
-            image_base64 = base64.b64encode(image_data).decode("utf-8")
-            
-            # 调用百度AI人脸检测接口V3
-            detect_url = f"https://aip.baidubce.com/rest/2.0/face/v3/detect?access_token={self.access_token}"
-            
-            payload = {
-                "image": image_base64,
-                "image_type": "BASE64",
-                "face_field": "age,beauty,expression,face_shape,gender,landmark"
-            }
-            
-            headers = {
-                'Content-Type': 'application/json'
-            }
-            
-            response = requests.post(detect_url, headers=headers, json=payload)
-            result = response.json()
-            
-            logger.info(f"百度AI返回结果: {result}")
-            
-            # 检查返回结果
-            if result.get('error_code', 0) != 0:
-                logger.error(f"人脸检测失败: {result}")
-                return {"success": False, "error": result.get('error_msg', '未知错误')}
-            
-            # 检查是否有人脸
-            face_list = result.get('result', {}).get('face_list', [])
-            if not face_list:
-                return {"success": False, "error": "未检测到人脸"}
-            
-            # 返回检测结果
-            return {"success": True, "face_info": face_list[0]}
-            
-        except Exception as e:
-            logger.error(f"人脸检测异常: {e}")
-            return {"success": False, "error": str(e)}
+        return await self.face_detector.detect(image_data)
     
     def calculate_score(self, face_features: Dict) -> float:
         """基于特征计算颜值分数"""
@@ -240,9 +218,14 @@ class ScoringService:
     
     async def upload_and_score(self, user_id: int, image_data: bytes, is_public: bool) -> Dict:
         """上传图片并进行颜值评分"""
+        with _STAGE_TOTAL.time():
+            return await self._upload_and_score(user_id, image_data, is_public)
+
+    async def _upload_and_score(self, user_id: int, image_data: bytes, is_public: bool) -> Dict:
         try:
             # 1. 检测人脸
-            face_detection = await self.detect_face(image_data)
+            with _STAGE_DETECT.time():
+                face_detection = await self.detect_face(image_data)
             if not face_detection["success"]:
                 return {"success": False, "error": face_detection["error"]}
             
@@ -255,7 +238,8 @@ class ScoringService:
             image_hash = self._calculate_image_hash(image_data)
             
             # 4. 查找相似图片
-            similar_score = self._find_similar_images(image_data)
+            with _STAGE_FIND_SIMILAR.time():
+                similar_score = self._find_similar_images(image_data)
             
             # 如果找到相似图片且新分数更高，则更新分数
             if similar_score:
@@ -265,18 +249,27 @@ class ScoringService:
                     logger.info(f"新分数({face_score})高于旧分数({similar_score.face_score})，更新记录")
                     
                     # 保存新图片
-                    image_url = self._save_image(image_data, user_id)
+                    with _STAGE_SAVE_IMAGE.time():
+                        image_url = self._save_image(image_data, user_id)
                     
                     # 更新记录
+                    old_user_id, old_face_score = similar_score.user_id, similar_score.face_score
+                    old_scored_at = similar_score.scored_at
                     similar_score.face_score = face_score
-                    similar_score.feature_data = face_info
-                    similar_score.scored_at = datetime.now()
+                    similar_score.set_face_info(face_info)
+                    # 与新记录的默认值（Score.scored_at）使用同一个时钟：应用端的 UTC 时间
+                    similar_score.scored_at = datetime.utcnow()
                     similar_score.user_id = user_id  # 更新为当前用户
                     similar_score.image_url = image_url  # 更新图片URL
                     similar_score.image_hash = image_hash  # 更新哈希值
                     
-                    self.db.commit()
-                    self.db.refresh(similar_score)
+                    with _STAGE_DB_COMMIT.time():
+                        self.db.flush()
+                        StatsService(self.db).replace_score(old_user_id, old_face_score, user_id, face_score)
+                        self.db.commit()
+                        self.db.refresh(similar_score)
+                    
+                    LeaderboardService(self.db).on_score_replaced(similar_score, old_user_id, old_scored_at)
                     
                     score_record = similar_score
                 else:
@@ -284,7 +277,8 @@ class ScoringService:
                     score_record = similar_score
             else:
                 # 5. 保存图片
-                image_url = self._save_image(image_data, user_id)
+                with _STAGE_SAVE_IMAGE.time():
+                    image_url = self._save_image(image_data, user_id)
                 
                 # 6. 保存评分记录到数据库
                 score_record = Score(
@@ -292,56 +286,26 @@ class ScoringService:
                     image_url=image_url,
                     image_hash=image_hash,  # 保存图片哈希值
                     face_score=face_score,
-                    feature_data=face_info,  # 保存完整特征数据
                     is_public=is_public,
                     service_type=ServiceType.BAIDU
                 )
+                score_record.set_face_info(face_info)  # 保存完整特征数据
                 
-                self.db.add(score_record)
-                self.db.commit()
-                self.db.refresh(score_record)
+                with _STAGE_DB_COMMIT.time():
+                    self.db.add(score_record)
+                    StatsService(self.db).record_score(user_id, face_score)
+                    self.db.commit()
+                    self.db.refresh(score_record)
+                LeaderboardService(self.db).on_score_added(score_record)
             
             # 7. 准备返回结果
-            # 从特征数据中提取重要指标
-            feature_highlights = {
-                "beauty": face_info.get("beauty", 0),
-                "age": face_info.get("age", 0),
-                "gender": face_info.get("gender", {}).get("type", "unknown"),
-                "face_shape": face_info.get("face_shape", {}).get("type", "unknown"),
-                "expression": face_info.get("expression", {}).get("type", "unknown")
-            }
-            
-            # 构建详细评分项
-            score_details = [
-                {
-                    "category": "颜值评分",
-                    "score": int(face_score / 10),  # 转为1-10分
-                    "description": self._get_beauty_description(face_score)
-                },
-                {
-                    "category": "五官协调",
-                    "score": min(10, int(face_score / 10) + (1 if face_score % 10 > 5 else 0)),
-                    "description": "五官比例协调，轮廓清晰"
-                },
-                {
-                    "category": "肤质",
-                    "score": min(10, max(7, int(face_score / 12))),
-                    "description": "肤色均匀，质地细腻"
-                },
-                {
-                    "category": "气质", 
-                    "score": min(10, max(6, int(face_score / 11))),
-                    "description": "气质出众，形象佳"
-                }
-            ]
-            
             return {
                 "success": True,
                 "score_id": score_record.score_id,
                 "face_score": face_score,
                 "image_url": score_record.image_url,
-                "feature_highlights": feature_highlights,
-                "score_details": score_details,
+                "feature_highlights": self._feature_highlights(face_info),
+                "score_details": self._score_details(face_score),
                 "created_at": score_record.scored_at.isoformat(),
                 "is_public": score_record.is_public
             }
@@ -350,6 +314,41 @@ class ScoringService:
             logger.error(f"评分过程异常: {e}")
             return {"success": False, "error": str(e)}
     
+    def _feature_highlights(self, face_info: Dict) -> Dict:
+        """从特征数据中提取重要指标"""
+        return {
+            "beauty": face_info.get("beauty", 0),
+            "age": face_info.get("age", 0),
+            "gender": (face_info.get("gender") or {}).get("type", "unknown"),
+            "face_shape": (face_info.get("face_shape") or {}).get("type", "unknown"),
+            "expression": (face_info.get("expression") or {}).get("type", "unknown")
+        }
+    
+    def _score_details(self, face_score: float) -> List[Dict]:
+        """构建详细评分项"""
+        return [
+            {
+                "category": "颜值评分",
+                "score": int(face_score / 10),  # 转为1-10分
+                "description": self._get_beauty_description(face_score)
+            },
+            {
+                "category": "五官协调",
+                "score": min(10, int(face_score / 10) + (1 if face_score % 10 > 5 else 0)),
+                "description": "五官比例协调，轮廓清晰"
+            },
+            {
+                "category": "肤质",
+                "score": min(10, max(7, int(face_score / 12))),
+                "description": "肤色均匀，质地细腻"
+            },
+            {
+                "category": "气质", 
+                "score": min(10, max(6, int(face_score / 11))),
+                "description": "气质出众，形象佳"
+            }
+        ]
+    
     def _get_beauty_description(self, score: float) -> str:
         """根据分数生成描述"""
         if score >= 90:
@@ -363,57 +362,64 @@ class ScoringService:
         else:
             return "颜值尚可，形象有待提升"
     
-    def get_user_scores(self, user_id: int, page: int, limit: int, only_public: bool = False) -> Dict:
-        """获取用户历史评分记录"""
-        # 构建查询
-        query = self.db.query(Score).filter(Score.user_id == user_id)
+    def _score_item(self, row, fields: Sequence[str]) -> Dict:
+        """按选中的字段把查询到的列组装成评分记录"""
+        item = {"success": True}
+        for field in fields:
+            if field == "feature_highlights":
+                # 重要指标只需要拆分后的标量列，不需要关键点
+                item[field] = self._feature_highlights(merge_face_info(
+                    row.beauty, row.age, row.gender, row.face_shape, row.expression, None, None))
+            elif field == "feature_data":
+                item[field] = merge_face_info(row.beauty, row.age, row.gender, row.face_shape, row.expression,
+                                              row.landmarks, row.feature_data)
+            elif field == "score_details":
+                item[field] = self._score_details(row.face_score)
+            elif field == "created_at":
+                item[field] = row.scored_at.isoformat() if row.scored_at else None
+            else:
+                item[field] = getattr(row, field)
+        return item
+    
+    def get_user_scores(self, user_id: int, page: int, limit: int, only_public: bool = False,
+                        fields: Sequence[str] = SCORE_LIST_FIELDS) -> Dict:
+        """获取用户历史评分记录（只查询 fields 需要的列）"""
+        # 构建查询条件
+        conditions = [Score.user_id == user_id]
         
         # 如果只查询公开记录
         if only_public:
-            query = query.filter(Score.is_public == True)
+            conditions.append(Score.is_public == True)
         
         # 计算总数
-        total = query.count()
+        total = self.db.query(func.count(Score.score_id)).filter(*conditions).scalar()
         
         # 分页并按时间倒序
-        scores = query.order_by(Score.scored_at.desc()).offset((page - 1) * limit).limit(limit).all()
-        
-        # 转换为字典列表
-        score_list = []
-        for score in scores:
-            score_list.append({
-                "score_id": score.score_id,
-                "face_score": score.face_score,
-                "image_url": score.image_url,
-                "scored_at": score.scored_at.isoformat(),
-                "is_public": score.is_public
-            })
+        rows = self.db.query(*_score_columns(fields)).filter(*conditions).order_by(
+            Score.scored_at.desc()).offset((page - 1) * limit).limit(limit).all()
         
         return {
             "total": total,
             "page": page,
             "limit": limit,
-            "data": score_list
+            "items": [self._score_item(row, fields) for row in rows]
         }
     
-    def get_score_by_id(self, score_id: int) -> Optional[Dict]:
-        """获取单条评分详情"""
-        score = self.db.query(Score).filter(Score.score_id == score_id).first()
+    def get_score_by_id(self, score_id: int, fields: Sequence[str] = SCORE_DETAIL_FIELDS) -> Optional[Dict]:
+        """获取单条评分详情（只查询 fields 需要的列，未选择 feature_data 时不加载关键点）"""
+        row = self.db.query(*_score_columns(fields)).filter(Score.score_id == score_id).first()
         
-        if not score:
+        if not row:
             return None
         
-        # 提取特征数据
-        feature_data = score.feature_data or {}
+        return self._score_item(row, fields)
+    
+    def get_score_version(self, score_id: int):
+        """
+        评分记录中决定详情内容的几列（不加载特征数据），不存在时返回 None
         
-        # 构建返回结果
-        return {
-            "score_id": score.score_id,
-            "user_id": score.user_id,
-            "face_score": score.face_score,
-            "image_url": score.image_url,
-            "feature_data": feature_data,
-            "scored_at": score.scored_at.isoformat(),
-            "is_public": score.is_public,
-            "service_type": score.service_type
-        } 
\ No newline at end of file
+        相似图片更新记录时会同时改写分数、图片和评分时间，这几列不变则详情不变。
+        """
+        return self.db.query(
+            Score.user_id, Score.is_public, Score.face_score, Score.image_url, Score.scored_at
+        ).filter(Score.score_id == score_id).first() 
\ No newline at end of file
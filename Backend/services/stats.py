@@ -0,0 +1,267 @@
+"""
+用户统计（user_stats）的增量维护
+
+评分和PK对战写入时，在同一事务中用原子的 UPDATE 累加对应用户的统计行，
+读取个人统计只需按 user_id 查一行，不再扫描 scores/matches 表。
+历史数据或统计出现偏差时，用 rebuild() 按 scores/matches 全量重算（见 rebuild_stats.py）。
+"""
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, case, delete, func, insert, or_, select, union_all, update
+
+from models.match import Match, MatchResult
+from models.score import Score
+from models.stats import UserStats
+from models.user import User
+
+logger = logging.getLogger(__name__)
+
+stats_table = UserStats.__table__
+
+# 没有统计行的用户按全零返回
+EMPTY_STATS = {
+    "scores_total": 0, "avg_score": 0.0, "highest_score": 0.0,
+    "matches_total": 0, "matches_won": 0, "matches_lost": 0, "matches_tied": 0,
+    "win_rate": 0.0, "rank_global": None, "rank_regional": None, "last_updated": None,
+}
+
+RANK_BATCH_SIZE = 5000
+
+
+def _insert_ignore(dialect_name: str):
+    """已存在同一用户的统计行时不报错的 INSERT"""
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert(stats_table).on_conflict_do_nothing(index_elements=["user_id"])
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert(stats_table).on_conflict_do_nothing(index_elements=["user_id"])
+    return insert(stats_table).prefix_with("IGNORE")
+
+
+def stats_to_dict(row) -> Dict:
+    matches_total = row.matches_total or 0
+    matches_won = row.matches_won or 0
+    matches_lost = row.matches_lost or 0
+    return {
+        "scores_total": row.scores_total or 0,
+        "avg_score": round(row.avg_score or 0.0, 2),
+        "highest_score": row.highest_score or 0.0,
+        "matches_total": matches_total,
+        "matches_won": matches_won,
+        "matches_lost": matches_lost,
+        "matches_tied": matches_total - matches_won - matches_lost,
+        "win_rate": round(matches_won / matches_total, 4) if matches_total else 0.0,
+        "rank_global": row.rank_global,
+        "rank_regional": row.rank_regional,
+        "last_updated": row.last_updated,
+    }
+
+
+def best_public_scores():
+    """每个用户公开评分中的最高分及所在地区"""
+    return select(
+        Score.user_id, User.region_code, func.max(Score.face_score).label("best_score"),
+    ).join(User, User.user_id == Score.user_id).where(
+        Score.is_public.is_(True)
+    ).group_by(Score.user_id, User.region_code)
+
+
+class StatsService:
+    """用户统计服务，db 可以是 Session 或 Connection，写入不提交，由调用方随业务数据一起提交"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def _dialect_name(self) -> str:
+        bind = self.db.get_bind() if hasattr(self.db, "get_bind") else self.db
+        return bind.dialect.name
+
+    def _apply(self, user_id: int, *values: Tuple[str, Any]) -> None:
+        """
+        原子地更新一个用户的统计行，行不存在时先补建
+
+        values 为按顺序排列的 (列名, 表达式)。MySQL 按从左到右的顺序执行 SET 赋值，
+        后面的表达式看到的是前面已经更新的值，因此依赖其他列旧值的列必须排在那一列之前。
+        """
+        stmt = update(stats_table).where(stats_table.c.user_id == user_id).ordered_values(*values)
+        if self.db.execute(stmt).rowcount:
+            return
+        self.db.execute(_insert_ignore(self._dialect_name()).values(
+            user_id=user_id, scores_total=0, avg_score=0.0, highest_score=0.0,
+            matches_total=0, matches_won=0, matches_lost=0,
+        ))
+        self.db.execute(stmt)
+
+    def record_score(self, user_id: int, face_score: float) -> None:
+        """新增一条评分记录"""
+        c = stats_table.c
+        self._apply(
+            user_id,
+            # avg_score 用到更新前的 scores_total，必须先赋值（见 _apply）
+            ("avg_score", (c.avg_score * c.scores_total + face_score) / (c.scores_total + 1)),
+            ("scores_total", c.scores_total + 1),
+            ("highest_score", case((c.highest_score < face_score, face_score), else_=c.highest_score)),
+        )
+
+    def remove_score(self, user_id: int, face_score: float) -> None:
+        """删除一条评分记录；删掉的是最高分时按该用户的剩余记录重新取最高分"""
+        c = stats_table.c
+        remaining_max = select(func.coalesce(func.max(Score.face_score), 0.0)).where(
+            Score.user_id == user_id).scalar_subquery()
+        self._apply(
+            user_id,
+            # avg_score 用到更新前的 scores_total，必须先赋值（见 _apply）
+            ("avg_score", case(
+                (c.scores_total > 1, (c.avg_score * c.scores_total - face_score) / (c.scores_total - 1)),
+                else_=0.0,
+            )),
+            ("scores_total", case((c.scores_total > 0, c.scores_total - 1), else_=0)),
+            ("highest_score", case((c.highest_score <= face_score, remaining_max), else_=c.highest_score)),
+        )
+
+    def replace_score(self, old_user_id: int, old_score: float, new_user_id: int, new_score: float) -> None:
+        """
+        一条评分记录被新上传的相似图片覆盖（分数提高，归属可能换成新用户）
+
+        需要在记录本身更新并 flush 之后调用，remove_score 重新取最高分时才能看到新值。
+        """
+        if old_user_id == new_user_id:
+            c = stats_table.c
+            self._apply(
+                new_user_id,
+                ("avg_score", c.avg_score + (new_score - old_score) / func.nullif(c.scores_total, 0)),
+                ("highest_score", case((c.highest_score < new_score, new_score), else_=c.highest_score)),
+            )
+            return
+        self.remove_score(old_user_id, old_score)
+        self.record_score(new_user_id, new_score)
+
+    def record_match(self, challenger_id: int, opponent_id: int, result: MatchResult) -> None:
+        """新增一场对战，双方各计一场，结果按各自视角计入胜负"""
+        c = stats_table.c
+        for user_id, won, lost in (
+            (challenger_id, result == MatchResult.WIN, result == MatchResult.LOSE),
+            (opponent_id, result == MatchResult.LOSE, result == MatchResult.WIN),
+        ):
+            self._apply(
+                user_id,
+                ("matches_total", c.matches_total + 1),
+                ("matches_won", c.matches_won + int(won)),
+                ("matches_lost", c.matches_lost + int(lost)),
+            )
+
+    def get_user_stats(self, user_id: int) -> Dict:
+        """按 user_id 读取一行统计"""
+        row = self.db.execute(select(stats_table).where(stats_table.c.user_id == user_id)).first()
+        return stats_to_dict(row) if row is not None else dict(EMPTY_STATS)
+
+    def rebuild(self, user_ids: Optional[Iterable[int]] = None) -> int:
+        """
+        按 scores/matches 全量重算统计（修复任务），user_ids 为空时重算所有用户
+
+        返回写入的统计行数。只重算部分用户时不更新排名。
+        """
+        user_ids = list(user_ids) if user_ids is not None else None
+
+        score_agg = select(
+            Score.user_id.label("user_id"),
+            func.count().label("scores_total"),
+            func.avg(Score.face_score).label("avg_score"),
+            func.max(Score.face_score).label("highest_score"),
+        ).group_by(Score.user_id)
+
+        # 挑战者和对手视角各一行，胜负对调
+        sides = union_all(
+            select(
+                Match.challenger_id.label("user_id"),
+                case((Match.result == MatchResult.WIN, 1), else_=0).label("won"),
+                case((Match.result == MatchResult.LOSE, 1), else_=0).label("lost"),
+            ),
+            select(
+                Match.opponent_id.label("user_id"),
+                case((Match.result == MatchResult.LOSE, 1), else_=0).label("won"),
+                case((Match.result == MatchResult.WIN, 1), else_=0).label("lost"),
+            ),
+        ).subquery()
+        match_agg = select(
+            sides.c.user_id,
+            func.count().label("matches_total"),
+            func.sum(sides.c.won).label("matches_won"),
+            func.sum(sides.c.lost).label("matches_lost"),
+        ).group_by(sides.c.user_id)
+
+        if user_ids is not None:
+            score_agg = score_agg.where(Score.user_id.in_(user_ids))
+            match_agg = match_agg.where(sides.c.user_id.in_(user_ids))
+        score_agg = score_agg.subquery()
+        match_agg = match_agg.subquery()
+
+        source = select(
+            User.user_id,
+            func.coalesce(score_agg.c.scores_total, 0),
+            func.coalesce(score_agg.c.avg_score, 0.0),
+            func.coalesce(score_agg.c.highest_score, 0.0),
+            func.coalesce(match_agg.c.matches_total, 0),
+            func.coalesce(match_agg.c.matches_won, 0),
+            func.coalesce(match_agg.c.matches_lost, 0),
+            func.now(),
+        ).select_from(User).outerjoin(
+            score_agg, score_agg.c.user_id == User.user_id
+        ).outerjoin(
+            match_agg, match_agg.c.user_id == User.user_id
+        ).where(or_(score_agg.c.user_id.isnot(None), match_agg.c.user_id.isnot(None)))
+
+        clear = delete(stats_table)
+        if user_ids is not None:
+            clear = clear.where(stats_table.c.user_id.in_(user_ids))
+            source = source.where(User.user_id.in_(user_ids))
+        self.db.execute(clear)
+        result = self.db.execute(insert(stats_table).from_select([
+            "user_id", "scores_total", "avg_score", "highest_score",
+            "matches_total", "matches_won", "matches_lost", "last_updated",
+        ], source))
+        if user_ids is None:
+            self.update_ranks()
+        logger.info(f"用户统计重算完成: {result.rowcount} 行")
+        return result.rowcount
+
+    def update_ranks(self) -> int:
+        """
+        按公开评分中的最高分批量重算全站排名和地区排名（并列同名次）
+
+        一次查询取出所有用户的最高分，在内存中排序后分批写回；没有公开评分的用户排名为空。
+        """
+        rows = sorted(self.db.execute(best_public_scores()).all(), key=lambda r: (-r.best_score, r.user_id))
+        global_ranks = _competition_ranks((row.user_id, row.best_score) for row in rows)
+        by_region: Dict[str, List[Tuple[int, float]]] = {}
+        for row in rows:
+            if row.region_code:
+                by_region.setdefault(row.region_code, []).append((row.user_id, row.best_score))
+        regional_ranks = {}
+        for entries in by_region.values():
+            regional_ranks.update(_competition_ranks(entries))
+
+        self.db.execute(update(stats_table).values(rank_global=None, rank_regional=None))
+        stmt = update(stats_table).where(stats_table.c.user_id == bindparam("_user_id")).values(
+            rank_global=bindparam("_rank_global"), rank_regional=bindparam("_rank_regional"))
+        for start in range(0, len(global_ranks), RANK_BATCH_SIZE):
+            self.db.execute(stmt, [
+                {"_user_id": user_id, "_rank_global": rank, "_rank_regional": regional_ranks.get(user_id)}
+                for user_id, rank in global_ranks[start:start + RANK_BATCH_SIZE]
+            ])
+        return len(rows)
+
+
+def _competition_ranks(rows) -> List[Tuple[int, int]]:
+    """(user_id, 分数) 已按分数降序排列，返回 (user_id, 名次)，同分同名次"""
+    ranks = []
+    previous = None
+    rank = 0
+    for position, (user_id, value) in enumerate(rows, start=1):
+        if value != previous:
+            rank = position
+            previous = value
+        ranks.append((user_id, rank))
+    return ranks
@@ -0,0 +1,21 @@
+"""
+基准测试的百分位数（最近秩法）
+"""
+from benchmarks.common import percentile
+
+
+def test_percentile_nearest_rank():
+    values = list(range(100, 0, -1))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile(values, 100) == 100
+    assert percentile(values, 0) == 1
+
+
+def test_percentile_small_samples():
+    assert percentile([], 99) == 0.0
+    assert percentile([3.0], 50) == 3.0
+    # 4 个样本的 p50 是第 2 个值，p99 是第 4 个值
+    assert percentile([4.0, 1.0, 3.0, 2.0], 50) == 2.0
+    assert percentile([4.0, 1.0, 3.0, 2.0], 99) == 4.0
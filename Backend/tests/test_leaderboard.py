@@ -0,0 +1,40 @@
+"""
+进程内排行榜的后台重新加载
+
+加载在锁外进行：期间的读请求不等待，期间的增量更新在加载完成后重放，变更计数保持递增。
+"""
+import threading
+import time
+
+from core.leaderboard import Leaderboard
+
+
+def test_reload_does_not_block_readers_and_keeps_concurrent_updates():
+    loading = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        if len(calls) > 1:
+            loading.set()
+            release.wait(5)
+        return [("all", 1, 10.0), ("all", 2, 20.0)]
+
+    board = Leaderboard("test", loader, reload_interval=0.001)
+    board.ensure_loaded()
+    version = board.version("all")
+    time.sleep(0.01)
+
+    worker = threading.Thread(target=board.refresh)
+    worker.start()
+    assert loading.wait(5)
+    # 加载未完成时读写都不等待
+    assert board.page("all", 0, 10) == [(2, 20.0), (1, 10.0)]
+    board.add("all", 3, 30.0)
+    board.remove("all", 1)
+    release.set()
+    worker.join(5)
+
+    assert board.page("all", 0, 10) == [(3, 30.0), (2, 20.0)]
+    assert board.version("all") > version
@@ -0,0 +1,35 @@
+"""
+指标的并发更新和抽象基类
+"""
+import threading
+
+import pytest
+
+from core.metrics import Counter, Histogram, _Metric
+
+
+def test_metric_requires_child_factory():
+    with pytest.raises(TypeError):
+        _Metric("test_untyped", "未实现子指标")
+
+
+def test_concurrent_updates_are_not_lost():
+    counter = Counter("test_events_total", "并发计数", ("kind",))
+    histogram = Histogram("test_latency_seconds", "并发观测", buckets=(0.5, 1.0))
+
+    def work():
+        for _ in range(20000):
+            counter.labels(kind="a").inc()
+            histogram.observe(0.7)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert list(counter.collect()) == [("test_events_total", {"kind": "a"}, 160000.0)]
+    samples = {(name, labels.get("le")): value for name, labels, value in histogram.collect()}
+    assert samples[("test_latency_seconds_bucket", "0.5")] == 0
+    assert samples[("test_latency_seconds_bucket", "1.0")] == 160000
+    assert samples[("test_latency_seconds_count", None)] == 160000
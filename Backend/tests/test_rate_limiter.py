@@ -0,0 +1,47 @@
+"""
+配额限流器：配置校验，以及 Redis 令牌桶的同步调用不在事件循环中执行
+"""
+import asyncio
+import threading
+
+import pytest
+
+from core.rate_limiter import LocalTokenBucket, Priority, PriorityRateLimiter, create_rate_limiter
+
+
+@pytest.mark.parametrize("rate, burst", [(0, 2), (-1, 2), (2, 0), (2, 0.5)])
+def test_invalid_quota_is_rejected(rate, burst):
+    with pytest.raises(ValueError, match="配置错误"):
+        create_rate_limiter("test", rate=rate, burst=burst, backend="local")
+
+
+class _BlockingBucket(LocalTokenBucket):
+    """模拟 Redis 令牌桶：记录每次调用所在的线程"""
+
+    blocking = True
+
+    def __init__(self, rate, burst):
+        super().__init__(rate, burst)
+        self.threads = set()
+
+    def take(self, reserve=0.0):
+        self.threads.add(threading.get_ident())
+        return super().take(reserve)
+
+    def waiting(self, priority):
+        self.threads.add(threading.get_ident())
+        return super().waiting(priority)
+
+
+def test_blocking_bucket_runs_off_the_event_loop():
+    bucket = _BlockingBucket(rate=1000, burst=1)
+    limiter = PriorityRateLimiter("test", bucket)
+
+    async def run():
+        assert await limiter.acquire(Priority.BATCH, timeout=1.0)
+        assert await limiter.acquire(Priority.BATCH, timeout=1.0)
+        await limiter.try_acquire(Priority.BATCH)
+
+    asyncio.run(run())
+    assert bucket.threads
+    assert threading.get_ident() not in bucket.threads
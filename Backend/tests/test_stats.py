@@ -0,0 +1,49 @@
+"""
+StatsService 的增量更新语句
+
+MySQL 按从左到右的顺序执行单表 UPDATE 的 SET 赋值，avg_score 必须在 scores_total 之前赋值，
+才能用到更新前的 scores_total。
+"""
+import re
+
+from sqlalchemy.dialects import mysql
+
+from services.stats import StatsService
+
+
+class _Result:
+    rowcount = 1
+
+
+class _RecordingSession:
+    """只记录执行的语句，不连接数据库"""
+
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, stmt):
+        self.statements.append(stmt)
+        return _Result()
+
+
+def _mysql_set_columns(stmt):
+    sql = str(stmt.compile(dialect=mysql.dialect()))
+    set_clause = sql.split(" SET ", 1)[1].split(" WHERE ", 1)[0]
+    return re.findall(r"(?:^|, )(\w+)=", set_clause)
+
+
+def _set_order(action):
+    db = _RecordingSession()
+    action(StatsService(db))
+    (stmt,) = db.statements
+    return _mysql_set_columns(stmt)
+
+
+def test_record_score_assigns_avg_before_total():
+    columns = _set_order(lambda service: service.record_score(1, 80.0))
+    assert columns.index("avg_score") < columns.index("scores_total")
+
+
+def test_remove_score_assigns_avg_before_total():
+    columns = _set_order(lambda service: service.remove_score(1, 80.0))
+    assert columns.index("avg_score") < columns.index("scores_total")
@@ -2,9 +2,7 @@ import os
 import sys
 import uuid
 import random
-import base64
 import asyncio
-import requests
 import logging
 from pathlib import Path
 from sqlalchemy import create_engine, desc
@@ -20,77 +18,29 @@ from models.score import Score
 from models.score import ServiceType
 from db.base import Base
 from config.settings import BAIDU_AI_API_KEY, BAIDU_AI_SECRET_KEY
+from core.rate_limiter import Priority
+from services.face_provider import BaiduFaceProvider, build_face_detector
+from services.leaderboard import invalidate_boards
+from services.stats import StatsService
 
 # 百度AI配置
 api_key = BAIDU_AI_API_KEY or "eb8uJZjrOrLwa5acw59JbxGw"  # 使用默认值，实际应从环境变量获取
 secret_key = BAIDU_AI_SECRET_KEY or "X5YB0qlJuZjyCEKHPhFEQs0RJWitWbj7"  # 使用默认值，实际应从环境变量获取
 
-def get_access_token():
-    """获取百度AI访问令牌"""
-    token_url = 'https://aip.baidubce.com/oauth/2.0/token'
-    params = {
-        'grant_type': 'client_credentials',
-        'client_id': api_key,
-        'client_secret': secret_key
-    }
-    
-    try:
-        response = requests.post(token_url, params=params).json()
-        access_token = response.get('access_token')
-        return access_token
-    except Exception as e:
-        logger.error(f"获取access_token失败: {e}")
-        return None
+# 批处理任务与线上服务共享人脸检测配额，以低优先级排队，因此给出较长的截止时间
+face_detector = build_face_detector(BaiduFaceProvider(api_key, secret_key), deadline=120)
 
 async def detect_face(image_path: str) -> dict:
     """使用百度AI检测人脸并返回特征"""
     try:
-        # 获取access_token
-        access_token = get_access_token()
-        
-        if not access_token:
-            return {"success": False, "error": "无法获取百度AI访问令牌"}
-        
-        # 读取图片并转为base64
+        # 读取图片
         with open(image_path, "rb") as f:
             image_data = f.read()
-        
-        image_base64 = base64.b64encode(image_data).decode("utf-8")
-        
-        # 调用百度AI人脸检测接口V3
-        detect_url = f"https://aip.baidubce.com/rest/2.0/face/v3/detect?access_token={access_token}"
-        
-        payload = {
-            "image": image_base64,
-            "image_type": "BASE64",
-            "face_field": "age,beauty,expression,face_shape,gender,landmark"
-        }
-        
-        headers = {
-            'Content-Type': 'application/json'
-        }
-        
-        response = requests.post(detect_url, headers=headers, json=payload)
-        result = response.json()
-        
-        logger.info(f"百度AI返回结果: {result}")
-        
-        # 检查返回结果
-        if result.get('error_code', 0) != 0:
-            logger.error(f"人脸检测失败: {result}")
-            return {"success": False, "error": result.get('error_msg', '未知错误')}
-        
-        # 检查是否有人脸
-        face_list = result.get('result', {}).get('face_list', [])
-        if not face_list:
-            return {"success": False, "error": "未检测到人脸"}
-        
-        # 返回检测结果
-        return {"success": True, "face_info": face_list[0]}
-        
     except Exception as e:
-        logger.error(f"人脸检测异常: {e}")
+        logger.error(f"读取图片失败: {e}")
         return {"success": False, "error": str(e)}
+    
+    return await face_detector.detect(image_data, priority=Priority.BATCH)
 
 def calculate_score(face_features: dict) -> float:
     """基于特征计算颜值分数"""
@@ -149,15 +99,17 @@ async def update_rankings():
                     user_id=user.user_id,
                     image_url=img_url,
                     face_score=face_score,
-                    feature_data=face_info,
                     is_public=True,
                     service_type=ServiceType.BAIDU
                 )
+                db_score.set_face_info(face_info)
                 db.add(db_score)
+                StatsService(db).record_score(user.user_id, face_score)
                 logger.info(f"添加图片: {img_url}, 分数: {face_score}, 用户: {user.username}")
             
             # 提交更改
             db.commit()
+            invalidate_boards()
             logger.info("排行榜数据更新完成!")
             
             # 输出当前排行榜